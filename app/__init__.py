@@ -1,31 +1,99 @@
 # app/__init__.py
-import os
+import logging
+import threading
+import time
+
+_t0 = time.perf_counter()
 from flask import Flask
-import firebase_admin
-from firebase_admin import credentials, firestore
 from .config import Config
+from . import lifecycle
+lifecycle.record_phase('import.flask', time.perf_counter() - _t0)
+
+logger = logging.getLogger(__name__)
+_firebase_lock = threading.Lock()
+
+
+def init_firebase():
+    """Inicializa (una sola vez) la app de Firebase Admin. Importa firebase_admin en el primer uso."""
+    with lifecycle.phase('import.firebase_admin'):
+        import firebase_admin
+        from firebase_admin import credentials
+    if firebase_admin._apps:
+        return
+    with _firebase_lock:
+        if firebase_admin._apps:
+            return
+        try:
+            with lifecycle.phase('firebase.init'):
+                cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
+                firebase_admin.initialize_app(cred)
+            logger.info("Firebase Admin SDK inicializado exitosamente.")
+        except Exception as e:
+            logger.critical("Error inicializando Firebase Admin SDK: %s", e)
+
+
+class _LazyFirestoreClient:
+    """
+    Proxy del cliente de Firestore: se crea en el primer uso (no al importar la app),
+    así los módulos pueden hacer 'from app import db' en cualquier orden y los
+    canales gRPC nacen en el proceso que los usa (después del fork del servidor).
+    El cliente lo elige services/storage.py según STORAGE_BACKEND.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    from .services import storage
+                    self._client = storage.create_client()
+                client = self._client
+        return client
+
+    @property
+    def initialized(self):
+        return self._client is not None
+
+    def use(self, client):
+        """Reemplaza el cliente (ej. un MemoryClient con datos sembrados para un benchmark)."""
+        from . import db_stats
+        with self._lock:
+            self._client = db_stats.instrument(client)
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+db = _LazyFirestoreClient()
+
+def _configure_logging():
+    # Sin configuración previa (gunicorn solo configura sus propios loggers), los
+    # logs de la app van a stderr con el nivel de LOG_LEVEL.
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=Config.LOG_LEVEL.upper(),
+                            format='%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s')
 
-db = None
 
 def create_app():
-    global db
+    started = time.perf_counter()
+    _configure_logging()
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    if not firebase_admin._apps:
-        try:
-            cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
-            firebase_admin.initialize_app(cred)
-            print("Firebase Admin SDK inicializado exitosamente.")
-        except Exception as e:
-            print(f"Error CRÍTICO inicializando Firebase Admin SDK: {e}")
-    
-    db = firestore.client()
-
-    with app.app_context():
-        # Importamos las rutas actualizadas
-        from .routes import auth_routes, chat_routes, user_routes, product_routes, rating_routes, report_routes, transaction_routes, saved_routes
-        
+    if Config.ASYNC_MODE:
+        # Las vistas 'async def' y las lecturas async comparten un event loop por worker.
+        from . import async_db
+        app.async_to_sync = async_db.async_to_sync
+
+    with app.app_context(), lifecycle.phase('blueprints'):
+        # Importamos las rutas actualizadas. Los servicios que usan se cargan en diferido
+        # (ver app/lazy.py): firebase_admin y Firestore no se importan aquí.
+        from .routes import auth_routes, chat_routes, user_routes, product_routes, rating_routes, report_routes, transaction_routes, saved_routes, health_routes
+
         app.register_blueprint(auth_routes.bp)
         app.register_blueprint(chat_routes.bp)
         app.register_blueprint(user_routes.bp)
@@ -34,8 +102,31 @@ def create_app():
         app.register_blueprint(report_routes.bp)
         app.register_blueprint(transaction_routes.bp)
         app.register_blueprint(saved_routes.bp)
+        app.register_blueprint(health_routes.bp)
+
+        logger.info("Todos los Blueprints han sido registrados.")
+
+    # Lecturas, escrituras, consultas y transacciones de Firestore de cada petición.
+    # Antes que las métricas, que exportan sus totales por ruta.
+    from . import db_stats
+    db_stats.init_app(app)
+
+    if Config.METRICS_ENABLED:
+        # Histogramas de latencia, contadores de estado, peticiones en curso y tamaños (GET /metrics).
+        with lifecycle.phase('metrics'):
+            from . import metrics
+            from .routes import metrics_routes
+            metrics.init_app(app)
+            app.register_blueprint(metrics_routes.bp)
+
+    with lifecycle.phase('commands'):
+        from .commands import register_commands
+        register_commands(app)
 
-        
-        print("Todos los Blueprints han sido registrados.")
+    # El cliente de Firestore, las claves de firma, la cola de tareas y el planificador
+    # de reservas arrancan en segundo plano con la primera petición del worker (o desde
+    # el hook post_worker_init de gunicorn), nunca en el proceso maestro.
+    app.before_request(lifecycle.ensure_started)
+    lifecycle.record_phase('create_app', time.perf_counter() - started)
 
-    return app
\ No newline at end of file
+    return app
@@ -0,0 +1,90 @@
+# app/async_db.py
+import asyncio
+import importlib
+import threading
+from contextvars import copy_context
+from app.config import Config
+
+# Modo async (ASYNC_MODE=1). Cada worker tiene un único event loop en un hilo
+# propio donde corre el cliente async de Firestore (grpc.aio): todas las
+# lecturas de todas las peticiones del worker comparten ese loop y ese canal,
+# y los hilos de las peticiones solo esperan el resultado.
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+_ASYNC_READS = {}  # función síncrona del servicio -> su versión async (ver services/async_reads.py)
+
+
+def _get_loop():
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name='firestore-async', daemon=True)
+            _thread.start()
+        return _loop
+
+
+def client():
+    """Cliente async de Firestore (uno por app de Firebase, lo cachea firebase_admin)."""
+    from app import db_stats, init_firebase
+    from firebase_admin import firestore_async
+    init_firebase()
+    return db_stats.instrument(firestore_async.client())
+
+
+def mirrors(sync_fn):
+    """Registra la corrutina decorada como versión async de 'sync_fn'."""
+    def decorator(async_fn):
+        _ASYNC_READS[sync_fn] = async_fn
+        return async_fn
+    return decorator
+
+
+def read(sync_fn, *args, **kwargs):
+    """
+    Ejecuta una lectura del servicio: con ASYNC_MODE usa su versión async en el
+    event loop compartido; si no (o si no tiene versión async), la síncrona.
+    """
+    if not Config.ASYNC_MODE or Config.STORAGE_BACKEND != 'firestore':
+        # El backend en memoria no tiene cliente async: sus lecturas no hacen E/S.
+        return sync_fn(*args, **kwargs)
+    importlib.import_module('app.services.async_reads')  # registra las versiones async
+    async_fn = _ASYNC_READS.get(sync_fn)
+    if async_fn is None:
+        return sync_fn(*args, **kwargs)
+    return run(async_fn(*args, **kwargs))
+
+
+def run(coro, timeout=None):
+    """
+    Ejecuta la corrutina en el event loop compartido y espera su resultado desde
+    el hilo actual. Se copian las contextvars, así la corrutina ve el contexto de
+    la petición de Flask (request, g).
+    """
+    loop = _get_loop()
+    context = copy_context()
+    task_future = asyncio.run_coroutine_threadsafe(_in_context(coro, context), loop)
+    return task_future.result(timeout or Config.ASYNC_CALL_TIMEOUT)
+
+
+async def _in_context(coro, context):
+    # create_task copia el contexto activo: lo creamos dentro de 'context'.
+    return await context.run(asyncio.ensure_future, coro)
+
+
+def async_to_sync(func):
+    """Reemplazo de Flask.async_to_sync: las vistas 'async def' corren en el loop compartido."""
+    def wrapper(*args, **kwargs):
+        return run(func(*args, **kwargs))
+    return wrapper
+
+
+def shutdown():
+    """Detiene el event loop (ej. al apagar el worker)."""
+    global _loop
+    with _lock:
+        loop, _loop = _loop, None
+    if loop is not None:
+        loop.call_soon_threadsafe(loop.stop)
@@ -1,14 +1,21 @@
 # app/auth/decorators.py
 from functools import wraps
 from flask import request, jsonify, g
-from firebase_admin import auth
-from app.services import user_service
+from app.auth import profile_cache
+from app.lazy import lazy_module
+
+# Firebase Admin y el servicio de usuarios se cargan en la primera petición autenticada.
+auth = lazy_module('firebase_admin.auth')
+user_service = lazy_module('app.services.user_service')
+token_verifier = lazy_module('app.auth.token_verifier')
 
 def login_required(f):
     """
     Decorador que verifica un ID Token de Firebase real desde la cabecera 'Authorization'.
     Si el token es válido, obtiene el UID del usuario, carga su perfil desde Firestore 
     y lo adjunta al objeto global 'g' de Flask.
+    Tokens y perfiles se cachean en memoria (ver app/auth/profile_cache.py) hasta el
+    'exp' del token, para no repetir la verificación ni la lectura en cada petición.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -19,16 +26,23 @@ def login_required(f):
         id_token = auth_header.split('Bearer ')[1]
         
         try:
-            # Verificar el ID Token con el Admin SDK
-            decoded_token = auth.verify_id_token(id_token)
+            # Verificar el ID Token localmente (o reutilizar una verificación previa)
+            decoded_token = profile_cache.get_token(id_token)
+            if decoded_token is None:
+                decoded_token = token_verifier.verify_id_token(id_token)
+                profile_cache.put_token(id_token, decoded_token)
             uid = decoded_token['uid']
             
-            # Obtenemos el perfil del usuario desde Firestore para obtener su rol y otros datos
-            user_profile = user_service.get_user_by_id(uid)
+            # Obtenemos el perfil del usuario (caché en memoria o Firestore) para obtener su rol y otros datos
+            user_profile = profile_cache.get_profile(uid)
+            if user_profile is None:
+                user_profile = user_service.get_user_by_id(uid)
+
+                if not user_profile:
+                    # Este caso ocurre si un usuario existe en Firebase Auth pero no en nuestra DB Firestore
+                    return jsonify({"error": "Perfil de usuario no encontrado en la base de datos."}), 404
 
-            if not user_profile:
-                # Este caso ocurre si un usuario existe en Firebase Auth pero no en nuestra DB Firestore
-                return jsonify({"error": "Perfil de usuario no encontrado en la base de datos."}), 404
+                profile_cache.put_profile(uid, user_profile, decoded_token['exp'])
             
             # 'g' es un objeto global de Flask para el contexto de una petición.
             # Guardamos los datos del usuario aquí para usarlos en las rutas.
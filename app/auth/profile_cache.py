@@ -0,0 +1,78 @@
+# app/auth/profile_cache.py
+import hashlib
+import threading
+import time
+from cachetools import TLRUCache
+from app.config import Config
+
+# Caché en memoria (por proceso) de tokens verificados y perfiles de usuario.
+# Cada entrada expira en lo que ocurra primero: el TTL configurado o el 'exp'
+# del ID Token que la originó, así nunca se sirve un perfil más allá de la
+# vigencia del token con el que se obtuvo.
+
+_lock = threading.Lock()
+_stats = {'token_hits': 0, 'token_misses': 0, 'profile_hits': 0, 'profile_misses': 0}
+
+
+def _time_to_use(key, value, now):
+    """Calcula la expiración de una entrada: min(ahora + TTL, exp del token)."""
+    _, exp = value
+    return min(now + Config.AUTH_CACHE_TTL, exp)
+
+
+_tokens = TLRUCache(maxsize=Config.AUTH_CACHE_MAXSIZE, ttu=_time_to_use, timer=time.time)
+_profiles = TLRUCache(maxsize=Config.AUTH_CACHE_MAXSIZE, ttu=_time_to_use, timer=time.time)
+
+
+def _token_key(id_token):
+    # No guardamos el token en claro como clave, solo su hash.
+    return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+
+def get_token(id_token):
+    """Devuelve los claims de un token ya verificado, o None si no está en caché."""
+    key = _token_key(id_token)
+    with _lock:
+        entry = _tokens.get(key)
+        _stats['token_hits' if entry else 'token_misses'] += 1
+    return entry[0] if entry else None
+
+
+def put_token(id_token, decoded_token):
+    """Guarda los claims de un token verificado hasta su 'exp'."""
+    with _lock:
+        _tokens[_token_key(id_token)] = (decoded_token, decoded_token['exp'])
+
+
+def get_profile(uid):
+    """Devuelve el perfil cacheado de un usuario, o None si no está en caché."""
+    with _lock:
+        entry = _profiles.get(uid)
+        _stats['profile_hits' if entry else 'profile_misses'] += 1
+    # Copia superficial para que la petición no altere la entrada compartida.
+    return dict(entry[0]) if entry else None
+
+
+def put_profile(uid, profile, exp):
+    """Guarda el perfil de un usuario; la entrada no sobrevive al 'exp' del token."""
+    with _lock:
+        _profiles[uid] = (profile, exp)
+
+
+def invalidate_profile(uid):
+    """Elimina el perfil cacheado (ej. tras cambiar rol, aprobación o estado)."""
+    with _lock:
+        _profiles.pop(uid, None)
+
+
+def clear():
+    """Vacía ambas cachés."""
+    with _lock:
+        _tokens.clear()
+        _profiles.clear()
+
+
+def stats():
+    """Devuelve los contadores de aciertos/fallos y el tamaño actual de las cachés."""
+    with _lock:
+        return dict(_stats, tokens=len(_tokens), profiles=len(_profiles))
@@ -0,0 +1,194 @@
+# app/auth/token_verifier.py
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import firebase_admin
+import jwt
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from firebase_admin import auth
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Certificados públicos con los que Firebase Auth firma los ID Tokens.
+CERT_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+# Si la descarga falla, se reintenta tras este intervalo conservando las claves anteriores.
+_RETRY_SECONDS = 30
+
+
+def _load_key(value):
+    """Convierte un certificado X.509 o una clave pública (PEM) en un objeto de clave."""
+    if not isinstance(value, (str, bytes)):
+        return value  # ya es un objeto de clave (ej. RSAPublicKey)
+    pem = value.encode('utf-8') if isinstance(value, str) else value
+    if b'BEGIN CERTIFICATE' in pem:
+        return x509.load_pem_x509_certificate(pem).public_key()
+    return serialization.load_pem_public_key(pem)
+
+
+class TokenVerifier:
+    """
+    Verifica ID Tokens de Firebase localmente con PyJWT.
+    Mantiene las claves de firma en memoria y las renueva en un hilo de fondo antes
+    de que expiren, de modo que una petición nunca espera por una descarga.
+    Si el token está firmado con un 'kid' desconocido se delega en el Admin SDK.
+
+    Para pruebas se puede pasar un juego de claves local en 'keys' ({kid: PEM});
+    en ese caso no se descarga nada ni se recurre al Admin SDK.
+    """
+
+    def __init__(self, project_id, keys=None, cert_url=CERT_URL, leeway=None, refresh_margin=None,
+                 fallback=auth.verify_id_token):
+        self.project_id = project_id
+        self.issuer = ISSUER_PREFIX + project_id
+        self.cert_url = cert_url
+        self.leeway = Config.AUTH_TOKEN_LEEWAY if leeway is None else leeway
+        self.refresh_margin = Config.AUTH_KEYS_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self.static = keys is not None
+        self.fallback = None if self.static else fallback
+
+        self._keys = {kid: _load_key(pem) for kid, pem in (keys or {}).items()}
+        self._expires_at = float('inf') if self.static else 0.0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # --- Gestión de claves ---
+
+    def refresh_keys(self):
+        """Descarga los certificados públicos y devuelve los segundos hasta su expiración."""
+        response = requests.get(self.cert_url, timeout=10)
+        response.raise_for_status()
+        keys = {kid: _load_key(pem) for kid, pem in response.json().items()}
+
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else 3600
+
+        # Se reemplaza el diccionario completo: los lectores nunca ven un estado intermedio.
+        self._keys = keys
+        self._expires_at = time.time() + max_age
+        return max_age
+
+    def _refresh_loop(self):
+        while not self._stopped.is_set():
+            try:
+                max_age = self.refresh_keys()
+                wait = max(max_age - self.refresh_margin, _RETRY_SECONDS)
+            except Exception as e:
+                logger.warning("No se pudieron renovar las claves de firma de Firebase: %s", e)
+                wait = _RETRY_SECONDS
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def start(self):
+        """Arranca (una sola vez) el hilo que precarga y renueva las claves."""
+        if self.static or (self._thread and self._thread.is_alive()):
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name='token-keys-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    @property
+    def ready(self):
+        """True si hay claves vigentes en memoria."""
+        return bool(self._keys) and time.time() < self._expires_at
+
+    # --- Verificación ---
+
+    def _delegate(self, id_token, reason):
+        if self.fallback is None:
+            raise auth.InvalidIdTokenError(reason)
+        # Pedimos al hilo de fondo que renueve las claves para las próximas peticiones.
+        self._wakeup.set()
+        return self.fallback(id_token)
+
+    def verify_id_token(self, id_token):
+        """
+        Verifica firma, emisor, audiencia y vigencia del token.
+        Devuelve los claims decodificados con 'uid' (igual que auth.verify_id_token)
+        y lanza auth.ExpiredIdTokenError / auth.InvalidIdTokenError en caso de error.
+        """
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.InvalidTokenError as e:
+            raise auth.InvalidIdTokenError(f"Token de ID mal formado: {e}", cause=e)
+
+        if header.get('alg') != 'RS256':
+            raise auth.InvalidIdTokenError("El token de ID debe estar firmado con RS256.")
+
+        kid = header.get('kid')
+        key = self._keys.get(kid) if time.time() < self._expires_at else None
+        if key is None:
+            return self._delegate(id_token, f"Clave de firma desconocida: {kid}")
+
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=['RS256'],
+                audience=self.project_id,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']},
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise auth.ExpiredIdTokenError("El token de ID ha expirado.", cause=e)
+        except jwt.InvalidTokenError as e:
+            raise auth.InvalidIdTokenError(f"Token de ID inválido: {e}", cause=e)
+
+        subject = claims['sub']
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise auth.InvalidIdTokenError("El claim 'sub' del token de ID es inválido.")
+        if claims.get('auth_time', 0) > time.time() + self.leeway:
+            raise auth.InvalidIdTokenError("El claim 'auth_time' del token de ID está en el futuro.")
+
+        claims['uid'] = subject
+        return claims
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def _load_local_keys(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_verifier():
+    """Devuelve el verificador global, creándolo y arrancando la precarga de claves si hace falta."""
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                project_id = Config.FIREBASE_PROJECT_ID or firebase_admin.get_app().project_id
+                keys = _load_local_keys(Config.AUTH_LOCAL_KEYS_FILE) if Config.AUTH_LOCAL_KEYS_FILE else None
+                _verifier = TokenVerifier(project_id, keys=keys).start()
+    return _verifier
+
+
+def set_verifier(verifier):
+    """Reemplaza el verificador global (ej. uno con claves locales para pruebas)."""
+    global _verifier
+    _verifier = verifier
+
+
+def verify_id_token(id_token):
+    """Punto de entrada usado por @login_required."""
+    # Con el emulador de Auth los tokens no van firmados: solo el Admin SDK sabe validarlos.
+    if not Config.AUTH_LOCAL_VERIFY or os.getenv('FIREBASE_AUTH_EMULATOR_HOST'):
+        return auth.verify_id_token(id_token)
+    return get_verifier().verify_id_token(id_token)
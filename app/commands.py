@@ -0,0 +1,98 @@
+# app/commands.py
+import click
+from flask.cli import AppGroup
+
+# Comandos de mantenimiento: 'flask <grupo> <comando>'.
+
+ratings_cli = AppGroup('ratings', help="Mantenimiento de calificaciones.")
+
+
+@ratings_cli.command('backfill-summaries')
+@click.option('--batch-size', default=500, show_default=True, help="Escrituras por lote (máx. 500).")
+def backfill_rating_summaries(batch_size):
+    """Recalcula los resúmenes de calificaciones por producto y por vendedor."""
+    from app.services import rating_service
+    read, written = rating_service.rebuild_rating_summaries(batch_size=min(batch_size, 500))
+    click.echo(f"{read} calificaciones leídas, {written} resúmenes escritos.")
+
+
+migrate_cli = AppGroup('migrate', help="Migraciones de datos.")
+
+
+@migrate_cli.command('composite-ids')
+@click.option('--collection', 'collections', multiple=True,
+              type=click.Choice(['ratings', 'reports', 'saved', 'chats']),
+              help="Colección a migrar (repetible). Por defecto, todas.")
+@click.option('--dry-run', is_flag=True, help="Solo cuenta lo que se migraría.")
+def migrate_composite_ids(collections, dry_run):
+    """Re-identifica los documentos existentes con su ID compuesto (productId + usuario)."""
+    from app.services import migration_service
+    for collection in collections or migration_service.COMPOSITE_KEYS:
+        stats = migration_service.rekey_collection(collection, dry_run=dry_run)
+        click.echo(f"{collection}: {stats['scanned']} leídos, {stats['migrated']} migrados, "
+                   f"{stats['subdocuments']} subdocumentos movidos, "
+                   f"{len(stats['conflicts'])} conflictos, {len(stats['invalid'])} sin claves.")
+        for doc_id in stats['conflicts']:
+            click.echo(f"  conflicto: {collection}/{doc_id}")
+
+
+@migrate_cli.command('transaction-timestamps')
+@click.option('--dry-run', is_flag=True, help="Solo cuenta lo que se actualizaría.")
+def migrate_transaction_timestamps(dry_run):
+    """Rellena 'timestamp' en las transacciones antiguas para que aparezcan en los listados."""
+    from app.services import migration_service
+    stats = migration_service.backfill_transaction_timestamps(dry_run=dry_run)
+    click.echo(f"transactions: {stats['scanned']} leídas, {stats['updated']} sin 'timestamp'"
+               f"{' (sin cambios)' if dry_run else ' actualizadas'}.")
+
+
+reservations_cli = AppGroup('reservations', help="Mantenimiento de reservas.")
+
+
+@reservations_cli.command('expire')
+@click.option('--ttl', type=int, default=None, help="Antigüedad máxima en segundos (por defecto RESERVATION_TTL).")
+def expire_reservations(ttl):
+    """Caduca ahora las reservas abandonadas y libera sus productos."""
+    from app.services import reservation_expiry
+    stats = reservation_expiry.sweep(ttl=ttl)
+    click.echo(f"{stats['expired']} reservas caducadas de {stats['swept']}, "
+               f"{stats['released']} productos liberados en {stats['durationMs']} ms.")
+
+
+tasks_cli = AppGroup('tasks', help="Cola de tareas en segundo plano.")
+
+
+@tasks_cli.command('failed')
+@click.option('--limit', default=50, show_default=True)
+def list_failed_tasks(limit):
+    """Lista las tareas que agotaron sus reintentos."""
+    from app import db
+    from app.services import task_queue
+    from firebase_admin import firestore
+    query = db.collection(task_queue.TASKS_COLLECTION) \
+              .where(filter=firestore.FieldFilter('status', '==', 'failed')).limit(limit)
+    for doc in query.stream():
+        task_data = doc.to_dict()
+        click.echo(f"{doc.id} {task_data.get('name')} intentos={task_data.get('attempts')} "
+                   f"error={task_data.get('lastError')}")
+
+
+@tasks_cli.command('retry')
+@click.argument('task_id')
+def retry_task(task_id):
+    """Vuelve a poner una tarea fallida en la cola (la recupera el próximo barrido)."""
+    from datetime import datetime, timezone
+    from app import db
+    from app.services import task_queue
+    task_ref = db.collection(task_queue.TASKS_COLLECTION).document(task_id)
+    if not task_ref.get().exists:
+        raise click.ClickException("Tarea no encontrada.")
+    task_ref.update({'status': 'retrying', 'attempts': 0, 'leaseUntil': datetime.now(timezone.utc)})
+    click.echo(f"Tarea {task_id} reencolada.")
+
+
+def register_commands(app):
+    app.cli.add_command(ratings_cli)
+    app.cli.add_command(migrate_cli)
+    app.cli.add_command(reservations_cli)
+    app.cli.add_command(tasks_cli)
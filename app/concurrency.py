@@ -0,0 +1,44 @@
+# app/concurrency.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from app.config import Config
+
+# Pool de hilos compartido para lanzar en paralelo varias llamadas de E/S
+# (consultas de Firestore) dentro de una misma petición. Las llamadas de Firestore
+# liberan el GIL mientras esperan la red, así que se solapan de verdad.
+# Cada llamada corre con una copia de las contextvars de la petición, así sus
+# lecturas se cuentan en la petición (ver app/db_stats.py).
+
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.IO_WORKERS, thread_name_prefix='io')
+        return _executor
+
+
+def run_parallel(*calls):
+    """
+    Ejecuta en paralelo las funciones sin argumentos de 'calls' y devuelve sus
+    resultados en el mismo orden. Si alguna falla, propaga su excepción.
+    """
+    if len(calls) == 1:
+        return [calls[0]()]
+    executor = get_executor()
+    futures = [executor.submit(copy_context().run, call) for call in calls[1:]]
+    # La primera se ejecuta en el hilo de la petición: una tarea menos en el pool.
+    first = calls[0]()
+    return [first, *(future.result() for future in futures)]
+
+
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -6,4 +6,89 @@ class Config:
         'GOOGLE_APPLICATION_CREDENTIALS', 
         'firebase-adminsdk-credentials.json'
     )
-    FIREBASE_STORAGE_BUCKET = os.getenv('FIREBASE_STORAGE_BUCKET')
\ No newline at end of file
+    FIREBASE_STORAGE_BUCKET = os.getenv('FIREBASE_STORAGE_BUCKET')
+
+    # Caché de tokens verificados y perfiles usada por @login_required
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 300))
+    AUTH_CACHE_MAXSIZE = int(os.getenv('AUTH_CACHE_MAXSIZE', 10000))
+
+    # Verificación local de ID Tokens (PyJWT) con claves de firma precargadas
+    FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
+    AUTH_LOCAL_VERIFY = os.getenv('AUTH_LOCAL_VERIFY', '1') == '1'
+    AUTH_LOCAL_KEYS_FILE = os.getenv('AUTH_LOCAL_KEYS_FILE')  # JSON {kid: PEM}, solo para pruebas
+    AUTH_TOKEN_LEEWAY = int(os.getenv('AUTH_TOKEN_LEEWAY', 5))
+    AUTH_KEYS_REFRESH_MARGIN = int(os.getenv('AUTH_KEYS_REFRESH_MARGIN', 600))
+
+    # Paginación por cursor de los listados
+    DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+
+    # Caché del catálogo público mantenida por un listener on_snapshot
+    CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', '1') == '1'
+    CATALOG_WARMUP_TIMEOUT = float(os.getenv('CATALOG_WARMUP_TIMEOUT', 5))
+    CATALOG_RESTART_INTERVAL = float(os.getenv('CATALOG_RESTART_INTERVAL', 30))
+
+    # Búsqueda de productos (índice invertido en memoria)
+    DEFAULT_SEARCH_LIMIT = int(os.getenv('DEFAULT_SEARCH_LIMIT', 20))
+
+    # Máximo de IDs por petición en los endpoints batchGet
+    MAX_BATCH_GET = int(os.getenv('MAX_BATCH_GET', 100))
+
+    # Cache-Control (max-age, en segundos) de las lecturas públicas con ETag
+    PUBLIC_CACHE_MAX_AGE = int(os.getenv('PUBLIC_CACHE_MAX_AGE', 15))
+
+    # Reservas de productos muy solicitados: espera máxima en la puerta de admisión
+    # por producto (0 = fallar en seguida), reintentos ante abortos y backoff exponencial
+    RESERVATION_GATE_WAIT = float(os.getenv('RESERVATION_GATE_WAIT', 0))
+    RESERVATION_MAX_ATTEMPTS = int(os.getenv('RESERVATION_MAX_ATTEMPTS', 5))
+    RESERVATION_BACKOFF_BASE = float(os.getenv('RESERVATION_BACKOFF_BASE', 0.05))
+    RESERVATION_BACKOFF_MAX = float(os.getenv('RESERVATION_BACKOFF_MAX', 1.0))
+
+    # Caducidad de reservas abandonadas: antigüedad máxima de una reserva, cada
+    # cuánto se barre y duración del lease que reparte el barrido entre workers (segundos)
+    RESERVATION_SWEEP_ENABLED = os.getenv('RESERVATION_SWEEP_ENABLED', '1') == '1'
+    RESERVATION_TTL = int(os.getenv('RESERVATION_TTL', 1800))
+    RESERVATION_SWEEP_INTERVAL = float(os.getenv('RESERVATION_SWEEP_INTERVAL', 60))
+    RESERVATION_SWEEP_LEASE = int(os.getenv('RESERVATION_SWEEP_LEASE', 120))
+
+    # Cola de tareas en segundo plano: hilos del pool, intentos por tarea, backoff
+    # exponencial (segundos), lease de una tarea en curso y cada cuánto se recuperan huérfanas
+    TASK_WORKERS = int(os.getenv('TASK_WORKERS', 4))
+    TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', 5))
+    TASK_BACKOFF_BASE = float(os.getenv('TASK_BACKOFF_BASE', 2))
+    TASK_BACKOFF_MAX = float(os.getenv('TASK_BACKOFF_MAX', 300))
+    TASK_LEASE = int(os.getenv('TASK_LEASE', 120))
+    TASK_RECOVERY_INTERVAL = float(os.getenv('TASK_RECOVERY_INTERVAL', 60))
+
+    # Hilos del pool compartido para consultas de Firestore en paralelo dentro de una petición
+    IO_WORKERS = int(os.getenv('IO_WORKERS', 16))
+
+    # Modo async: las lecturas de products/ratings/reports/users usan el cliente
+    # async de Firestore en un event loop compartido por worker
+    ASYNC_MODE = os.getenv('ASYNC_MODE', '0') == '1'
+    ASYNC_CALL_TIMEOUT = float(os.getenv('ASYNC_CALL_TIMEOUT', 30))
+
+    # Intentos de calentamiento de cada dependencia antes de dar el worker por listo
+    WARMUP_ATTEMPTS = int(os.getenv('WARMUP_ATTEMPTS', 5))
+
+    # Backend de almacenamiento: 'firestore' (producción) o 'memory' (cliente en
+    # memoria del proceso, sin red ni credenciales, para pruebas de carga)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'firestore')
+
+    # Latencia simulada por round trip del backend en memoria (milisegundos): fija + aleatoria
+    MEMORY_STORE_LATENCY = float(os.getenv('MEMORY_STORE_LATENCY', 0))
+    MEMORY_STORE_JITTER = float(os.getenv('MEMORY_STORE_JITTER', 0))
+
+    # Nivel de los logs de la app (ej. 'debug', 'info', 'warning')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'info')
+
+    # Métricas de Prometheus por ruta en GET /metrics. Con varios workers se agregan
+    # a través de los archivos de PROMETHEUS_MULTIPROC_DIR (ver gunicorn.conf.py)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+    # Contabilidad de operaciones de Firestore por petición (ver app/db_stats.py):
+    # cabeceras X-Firestore-* en las respuestas (siempre en modo debug) y warning
+    # en el log de las peticiones que leen más de FIRESTORE_READ_BUDGET documentos (0 = sin límite)
+    FIRESTORE_STATS_ENABLED = os.getenv('FIRESTORE_STATS_ENABLED', '1') == '1'
+    FIRESTORE_STATS_HEADERS = os.getenv('FIRESTORE_STATS_HEADERS', '0') == '1'
+    FIRESTORE_READ_BUDGET = int(os.getenv('FIRESTORE_READ_BUDGET', 200))
\ No newline at end of file
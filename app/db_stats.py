@@ -0,0 +1,352 @@
+# app/db_stats.py
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from flask import current_app, request
+from app.config import Config
+
+# Contabilidad de las operaciones de Firestore de cada petición: documentos
+# leídos y escritos, consultas, transacciones y tiempo total esperando a
+# Firestore. La factura depende de las lecturas: cada documento devuelto (o
+# buscado y no encontrado) es una lectura, y una consulta sin resultados cobra
+# una igualmente.
+#
+# Se instrumenta el cliente por debajo de 'db' (storage.create_client): en el
+# cliente real se envuelve su API gRPC (lookup, runQuery, commit,
+# beginTransaction, rollback); el MemoryClient avisa a su 'observer'. Las
+# operaciones se suman al OpStats de la petición en curso (una ContextVar, que
+# también ven los hilos de concurrency.run_parallel y las corrutinas de
+# async_db); fuera de una petición (cola de tareas, barrido de reservas) van a
+# la fila BACKGROUND_ROUTE.
+#
+# Por petición: cabeceras X-Firestore-* en modo debug (o con
+# FIRESTORE_STATS_HEADERS) y un warning si lee más de FIRESTORE_READ_BUDGET
+# documentos. Por ruta: agregados del proceso en route_stats() y, con
+# METRICS_ENABLED, contadores de Prometheus (ver metrics.py).
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_ROUTE = '(background)'
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class OpStats:
+    """Operaciones de Firestore acumuladas (de una petición o de una ruta)."""
+
+    FIELDS = ('reads', 'writes', 'queries', 'transactions')
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.transactions = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, reads=0, writes=0, queries=0, transactions=0, seconds=0.0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.queries += queries
+            self.transactions += transactions
+            self.seconds += seconds
+
+    def as_dict(self):
+        with self._lock:
+            return {'reads': self.reads, 'writes': self.writes, 'queries': self.queries,
+                    'transactions': self.transactions, 'firestoreMs': round(self.seconds * 1000, 2)}
+
+
+_current = ContextVar('firestore_op_stats', default=None)
+_background = OpStats()
+_routes_lock = threading.Lock()
+_routes = {}  # (método, ruta) -> totales de la ruta
+
+
+def current():
+    """OpStats de la petición en curso (None fuera de una petición)."""
+    return _current.get()
+
+
+def _add(**counts):
+    stats = _current.get()
+    (stats if stats is not None else _background).add(**counts)
+
+
+def record(op, documents=0, seconds=0.0):
+    """
+    Registra una operación: 'lookup' (documentos leídos por ID), 'query'
+    (documentos devueltos, mínimo una lectura), 'commit' (documentos escritos),
+    'transaction' (begin) o 'rollback'.
+    """
+    if op == 'lookup':
+        _add(reads=documents, seconds=seconds)
+    elif op == 'query':
+        _add(queries=1, reads=max(documents, 1), seconds=seconds)
+    elif op == 'commit':
+        _add(writes=documents, seconds=seconds)
+    elif op == 'transaction':
+        _add(transactions=1, seconds=seconds)
+    else:
+        _add(seconds=seconds)
+
+
+# --- Instrumentación del cliente ---------------------------------------------
+
+class _CountedStream:
+    """Stream de respuestas de lookup/runQuery que cuenta los documentos al consumirlo."""
+
+    def __init__(self, stream, is_document, query, seconds):
+        self._stream = stream
+        self._iterator = None
+        self._is_document = is_document
+        self._query = query
+        self._documents = 0
+        if query:
+            _add(queries=1, seconds=seconds)
+        else:
+            _add(seconds=seconds)
+
+    def _count(self, response, seconds):
+        if self._is_document(response):
+            self._documents += 1
+            _add(reads=1, seconds=seconds)
+        else:
+            _add(seconds=seconds)
+
+    def _exhausted(self, seconds):
+        # Una consulta sin resultados cobra una lectura.
+        _add(reads=1 if self._query and not self._documents else 0, seconds=seconds)
+
+    # Los streams de gRPC/api_core solo garantizan __iter__/__aiter__ (el stream async
+    # de api_core no tiene __anext__): se itera siempre el iterador que devuelven.
+
+    def __iter__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._stream)
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._stream)
+        started = time.perf_counter()
+        try:
+            response = next(self._iterator)
+        except StopIteration:
+            self._exhausted(time.perf_counter() - started)
+            raise
+        self._count(response, time.perf_counter() - started)
+        return response
+
+    def __aiter__(self):
+        if self._iterator is None:
+            self._iterator = self._stream.__aiter__()
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._stream.__aiter__()
+        started = time.perf_counter()
+        try:
+            response = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._exhausted(time.perf_counter() - started)
+            raise
+        self._count(response, time.perf_counter() - started)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _is_lookup_result(response):
+    return bool(response.missing) or 'found' in response
+
+
+def _is_query_result(response):
+    return 'document' in response
+
+
+def _commit_writes(args, kwargs):
+    commit_request = kwargs.get('request', args[0] if args else None)
+    if commit_request is None:
+        return len(kwargs.get('writes') or ())
+    if isinstance(commit_request, dict):
+        return len(commit_request.get('writes') or ())
+    return len(commit_request.writes)
+
+
+class _InstrumentedFirestoreApi:
+    """Envuelve la API gRPC (GAPIC) del cliente síncrono de Firestore."""
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def batch_get_documents(self, *args, **kwargs):
+        started = time.perf_counter()
+        stream = self._api.batch_get_documents(*args, **kwargs)
+        return _CountedStream(stream, _is_lookup_result, False, time.perf_counter() - started)
+
+    def run_query(self, *args, **kwargs):
+        started = time.perf_counter()
+        stream = self._api.run_query(*args, **kwargs)
+        return _CountedStream(stream, _is_query_result, True, time.perf_counter() - started)
+
+    def commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = self._api.commit(*args, **kwargs)
+        record('commit', _commit_writes(args, kwargs), time.perf_counter() - started)
+        return response
+
+    def begin_transaction(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = self._api.begin_transaction(*args, **kwargs)
+        record('transaction', 0, time.perf_counter() - started)
+        return response
+
+    def rollback(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._api.rollback(*args, **kwargs)
+        finally:
+            record('rollback', 0, time.perf_counter() - started)
+
+
+class _InstrumentedAsyncFirestoreApi(_InstrumentedFirestoreApi):
+    """Lo mismo para el cliente async (async_db): los métodos son corrutinas."""
+
+    async def batch_get_documents(self, *args, **kwargs):
+        started = time.perf_counter()
+        stream = await self._api.batch_get_documents(*args, **kwargs)
+        return _CountedStream(stream, _is_lookup_result, False, time.perf_counter() - started)
+
+    async def run_query(self, *args, **kwargs):
+        started = time.perf_counter()
+        stream = await self._api.run_query(*args, **kwargs)
+        return _CountedStream(stream, _is_query_result, True, time.perf_counter() - started)
+
+    async def commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = await self._api.commit(*args, **kwargs)
+        record('commit', _commit_writes(args, kwargs), time.perf_counter() - started)
+        return response
+
+    async def begin_transaction(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = await self._api.begin_transaction(*args, **kwargs)
+        record('transaction', 0, time.perf_counter() - started)
+        return response
+
+    async def rollback(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._api.rollback(*args, **kwargs)
+        finally:
+            record('rollback', 0, time.perf_counter() - started)
+
+
+def instrument(client):
+    """
+    Hace que las operaciones de 'client' (Firestore síncrono o async, o
+    MemoryClient) se cuenten. Idempotente; no hace nada sin FIRESTORE_STATS_ENABLED.
+    """
+    if not Config.FIRESTORE_STATS_ENABLED:
+        return client
+    if hasattr(client, 'observer'):
+        client.observer = record
+        return client
+    api = client._firestore_api  # crea la API gRPC si aún no existe
+    if not isinstance(api, _InstrumentedFirestoreApi):
+        from google.cloud.firestore_v1.async_client import AsyncClient
+        wrapper = _InstrumentedAsyncFirestoreApi if isinstance(client, AsyncClient) else _InstrumentedFirestoreApi
+        client._firestore_api_internal = wrapper(api)
+    return client
+
+
+# --- Hooks de la petición ----------------------------------------------------
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+
+
+def _start():
+    _current.set(OpStats())
+
+
+def _headers(response):
+    stats = _current.get()
+    if stats is None or not (current_app.debug or Config.FIRESTORE_STATS_HEADERS):
+        return response
+    # En una respuesta en streaming solo incluye lo leído antes de enviar las cabeceras.
+    counts = stats.as_dict()
+    response.headers['X-Firestore-Reads'] = str(counts['reads'])
+    response.headers['X-Firestore-Writes'] = str(counts['writes'])
+    response.headers['X-Firestore-Queries'] = str(counts['queries'])
+    response.headers['X-Firestore-Transactions'] = str(counts['transactions'])
+    response.headers['X-Firestore-Time-Ms'] = str(counts['firestoreMs'])
+    return response
+
+
+def _finish(exc):
+    # En teardown (después de enviar una respuesta en streaming) para contar todo.
+    stats = _current.get()
+    if stats is None:
+        return
+    _current.set(None)
+    route = _route()
+    counts = stats.as_dict()
+    budget = Config.FIRESTORE_READ_BUDGET
+    over_budget = bool(budget) and counts['reads'] > budget
+
+    key = (request.method, route)
+    with _routes_lock:
+        totals = _routes.get(key)
+        if totals is None:
+            totals = _routes[key] = {'requests': 0, 'overBudget': 0, 'maxReads': 0, 'stats': OpStats()}
+        totals['requests'] += 1
+        totals['overBudget'] += over_budget
+        totals['maxReads'] = max(totals['maxReads'], counts['reads'])
+    totals['stats'].add(reads=stats.reads, writes=stats.writes, queries=stats.queries,
+                        transactions=stats.transactions, seconds=stats.seconds)
+
+    if over_budget:
+        logger.warning("Petición sobre el presupuesto de lecturas de Firestore (%d): %s %s (%s) leyó %d "
+                       "documentos en %d consultas, %d escrituras, %.1f ms en Firestore.",
+                       budget, request.method, request.path, route, counts['reads'], counts['queries'],
+                       counts['writes'], counts['firestoreMs'])
+
+
+def init_app(app):
+    """Registra los hooks que cuentan las operaciones de cada petición (si FIRESTORE_STATS_ENABLED)."""
+    if not Config.FIRESTORE_STATS_ENABLED:
+        return
+    # Antes que el resto de hooks: login_required y compañía también leen de Firestore.
+    app.before_request_funcs.setdefault(None, []).insert(0, _start)
+    app.after_request(_headers)
+    app.teardown_request(_finish)
+
+
+def route_stats(top=50):
+    """Totales y medias por petición de cada ruta del proceso (las 'top' con más lecturas)."""
+    with _routes_lock:
+        rows = [(method, route, dict(totals)) for (method, route), totals in _routes.items()]
+    result = []
+    for method, route, totals in rows:
+        counts = totals.pop('stats').as_dict()
+        requests = totals['requests']
+        result.append(dict(totals, method=method, route=route, totals=counts,
+                           perRequest={name: round(value / requests, 2) for name, value in counts.items()}))
+    result.sort(key=lambda row: row['totals']['reads'], reverse=True)
+    return {'routes': result[:top], 'background': _background.as_dict()}
+
+
+def reset():
+    """Borra los agregados por ruta (ej. entre escenarios de un benchmark)."""
+    global _background
+    with _routes_lock:
+        _routes.clear()
+        _background = OpStats()
@@ -0,0 +1,47 @@
+# app/http_cache.py
+import hashlib
+from flask import current_app, g, has_request_context, request
+from app.config import Config
+
+# GET condicionales (ETag / If-None-Match) para las lecturas públicas.
+# Los servicios registran la versión (updateTime) de cada documento que leen para
+# la respuesta; el ETag se deriva de esas versiones y de la URL pedida, de modo
+# que un 304 se responde sin serializar el cuerpo.
+
+
+def record_version(doc_id, update_time):
+    """Registra la versión de un documento leído durante la petición actual."""
+    if has_request_context():
+        version = update_time.isoformat() if hasattr(update_time, 'isoformat') else str(update_time)
+        g.setdefault('_doc_versions', []).append(f"{doc_id}:{version}")
+
+
+def request_etag():
+    """ETag fuerte de la respuesta: URL completa (filtros, campos, cursor) + versiones leídas."""
+    digest = hashlib.sha1(request.full_path.encode('utf-8'))
+    for version in g.get('_doc_versions', []):
+        digest.update(b'\n' + version.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={Config.PUBLIC_CACHE_MAX_AGE}, must-revalidate'
+    return response
+
+
+def not_modified(etag):
+    """Si el cliente ya tiene esta versión devuelve la respuesta 304; si no, None."""
+    if request.if_none_match.contains(etag):
+        return _cache_headers(current_app.response_class(status=304), etag)
+    return None
+
+
+def conditional_response(build_response, etag=None):
+    """
+    Responde 304 si 'If-None-Match' coincide con el ETag; si no, construye la
+    respuesta con build_response() (solo entonces se serializa) y le añade
+    ETag y Cache-Control.
+    """
+    etag = etag or request_etag()
+    return not_modified(etag) or _cache_headers(current_app.make_response(build_response()), etag)
@@ -0,0 +1,35 @@
+# app/lazy.py
+import importlib
+import threading
+
+# Carga diferida de módulos pesados. Las rutas y los decoradores referencian los
+# servicios (y con ellos firebase_admin, google.cloud.firestore, gRPC y protobuf)
+# a través de un proxy que importa el módulo real en el primer acceso a un
+# atributo, en lugar de pagarlo al importar la app.
+
+
+class LazyModule:
+    """Proxy de un módulo que se importa en el primer acceso a uno de sus atributos."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        # Solo se llama para atributos que el proxy no tiene: los del módulo real.
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        state = 'cargado' if self._module is not None else 'sin cargar'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
@@ -0,0 +1,181 @@
+# app/lifecycle.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ciclo de vida de un worker en producción: calentamiento (canal de Firestore,
+# claves de firma, catálogo en memoria), readiness y apagado ordenado.
+# El balanceador solo debe enviar tráfico cuando /readyz responde 200, y deja
+# de hacerlo en cuanto el worker empieza a drenar.
+
+_lock = threading.Lock()
+_checks = {'firestore': False, 'authKeys': False, 'catalog': False}
+_errors = {}
+_draining = threading.Event()
+_warmup_thread = None
+_started_at = time.time()
+_phases = {}  # fase de arranque -> segundos (informe de tiempos de arranque)
+
+
+def record_phase(name, seconds):
+    with _lock:
+        _phases[name] = _phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name):
+    """Mide una fase del arranque (import, inicialización, calentamiento)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+def startup_report():
+    """Tiempos de arranque por fase, en milisegundos, en el orden en que ocurrieron."""
+    with _lock:
+        return {name: round(seconds * 1000, 1) for name, seconds in _phases.items()}
+
+
+def _mark(check, ok, error=None):
+    with _lock:
+        _checks[check] = ok
+        if error is None:
+            _errors.pop(check, None)
+        else:
+            _errors[check] = str(error)
+
+
+def _warm_firestore():
+    # Una lectura puntual abre el canal gRPC y completa la autenticación del cliente.
+    from app import db
+    with phase('warmup.firestore'):
+        db.collection('_health').document('ping').get()
+
+
+def _warm_auth_keys():
+    if not Config.AUTH_LOCAL_VERIFY:
+        return True
+    from app import init_firebase
+    from app.auth import token_verifier
+    init_firebase()
+    with phase('warmup.authKeys'):
+        verifier = token_verifier.get_verifier()
+        if not verifier.ready:
+            verifier.refresh_keys()
+    return verifier.ready
+
+
+def _warm_catalog():
+    if not Config.CATALOG_CACHE_ENABLED:
+        return True
+    from app.services import catalog_cache
+    with phase('warmup.catalog'):
+        return catalog_cache.is_available()
+
+
+def _import_services():
+    """Importa los servicios que las rutas cargan en diferido, fuera del camino de la primera petición."""
+    import importlib
+    names = ['user_service', 'product_service', 'rating_service', 'report_service', 'saved_service',
+             'transaction_service', 'chat_service', 'auth_service']
+    if Config.ASYNC_MODE:
+        names.append('async_reads')
+    with phase('import.services'):
+        for name in names:
+            importlib.import_module(f'app.services.{name}')
+
+
+def _start_background():
+    """Arranca los componentes en segundo plano del worker."""
+    from app.services import task_queue
+    task_queue.start()
+    if Config.RESERVATION_SWEEP_ENABLED:
+        # Planificador que libera los productos de reservas abandonadas.
+        from app.services import reservation_expiry
+        reservation_expiry.start()
+
+
+def _warmup():
+    try:
+        _import_services()
+        _start_background()
+    except Exception as e:
+        logger.warning("Error arrancando los componentes del worker: %s", e)
+    for check, warm in (('firestore', _warm_firestore), ('authKeys', _warm_auth_keys), ('catalog', _warm_catalog)):
+        for attempt in range(Config.WARMUP_ATTEMPTS):
+            try:
+                result = warm()
+                if result is None or result:
+                    _mark(check, True)
+                    break
+                _mark(check, False, "aún no disponible")
+            except Exception as e:
+                _mark(check, False, e)
+            time.sleep(min(2 ** attempt, 10))
+        else:
+            logger.warning("Calentamiento incompleto de '%s': %s", check, _errors.get(check))
+    logger.info("Worker calentado en %.1fs: %s. Tiempos de arranque (ms): %s",
+                time.time() - _started_at, readiness()[1]['checks'], startup_report())
+
+
+def start_warmup():
+    """Lanza el calentamiento en segundo plano (idempotente)."""
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=_warmup, name='warmup', daemon=True)
+        _warmup_thread.start()
+
+
+def ensure_started():
+    """Hook before_request: la primera petición de un worker lanza el calentamiento."""
+    if _warmup_thread is None:
+        start_warmup()
+
+
+def readiness():
+    """Devuelve (listo, detalle). Listo = todo calentado y el worker no está drenando."""
+    with _lock:
+        checks = dict(_checks)
+        errors = dict(_errors)
+    # El catálogo puede desconectarse después del arranque: se evalúa en vivo (sin bloquear).
+    if checks['catalog'] and Config.CATALOG_CACHE_ENABLED:
+        from app.services import catalog_cache
+        checks['catalog'] = catalog_cache.stats()['listenerActive']
+    ready = all(checks.values()) and not _draining.is_set()
+    return ready, {'ready': ready, 'draining': _draining.is_set(), 'checks': checks, 'errors': errors,
+                   'startupMs': startup_report()}
+
+
+def begin_drain():
+    """Marca el worker como drenando: /readyz pasa a 503 mientras termina las peticiones en curso."""
+    _draining.set()
+
+
+def shutdown(timeout=None):
+    """
+    Apagado ordenado de los componentes en segundo plano del worker, después de
+    que el servidor terminó de atender las peticiones en curso.
+    """
+    _draining.set()
+    from app.services import catalog_cache, task_queue, reservation_expiry
+    from app import async_db, concurrency
+    from app.auth import token_verifier
+
+    for name, stop in (('reservation_expiry', reservation_expiry.stop),
+                       ('catalog_cache', catalog_cache.stop),
+                       ('task_queue', lambda: task_queue.shutdown(wait=True)),
+                       ('concurrency', lambda: concurrency.shutdown(wait=False)),
+                       ('async_db', async_db.shutdown),
+                       ('token_verifier', lambda: token_verifier._verifier and token_verifier._verifier.stop())):
+        try:
+            stop()
+        except Exception as e:
+            logger.warning("Error deteniendo %s: %s", name, e)
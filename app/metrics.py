@@ -0,0 +1,119 @@
+# app/metrics.py
+import os
+import time
+from flask import g, request
+from app import db_stats
+from app.config import Config
+
+# Métricas de Prometheus de las peticiones HTTP, expuestas en GET /metrics.
+# Las etiquetas son el blueprint y la regla de la ruta (ej. '/products/<product_id>'),
+# nunca la URL concreta, para acotar la cardinalidad; agregando por 'blueprint'
+# se obtienen las series por blueprint.
+#
+# Con varios procesos (gunicorn) cada worker escribe sus valores en
+# PROMETHEUS_MULTIPROC_DIR y /metrics agrega los de todos los workers, vivos y
+# muertos (ver gunicorn.conf.py); sin esa variable se exportan los del proceso.
+
+UNMATCHED_ROUTE = 'unmatched'
+EXCLUDED_ENDPOINTS = {'metrics.export'}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+READS_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_metrics = None
+
+
+def _labels():
+    rule = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+    return request.blueprint or '', rule
+
+
+def _create_metrics():
+    from prometheus_client import Counter, Gauge, Histogram
+    labels = ['blueprint', 'route', 'method']
+    return {
+        'requests': Counter('http_requests_total', "Peticiones HTTP atendidas.", labels + ['status']),
+        'latency': Histogram('http_request_duration_seconds', "Latencia de las peticiones HTTP.",
+                             labels, buckets=LATENCY_BUCKETS),
+        'in_flight': Gauge('http_requests_in_flight', "Peticiones HTTP en curso.", ['blueprint', 'route'],
+                           multiprocess_mode='livesum'),
+        'request_size': Histogram('http_request_size_bytes', "Tamaño del cuerpo de las peticiones.",
+                                  labels, buckets=SIZE_BUCKETS),
+        'response_size': Histogram('http_response_size_bytes', "Tamaño del cuerpo de las respuestas.",
+                                   labels, buckets=SIZE_BUCKETS),
+        # Contabilidad de Firestore de cada petición (ver app/db_stats.py).
+        'firestore_ops': Counter('http_request_firestore_operations_total',
+                                 "Documentos leídos y escritos, consultas y transacciones de Firestore.",
+                                 labels + ['operation']),
+        'firestore_reads': Histogram('http_request_firestore_reads', "Documentos de Firestore leídos por petición.",
+                                     labels, buckets=READS_BUCKETS),
+        'firestore_time': Histogram('http_request_firestore_seconds', "Tiempo esperando a Firestore por petición.",
+                                    labels, buckets=LATENCY_BUCKETS),
+    }
+
+
+def _start():
+    if request.endpoint in EXCLUDED_ENDPOINTS:
+        return
+    g._metrics_labels = _labels()
+    g._metrics_started = time.perf_counter()
+    _metrics['in_flight'].labels(*g._metrics_labels).inc()
+
+
+def _record(response):
+    labels = g.pop('_metrics_labels', None)
+    if labels is None:
+        return response
+    elapsed = time.perf_counter() - g.pop('_metrics_started')
+    g._metrics_in_flight = labels  # se descuenta en teardown, también si la respuesta falla
+    method = request.method
+    _metrics['requests'].labels(*labels, method, str(response.status_code)).inc()
+    _metrics['latency'].labels(*labels, method).observe(elapsed)
+    _metrics['request_size'].labels(*labels, method).observe(request.content_length or 0)
+    # Las respuestas en streaming (NDJSON) no tienen tamaño conocido.
+    if response.content_length is not None:
+        _metrics['response_size'].labels(*labels, method).observe(response.content_length)
+    return response
+
+
+def _finish(exc):
+    labels = g.pop('_metrics_in_flight', None) or g.pop('_metrics_labels', None)
+    if labels is None:
+        return
+    _metrics['in_flight'].labels(*labels).dec()
+    # En teardown, para incluir lo leído mientras se envía una respuesta en streaming.
+    stats = db_stats.current()
+    if stats is not None:
+        method = request.method
+        for operation in db_stats.OpStats.FIELDS:
+            value = getattr(stats, operation)
+            if value:
+                _metrics['firestore_ops'].labels(*labels, method, operation).inc(value)
+        _metrics['firestore_reads'].labels(*labels, method).observe(stats.reads)
+        _metrics['firestore_time'].labels(*labels, method).observe(stats.seconds)
+
+
+def init_app(app):
+    """Registra los hooks que miden cada petición (si METRICS_ENABLED)."""
+    global _metrics
+    if not Config.METRICS_ENABLED:
+        return
+    if _metrics is None:
+        _metrics = _create_metrics()
+    # Antes que el resto de hooks, para medir también su coste.
+    app.before_request_funcs.setdefault(None, []).insert(0, _start)
+    app.after_request(_record)
+    app.teardown_request(_finish)
+
+
+def render():
+    """Devuelve (cuerpo, content type) en el formato de texto de Prometheus."""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
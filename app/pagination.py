@@ -0,0 +1,148 @@
+# app/pagination.py
+import base64
+import json
+from datetime import datetime
+from flask import request, jsonify
+from app.config import Config
+
+# Paginación por cursor para los endpoints de listado.
+# El cursor es opaco para el cliente: codifica los valores de orden del último
+# documento devuelto, que se pasan a Firestore con start_after().
+
+DOCUMENT_ID = '__name__'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'$ts': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and '$ts' in value:
+        return datetime.fromisoformat(value['$ts'])
+    return value
+
+
+def encode_cursor(fields, values):
+    """Codifica los campos de orden y sus valores en un cursor opaco (base64 url-safe)."""
+    payload = {'o': list(fields), 'v': [_encode_value(v) for v in values]}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """Decodifica un cursor y verifica que corresponda al mismo orden de la consulta."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(v) for v in payload['v']]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("El parámetro 'cursor' no es válido.")
+
+    if payload.get('o') != list(fields) or len(values) != len(fields):
+        raise ValueError("El parámetro 'cursor' no corresponde a esta consulta.")
+    return values
+
+
+def get_page_args():
+    """
+    Lee '?limit=' y '?cursor=' de la petición actual.
+    Devuelve (limit, cursor); limit es None si el cliente no pidió paginar.
+    """
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit')
+
+    if limit is None:
+        return (Config.DEFAULT_PAGE_SIZE if cursor else None), cursor
+
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("El parámetro 'limit' debe ser un número entero.")
+    if not 1 <= limit <= Config.MAX_PAGE_SIZE:
+        raise ValueError(f"El parámetro 'limit' debe estar entre 1 y {Config.MAX_PAGE_SIZE}.")
+    return limit, cursor
+
+
+def is_paginated():
+    """True si la petición actual usa paginación por cursor."""
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def page_response(items, next_cursor):
+    """
+    Respuesta de un listado. Con paginación devuelve {'items', 'nextCursor'};
+    sin ella mantiene la lista plana que ya consumen los clientes.
+    """
+    if is_paginated():
+        return jsonify({'items': items, 'nextCursor': next_cursor}), 200
+    return jsonify(items), 200
+
+
+def _apply_order(query, order_by):
+    """Ordena por los campos dados y por el ID del documento. Devuelve (query, campos)."""
+    from firebase_admin import firestore
+    orders = list(order_by)
+    direction = orders[-1][1] if orders else firestore.Query.ASCENDING
+    orders.append((DOCUMENT_ID, direction))
+    for field, field_direction in orders:
+        query = query.order_by(field, direction=field_direction)
+    return query, [field for field, _ in orders]
+
+
+def stream_query(query, order_by=()):
+    """
+    Itera los documentos de la consulta con el mismo orden estable que
+    paginate_query, sin materializar el resultado completo en memoria.
+    """
+    query, _ = _apply_order(query, order_by)
+    yield from query.stream()
+
+
+def prepare_page_query(query, order_by=(), limit=None, cursor=None, select=None):
+    """
+    Aplica a la consulta un orden estable (los campos de 'order_by' más el ID del
+    documento como desempate), el cursor y el límite (+1 para saber si hay otra página).
+
+    'order_by' es una lista de tuplas (campo, dirección).
+    'select' limita los campos descargados (se añaden los de orden, necesarios para el cursor).
+    Devuelve (query, campos de orden). Sirve igual para el cliente síncrono y el async.
+    """
+    query, fields = _apply_order(query, order_by)
+
+    if select is not None:
+        query = query.select(list(dict.fromkeys([*select, *fields[:-1]])))
+
+    if cursor:
+        query = query.start_after(decode_cursor(cursor, fields))
+
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query, fields
+
+
+def finish_page(docs, fields, limit):
+    """Recorta los documentos leídos a la página pedida. Devuelve (snapshots, next_cursor)."""
+    if limit is None or len(docs) <= limit:
+        return docs, None
+
+    docs = docs[:limit]
+    last = docs[-1]
+    values = [last.id if field == DOCUMENT_ID else last.get(field) for field in fields]
+    return docs, encode_cursor(fields, values)
+
+
+def paginate_query(query, order_by=(), limit=None, cursor=None, select=None):
+    """
+    Ejecuta una página de la consulta (ver prepare_page_query).
+    Devuelve (snapshots, next_cursor); next_cursor es None en la última página.
+    """
+    query, fields = prepare_page_query(query, order_by, limit, cursor, select)
+    return finish_page(list(query.stream()), fields, limit)
+
+
+async def apaginate_query(query, order_by=(), limit=None, cursor=None, select=None):
+    """Versión para el cliente async de Firestore de paginate_query."""
+    query, fields = prepare_page_query(query, order_by, limit, cursor, select)
+    return finish_page([doc async for doc in query.stream()], fields, limit)
@@ -0,0 +1,75 @@
+# app/projection.py
+from flask import request
+
+# Proyección de campos (?fields=brand,price) para los endpoints de lectura.
+# Los campos pedidos se envían a Firestore con select() / get(field_paths=...),
+# así los demás ni se descargan, ni pasan por clean_firestore_doc, ni se serializan.
+
+# Campos que un cliente puede pedir, por colección ('id' siempre está permitido).
+PROJECTABLE_FIELDS = {
+    'products': {'sellerId', 'buyerId', 'brand', 'model', 'storage', 'price', 'imei', 'description',
+                 'imageUrls', 'boxImageUrl', 'invoiceUrl', 'status', 'active',
+                 'createdAt', 'updatedAt', 'soldAt'},
+    'users': {'firstName', 'lastName', 'email', 'approved', 'role', 'active', 'createdAt', 'updatedAt',
+              'dniNumber', 'dniFrontUrl', 'dniBackUrl'},
+    'ratings': {'productId', 'buyerId', 'sellerId', 'score', 'comment', 'active', 'createdAt'},
+    'transactions': {'productId', 'buyerId', 'sellerId', 'status', 'active', 'timestamp',
+                     'createdAt', 'completedAt'},
+}
+
+# Campos sensibles que solo pueden seleccionar un admin o el propio usuario.
+RESTRICTED_FIELDS = {
+    'users': {'dniNumber', 'dniFrontUrl', 'dniBackUrl'},
+}
+
+
+def get_fields(collection, allow_restricted=True):
+    """
+    Lee '?fields=' de la petición actual y lo valida contra la lista permitida.
+    Devuelve la lista de campos (sin 'id') o None si no se pidió proyección.
+    """
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+
+    allowed = PROJECTABLE_FIELDS[collection]
+    if not allow_restricted:
+        allowed = allowed - RESTRICTED_FIELDS.get(collection, set())
+
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    invalid = [f for f in fields if f != 'id' and f not in allowed]
+    if invalid:
+        raise ValueError(f"Campos no permitidos en 'fields': {', '.join(invalid)}.")
+    return [f for f in dict.fromkeys(fields) if f != 'id']
+
+
+def select_fields(fields, *internal):
+    """Campos a pedir a Firestore: los solicitados más los que el servicio necesita internamente."""
+    return list(dict.fromkeys([*fields, *internal]))
+
+
+def project(doc_data, fields):
+    """Deja en el documento solo los campos solicitados (y el 'id'). Con fields=None no hace nada."""
+    if fields is None:
+        return doc_data
+    projected = {k: doc_data[k] for k in fields if k in doc_data}
+    if 'id' in doc_data:
+        projected['id'] = doc_data['id']
+    return projected
+
+
+def can_view_restricted(viewer, owner_id):
+    """
+    True si 'viewer' (el usuario autenticado, g.user) puede ver los campos
+    restringidos de un documento de 'owner_id': es el propio usuario o un admin.
+    viewer=None es una llamada interna del servidor (ej. login_required).
+    """
+    return viewer is None or viewer.get('role') == 'admin' or viewer.get('id') == owner_id
+
+
+def redact(collection, doc_data, allowed):
+    """Quita del documento los RESTRICTED_FIELDS de la colección, salvo que 'allowed'."""
+    restricted = RESTRICTED_FIELDS.get(collection)
+    if allowed or not restricted:
+        return doc_data
+    return {k: v for k, v in doc_data.items() if k not in restricted}
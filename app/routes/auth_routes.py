@@ -1,6 +1,8 @@
 # app/routes/auth_routes.py
 from flask import Blueprint, request, jsonify
-from app.services import auth_service
+from app.lazy import lazy_module
+
+auth_service = lazy_module('app.services.auth_service')
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
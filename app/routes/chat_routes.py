@@ -1,8 +1,10 @@
 # app/routes/chat_routes.py
 from flask import Blueprint, request, jsonify, g
-from app.services import chat_service
+from app.lazy import lazy_module
 from app.auth.decorators import login_required
 
+chat_service = lazy_module('app.services.chat_service')
+
 bp = Blueprint('chats', __name__, url_prefix='/chats')
 
 @bp.route('', methods=['POST'])
@@ -0,0 +1,16 @@
+# app/routes/health_routes.py
+from flask import Blueprint, jsonify
+from app import lifecycle
+
+bp = Blueprint('health', __name__)
+
+@bp.route('/healthz', methods=['GET'])
+def liveness():
+    """Liveness: el proceso responde (no comprueba dependencias)."""
+    return jsonify({"status": "ok"}), 200
+
+@bp.route('/readyz', methods=['GET'])
+def readiness():
+    """Readiness: 200 solo con Firestore, claves de firma y catálogo calentados, y sin drenar."""
+    ready, detail = lifecycle.readiness()
+    return jsonify(detail), 200 if ready else 503
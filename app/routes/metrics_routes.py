@@ -0,0 +1,18 @@
+# app/routes/metrics_routes.py
+from flask import Blueprint, Response, jsonify
+from app import db_stats, metrics
+from app.auth.decorators import admin_required
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def export():
+    """Métricas de las peticiones HTTP en formato de texto de Prometheus (todos los workers)."""
+    body, content_type = metrics.render()
+    return Response(body, status=200, content_type=content_type)
+
+@bp.route('/metrics/firestore', methods=['GET'])
+@admin_required
+def firestore_stats():
+    """ADMIN ONLY: Lecturas, escrituras, consultas y transacciones de Firestore por ruta en este proceso."""
+    return jsonify(db_stats.route_stats()), 200
@@ -1,26 +1,116 @@
 # app/routes/product_routes.py
-from flask import Blueprint, request, jsonify, g
-from app.services import product_service
+from flask import Blueprint, Response, request, jsonify, g
+from app.lazy import lazy_module
+from app.async_db import read
 from app.auth.decorators import login_required
+from app.pagination import get_page_args, page_response, is_paginated
+from app.config import Config
+from app.utils import parse_batch_ids
+from app.projection import get_fields
+from app.http_cache import conditional_response
+
+product_service = lazy_module('app.services.product_service')
+catalog_cache = lazy_module('app.services.catalog_cache')
+search_index = lazy_module('app.services.search_index')
 
 bp = Blueprint('products', __name__, url_prefix='/products')
 
+SORT_OPTIONS = ['price', '-price', 'createdAt', '-createdAt']
+
+def _get_catalog_filters():
+    """Lee los filtros y el orden del catálogo desde la query string."""
+    filters = {k: request.args[k] for k in catalog_cache.INDEXED_FIELDS if request.args.get(k)}
+    for k in ['minPrice', 'maxPrice']:
+        if request.args.get(k):
+            try:
+                filters[k] = float(request.args[k])
+            except ValueError:
+                raise ValueError(f"El parámetro '{k}' debe ser numérico.")
+
+    sort = request.args.get('sort') or None
+    if sort and sort not in SORT_OPTIONS:
+        raise ValueError(f"El parámetro 'sort' debe ser uno de: {', '.join(SORT_OPTIONS)}.")
+    return filters, sort
+
 @bp.route('', methods=['GET'])
 def get_all():
-    """Obtiene una lista de todos los productos disponibles (público)."""
+    """
+    Obtiene una lista de todos los productos disponibles (público).
+    Filtros opcionales: brand, model, storage, minPrice, maxPrice.
+    Orden opcional: sort=price|-price|createdAt|-createdAt. Admite ?limit=, ?cursor= y ?fields=.
+    """
     try:
-        products = product_service.list_all_products()
-        return jsonify(products), 200
+        filters, sort = _get_catalog_filters()
+        fields = get_fields('products')
+
+        # El catálogo completo se sirve desde la caché en memoria, ya serializado.
+        if not is_paginated() and not filters and not sort and fields is None:
+            cached = catalog_cache.get_catalog_json()
+            if cached is not None:
+                body, etag = cached
+                return conditional_response(lambda: Response(body, status=200, mimetype='application/json'),
+                                            etag=etag)
+
+        limit, cursor = get_page_args()
+        products, next_cursor = read(product_service.list_all_products, filters=filters, sort=sort,
+                                     limit=limit, cursor=cursor, fields=fields)
+        return conditional_response(lambda: page_response(products, next_cursor))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/search', methods=['GET'])
+def search():
+    """
+    Búsqueda de texto completo sobre marca, modelo, almacenamiento y descripción (público).
+    ?q= es la consulta; el último término se trata como prefijo (typeahead) salvo
+    con ?typeahead=0. ?limit= acota el número de resultados, ordenados por relevancia.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Falta el parámetro requerido: 'q'"}), 400
+    try:
+        limit = int(request.args.get('limit', Config.DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        return jsonify({"error": "El parámetro 'limit' debe ser un número entero."}), 400
+    limit = max(1, min(limit, Config.MAX_PAGE_SIZE))
+
+    try:
+        typeahead = request.args.get('typeahead', '1') != '0'
+        results = search_index.search(query, limit=limit, typeahead=typeahead)
+        return jsonify(results), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/batchGet', methods=['POST'])
+def batch_get():
+    """
+    Obtiene varios productos por su ID en una sola petición (público).
+    Recibe {"ids": [...]} y devuelve {"items": [...], "missing": [...]} en el orden pedido.
+    """
+    try:
+        ids = parse_batch_ids(request.get_json(silent=True), Config.MAX_BATCH_GET)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        items, missing = product_service.get_products_by_ids(ids)
+        return jsonify({"items": items, "missing": missing}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/<product_id>', methods=['GET'])
 def get_one(product_id):
-    """Obtiene un producto específico por su ID (público)."""
-    product = product_service.get_product_by_id(product_id)
+    """Obtiene un producto específico por su ID (público). Admite ?fields=."""
+    try:
+        fields = get_fields('products')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    product = read(product_service.get_product_by_id, product_id, fields=fields)
     if not product:
         return jsonify({"error": "Producto no encontrado"}), 404
-    return jsonify(product), 200
+    return conditional_response(lambda: (jsonify(product), 200))
 
 @bp.route('', methods=['POST'])
 @login_required # Requiere que el usuario esté autenticado
@@ -52,8 +142,13 @@ def get_my_purchases():
     o comprado (sold).
     """
     try:
-        prods = product_service.list_user_products(g.user['id'])
-        return jsonify(prods), 200
+        limit, cursor = get_page_args()
+        fields = get_fields('products')
+        prods, next_cursor = product_service.list_user_products(g.user['id'], limit=limit, cursor=cursor,
+                                                                fields=fields)
+        return page_response(prods, next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -62,11 +157,19 @@ def get_my_purchases():
 def purchase_product_endpoint(product_id):
     """
     Endpoint para marcar un producto como comprado.
-    Solo puede invocarlo el vendedor o un admin.
+    Solo puede invocarlo el vendedor o un admin. El comprador es el de la reserva;
+    si el producto no estaba reservado hay que indicarlo en el cuerpo ('buyerId').
     """
     user = g.user
     seller_id = user['id']
-    buyer_id = user['id']
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "El cuerpo debe ser un objeto JSON."}), 400
+    buyer_id = body.get('buyerId')
+    if buyer_id is not None and (not isinstance(buyer_id, str) or not buyer_id):
+        return jsonify({"error": "'buyerId' debe ser el ID de un usuario."}), 400
     is_admin = user.get('role') == 'admin'
 
     try:
@@ -78,6 +181,10 @@ def purchase_product_endpoint(product_id):
         )
         return jsonify(updated), 200
 
+    except product_service.PurchaseConflict as e:
+        return jsonify({"error": str(e)}), 409
+    except product_service.InvalidBuyer as e:
+        return jsonify({"error": str(e)}), 400
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 404
     except PermissionError as pe:
@@ -93,8 +200,13 @@ def get_my_products():
     """
     try:
         seller_id = g.user['id']
-        my_products = product_service.list_products_by_seller(seller_id)
-        return jsonify(my_products), 200
+        limit, cursor = get_page_args()
+        fields = get_fields('products')
+        my_products, next_cursor = product_service.list_products_by_seller(seller_id, limit=limit, cursor=cursor,
+                                                                           fields=fields)
+        return page_response(my_products, next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
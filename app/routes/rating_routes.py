@@ -1,27 +1,78 @@
 # app/routes/rating_routes.py
 from flask import Blueprint, request, jsonify, g
-from app.services import rating_service
+from app.lazy import lazy_module
+from app.async_db import read
 from app.auth.decorators import login_required
+from app.pagination import get_page_args, page_response
+from app.config import Config
+from app.utils import parse_batch_ids
+from app.projection import get_fields
+from app.http_cache import conditional_response
+
+rating_service = lazy_module('app.services.rating_service')
 
 bp = Blueprint('ratings', __name__, url_prefix='/ratings')
 
 @bp.route('', methods=['GET'])
 def get_all():
-    """Obtiene una lista de calificaciones. Puede filtrarse por producto (público)."""
+    """Obtiene una lista de calificaciones. Puede filtrarse por producto (público). Admite ?limit=, ?cursor= y ?fields=."""
+    product_id = request.args.get('productId')
+    try:
+        limit, cursor = get_page_args()
+        fields = get_fields('ratings')
+        ratings, next_cursor = read(rating_service.list_ratings, product_id=product_id, limit=limit,
+                                    cursor=cursor, fields=fields)
+        return conditional_response(lambda: page_response(ratings, next_cursor))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/batchGet', methods=['POST'])
+def batch_get():
+    """
+    Obtiene varios calificaciones por su ID en una sola petición (público).
+    Recibe {"ids": [...]} y devuelve {"items": [...], "missing": [...]} en el orden pedido.
+    """
+    try:
+        ids = parse_batch_ids(request.get_json(silent=True), Config.MAX_BATCH_GET)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        items, missing = rating_service.get_ratings_by_ids(ids)
+        return jsonify({"items": items, "missing": missing}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/summary', methods=['GET'])
+def summary():
+    """
+    Resumen de calificaciones (cantidad, promedio y distribución) de un producto
+    o de un vendedor (público). Requiere ?productId= o ?sellerId=, uno solo.
+    """
     product_id = request.args.get('productId')
+    seller_id = request.args.get('sellerId')
+    if bool(product_id) == bool(seller_id):
+        return jsonify({"error": "Indica 'productId' o 'sellerId' (solo uno)."}), 400
+
     try:
-        ratings = rating_service.list_ratings(product_id=product_id)
-        return jsonify(ratings), 200
+        result = read(rating_service.get_rating_summary, product_id=product_id, seller_id=seller_id)
+        return conditional_response(lambda: (jsonify(result), 200))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/<rating_id>', methods=['GET'])
 def get_one(rating_id):
-    """Obtiene una calificación específica por su ID (público)."""
-    rating = rating_service.get_rating_by_id(rating_id)
+    """Obtiene una calificación específica por su ID (público). Admite ?fields=."""
+    try:
+        fields = get_fields('ratings')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rating = read(rating_service.get_rating_by_id, rating_id, fields=fields)
     if not rating:
         return jsonify({"error": "Calificación no encontrada"}), 404
-    return jsonify(rating), 200
+    return conditional_response(lambda: (jsonify(rating), 200))
 
 @bp.route('', methods=['POST'])
 @login_required # Requiere que el usuario esté autenticado
@@ -32,8 +83,10 @@ def create():
     if not data or not all(k in data for k in required):
         return jsonify({"error": "Faltan campos requeridos: 'productId' y 'score'"}), 400
     
-    if not 1 <= int(data['score']) <= 5:
-        return jsonify({"error": "El 'score' debe ser un número entre 1 y 5."}), 400
+    try:
+        rating_service.parse_score(data['score'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     try:
         # El 'buyerId' se toma del usuario autenticado
@@ -52,6 +105,12 @@ def update(rating_id):
     data = request.get_json()
     if not data:
         return jsonify({"error": "Cuerpo de la petición vacío"}), 400
+
+    if 'score' in data:
+        try:
+            rating_service.parse_score(data['score'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
     
     try:
         user_id = g.user['id']
@@ -1,27 +1,35 @@
 # app/routes/report_routes.py
 from flask import Blueprint, request, jsonify, g
-from app.services import report_service
+from app.lazy import lazy_module
+from app.async_db import read
 from app.auth.decorators import login_required
+from app.pagination import get_page_args, page_response
+from app.http_cache import conditional_response
+
+report_service = lazy_module('app.services.report_service')
 
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
 @bp.route('', methods=['GET'])
 def get_all():
-    """Obtiene una lista de todos los reportes. Puede filtrarse por producto (público)."""
+    """Obtiene una lista de todos los reportes. Puede filtrarse por producto (público). Admite ?limit= y ?cursor=."""
     product_id = request.args.get('productId')
     try:
-        reports = report_service.list_reports(product_id=product_id)
-        return jsonify(reports), 200
+        limit, cursor = get_page_args()
+        reports, next_cursor = read(report_service.list_reports, product_id=product_id, limit=limit, cursor=cursor)
+        return conditional_response(lambda: page_response(reports, next_cursor))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/<report_id>', methods=['GET'])
 def get_one(report_id):
     """Obtiene un reporte específico por su ID (público)."""
-    report = report_service.get_report_by_id(report_id)
+    report = read(report_service.get_report_by_id, report_id)
     if not report:
         return jsonify({"error": "Reporte no encontrado"}), 404
-    return jsonify(report), 200
+    return conditional_response(lambda: (jsonify(report), 200))
 
 @bp.route('', methods=['POST'])
 @login_required
@@ -1,20 +1,33 @@
 # app/routes/saved_routes.py
 from flask import Blueprint, request, jsonify, g
-from app.services import saved_service
+from app.lazy import lazy_module
 from app.auth.decorators import login_required
+from app.pagination import get_page_args, page_response
+from app.streaming import wants_stream, ndjson_response
+
+saved_service = lazy_module('app.services.saved_service')
 
 bp = Blueprint('saved', __name__, url_prefix='/saved')
 
 @bp.route('', methods=['GET'])
 @login_required
 def get_saved():
-    """Lista los elementos guardados. Admin ve todo, usuario ve solo lo suyo."""
+    """
+    Lista los elementos guardados. Admin ve todo, usuario ve solo lo suyo. Admite ?limit= y ?cursor=.
+    El listado de administrador admite streaming NDJSON con 'Accept: application/x-ndjson' / ?stream=1.
+    """
     try:
+        if g.user['role'] == 'admin' and wants_stream():
+            return ndjson_response(saved_service.iter_all_saved_items())
+
+        limit, cursor = get_page_args()
         if g.user['role'] == 'admin':
-            saved_items = saved_service.list_all_saved_items()
+            saved_items, next_cursor = saved_service.list_all_saved_items(limit=limit, cursor=cursor)
         else:
-            saved_items = saved_service.list_user_saved_items(g.user['id'])
-        return jsonify(saved_items), 200
+            saved_items, next_cursor = saved_service.list_user_saved_items(g.user['id'], limit=limit, cursor=cursor)
+        return page_response(saved_items, next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
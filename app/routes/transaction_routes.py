@@ -1,7 +1,13 @@
 # app/routes/transaction_routes.py
 from flask import Blueprint, request, jsonify, g
-from app.services import transaction_service
+from app.lazy import lazy_module
 from app.auth.decorators import login_required, admin_required
+from app.pagination import get_page_args, page_response
+from app.streaming import wants_stream, ndjson_response
+from app.projection import get_fields
+
+transaction_service = lazy_module('app.services.transaction_service')
+reservation_expiry = lazy_module('app.services.reservation_expiry')
 
 bp = Blueprint('transactions', __name__, url_prefix='/transactions')
 
@@ -12,26 +18,55 @@ def get_transactions():
     Lista transacciones.
     - Si es admin, lista todas.
     - Si es usuario, lista solo aquellas en las que participa.
+    Admite ?fields=, ?limit= y ?cursor=. Para administradores admite además streaming
+    NDJSON con 'Accept: application/x-ndjson' / ?stream=1.
     """
     try:
+        fields = get_fields('transactions')
         if g.user['role'] == 'admin':
-            transactions = transaction_service.list_all_transactions()
-        else:
-            transactions = transaction_service.list_user_transactions(g.user['id'])
-        return jsonify(transactions), 200
+            if wants_stream():
+                return ndjson_response(transaction_service.iter_all_transactions())
+            limit, cursor = get_page_args()
+            transactions, next_cursor = transaction_service.list_all_transactions(limit=limit, cursor=cursor,
+                                                                                  fields=fields)
+            return page_response(transactions, next_cursor)
+        limit, cursor = get_page_args()
+        transactions, next_cursor = transaction_service.list_user_transactions(g.user['id'], limit=limit,
+                                                                               cursor=cursor, fields=fields)
+        return page_response(transactions, next_cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@bp.route('/reservation-stats', methods=['GET'])
+@admin_required
+def reservation_stats():
+    """ADMIN ONLY: Métricas de contención de las reservas en este proceso (intentos, abortos, reintentos)."""
+    return jsonify(transaction_service.reservation_stats()), 200
+
+
+@bp.route('/expiry-stats', methods=['GET'])
+@admin_required
+def expiry_stats():
+    """ADMIN ONLY: Estado del planificador de caducidad de reservas y su último barrido."""
+    return jsonify(reservation_expiry.stats()), 200
+
+
 @bp.route('/<transaction_id>', methods=['GET'])
 @login_required
 def get_one(transaction_id):
-    """Obtiene una transacción específica si el usuario es parte de ella o admin."""
+    """Obtiene una transacción específica si el usuario es parte de ella o admin. Admite ?fields=."""
     try:
-        transaction = transaction_service.get_transaction_by_id(transaction_id, g.user['id'], g.user['role'])
+        fields = get_fields('transactions')
+        transaction = transaction_service.get_transaction_by_id(transaction_id, g.user['id'], g.user['role'],
+                                                                fields=fields)
         if not transaction:
             return jsonify({"error": "Transacción no encontrada"}), 404
         return jsonify(transaction), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except PermissionError as e:
         return jsonify({"error": str(e)}), 403
     except Exception as e:
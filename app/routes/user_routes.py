@@ -1,7 +1,15 @@
 # app/routes/user_routes.py
 from flask import Blueprint, request, jsonify, g
-from app.services import user_service
+from app.lazy import lazy_module
+from app.async_db import read
 from app.auth.decorators import login_required, admin_required
+from app.pagination import get_page_args, page_response
+from app.streaming import wants_stream, ndjson_response
+from app.config import Config
+from app.utils import parse_batch_ids
+from app.projection import get_fields, project
+
+user_service = lazy_module('app.services.user_service')
 
 bp = Blueprint('users', __name__, url_prefix='/users')
 
@@ -10,22 +18,62 @@ bp = Blueprint('users', __name__, url_prefix='/users')
 @bp.route('', methods=['GET'])
 @admin_required
 def list_users():
-    """Lista todos los usuarios (solo para administradores)."""
-    users = user_service.get_all_users()
-    return jsonify(users), 200
+    """
+    Lista todos los usuarios (solo para administradores). Admite ?limit=, ?cursor= y ?fields=,
+    o streaming NDJSON con 'Accept: application/x-ndjson' / ?stream=1.
+    """
+    if wants_stream():
+        return ndjson_response(user_service.iter_all_users())
+    try:
+        limit, cursor = get_page_args()
+        fields = get_fields('users')
+        users, next_cursor = read(user_service.get_all_users, limit=limit, cursor=cursor, fields=fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return page_response(users, next_cursor)
 
 @bp.route('/me', methods=['GET'])
 @login_required
 def get_me():
-    """Ruta de conveniencia para que un usuario obtenga su propio perfil."""
+    """Ruta de conveniencia para que un usuario obtenga su propio perfil. Admite ?fields=."""
+    try:
+        fields = get_fields('users')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     # g.user es cargado por el decorador @login_required
-    return jsonify(g.user), 200
+    return jsonify(project(g.user, fields)), 200
+
+@bp.route('/batchGet', methods=['POST'])
+@login_required
+def batch_get():
+    """
+    Obtiene varios perfiles de usuario por su ID en una sola petición (requiere autenticación).
+    Recibe {"ids": [...]} y devuelve {"items": [...], "missing": [...]} en el orden pedido.
+    Los datos del DNI solo se devuelven del propio perfil o siendo admin.
+    """
+    try:
+        ids = parse_batch_ids(request.get_json(silent=True), Config.MAX_BATCH_GET)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        items, missing = user_service.get_users_by_ids(ids, viewer=g.user)
+        return jsonify({"items": items, "missing": missing}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @bp.route('/<user_id>', methods=['GET'])
 @login_required
 def get_user(user_id):
-    """Obtiene un perfil de usuario por su ID."""
-    user = user_service.get_user_by_id(user_id)
+    """
+    Obtiene un perfil de usuario por su ID. Admite ?fields=; los datos del DNI solo
+    se devuelven (o pueden seleccionarse) sobre el propio perfil o siendo admin.
+    """
+    try:
+        fields = get_fields('users', allow_restricted=(user_id == g.user['id'] or g.user['role'] == 'admin'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    user = read(user_service.get_user_by_id, user_id, fields=fields, viewer=g.user)
     if not user: 
         return jsonify({"error": "Usuario no encontrado"}), 404
     return jsonify(user), 200
@@ -0,0 +1,82 @@
+# app/services/async_reads.py
+import asyncio
+from app import async_db
+from app.pagination import apaginate_query
+from app.projection import select_fields
+from app.async_db import mirrors as _mirrors
+from . import product_service, rating_service, report_service, user_service
+
+# Lecturas de las rutas más consultadas (products, ratings, reports, users) con el
+# cliente async de Firestore. Usan las mismas piezas que los servicios síncronos
+# (constructores de consultas y conversión de documentos), de modo que ambos modos
+# devuelven exactamente lo mismo; solo cambia cómo se espera a Firestore.
+
+@_mirrors(product_service.list_all_products)
+async def list_all_products(filters=None, sort=None, limit=None, cursor=None, fields=None):
+    filters = filters or {}
+    order_by = product_service.catalog_order(sort)
+
+    # La primera carga del catálogo puede esperar la instantánea inicial: fuera del loop.
+    cached = await asyncio.to_thread(product_service.cached_products, filters, order_by,
+                                     limit=limit, cursor=cursor, fields=fields)
+    if cached is not None:
+        return cached
+
+    query = product_service.catalog_query(async_db.client(), filters)
+    docs, next_cursor = await apaginate_query(query, order_by=order_by, limit=limit, cursor=cursor, select=fields)
+    return [product_service.product_from_doc(doc, fields) for doc in docs], next_cursor
+
+
+@_mirrors(product_service.get_product_by_id)
+async def get_product_by_id(product_id, fields=None):
+    field_paths = select_fields(fields, 'active') if fields is not None else None
+    doc = await async_db.client().collection('products').document(product_id).get(field_paths=field_paths)
+    return product_service.product_from_doc(doc, fields)
+
+
+@_mirrors(rating_service.list_ratings)
+async def list_ratings(product_id=None, limit=None, cursor=None, fields=None):
+    query = rating_service.ratings_query(async_db.client(), product_id)
+    docs, next_cursor = await apaginate_query(query, limit=limit, cursor=cursor, select=fields)
+    return [rating_service.rating_from_doc(doc, fields) for doc in docs], next_cursor
+
+
+@_mirrors(rating_service.get_rating_by_id)
+async def get_rating_by_id(rating_id, fields=None):
+    field_paths = select_fields(fields, 'active') if fields is not None else None
+    doc = await async_db.client().collection('ratings').document(rating_id).get(field_paths=field_paths)
+    return rating_service.rating_from_doc(doc, fields)
+
+
+@_mirrors(rating_service.get_rating_summary)
+async def get_rating_summary(product_id=None, seller_id=None):
+    kind, target_id = rating_service.summary_target(product_id, seller_id)
+    doc = await rating_service._summary_ref(kind, target_id, async_db.client()).get()
+    return rating_service.summary_from_doc(kind, target_id, doc)
+
+
+@_mirrors(report_service.list_reports)
+async def list_reports(product_id=None, limit=None, cursor=None):
+    query = report_service.reports_query(async_db.client(), product_id)
+    docs, next_cursor = await apaginate_query(query, limit=limit, cursor=cursor)
+    return [report_service.report_from_doc(doc) for doc in docs], next_cursor
+
+
+@_mirrors(report_service.get_report_by_id)
+async def get_report_by_id(report_id):
+    doc = await async_db.client().collection('reports').document(report_id).get()
+    return report_service.report_from_doc(doc)
+
+
+@_mirrors(user_service.get_all_users)
+async def get_all_users(limit=None, cursor=None, fields=None):
+    docs, next_cursor = await apaginate_query(user_service.users_query(async_db.client()),
+                                              limit=limit, cursor=cursor, select=fields)
+    return [user_service.user_from_doc(doc, fields) for doc in docs], next_cursor
+
+
+@_mirrors(user_service.get_user_by_id)
+async def get_user_by_id(user_id, fields=None, viewer=None):
+    field_paths = select_fields(fields, 'active') if fields is not None else None
+    doc = await async_db.client().collection('users').document(user_id).get(field_paths=field_paths)
+    return user_service.user_from_doc(doc, fields, viewer)
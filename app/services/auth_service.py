@@ -1,6 +1,15 @@
 # app/services/auth_service.py
 from firebase_admin import auth
 from . import user_service # Importamos el servicio de usuario para crear el perfil
+from . import task_queue
+
+@task_queue.task('auth.delete_user')
+def _delete_auth_user(payload):
+    """Tarea: borra de Firebase Auth un usuario cuyo registro no se completó."""
+    try:
+        auth.delete_user(payload['uid'])
+    except auth.UserNotFoundError:
+        pass  # Ya fue borrado (ej. en un intento anterior).
 
 def register_user(data):
     """
@@ -32,7 +41,8 @@ def register_user(data):
         return user_profile
     except Exception as e:
         # Si falla la creación en Firestore, debemos borrar el usuario de Auth para evitar inconsistencias.
-        auth.delete_user(uid)
+        # El borrado se encola (con reintentos) para no sumar otra llamada a Auth a la respuesta.
+        task_queue.enqueue('auth.delete_user', {'uid': uid})
         raise Exception(f"Error creando perfil en Firestore: {e}")
 
 # NOTA SOBRE EL LOGIN:
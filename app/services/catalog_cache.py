@@ -0,0 +1,316 @@
+# app/services/catalog_cache.py
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.config import Config
+from app.pagination import DOCUMENT_ID, encode_cursor, decode_cursor
+from app.utils import clean_firestore_doc
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+# Caché en memoria del catálogo público (productos activos y aprobados).
+# Se carga una sola vez y se mantiene al día con un listener 'on_snapshot' sobre
+# la misma consulta que usa product_service.list_all_products. Además guarda la
+# respuesta JSON ya serializada para servir GET /products sin leer Firestore
+# ni volver a codificar.
+
+_lock = threading.RLock()
+_ready = threading.Event()
+
+_products = {}        # id -> producto limpio (clean_firestore_doc)
+_update_times = {}    # id -> updateTime del documento, para el ETag del catálogo
+_version = 0          # se incrementa con cada instantánea aplicada
+_body = None          # bytes JSON del catálogo completo
+_body_version = -1    # versión con la que se generó '_body'
+_etag = None          # ETag del catálogo (independiente del worker: deriva de los updateTime)
+_etag_version = -1
+_last_sync = None     # time.time() de la última instantánea recibida
+_watch = None
+_last_start = 0.0
+_reset_pending = False  # la próxima instantánea es una carga completa
+_listeners = []         # callbacks(changed, removed, reset) de índices derivados
+
+# Índices secundarios sobre el catálogo, reconstruidos de forma perezosa por versión.
+INDEXED_FIELDS = ('brand', 'model', 'storage')
+SORT_FIELDS = ('price', 'createdAt')
+_index = None
+_index_version = -1
+
+
+def _catalog_query():
+    return db.collection('products') \
+             .where(filter=firestore.FieldFilter('active', '==', True)) \
+             .where(filter=firestore.FieldFilter('status', '==', 'approved'))
+
+
+def _on_snapshot(docs, changes, read_time):
+    """Callback del listener: aplica los cambios incrementales al catálogo."""
+    global _version, _last_sync, _reset_pending
+    changed, removed = [], []
+    with _lock:
+        for change in changes:
+            doc = change.document
+            if change.type.name == 'REMOVED':
+                _products.pop(doc.id, None)
+                _update_times.pop(doc.id, None)
+                removed.append(doc.id)
+            else:
+                product_data = doc.to_dict()
+                product_data['id'] = doc.id
+                _products[doc.id] = clean_firestore_doc(product_data)
+                _update_times[doc.id] = doc.update_time
+                changed.append(_products[doc.id])
+        reset, _reset_pending = _reset_pending, False
+        if reset:
+            changed, removed = list(_products.values()), []
+        _version += 1
+        _last_sync = time.time()
+    _ready.set()
+
+    for callback in list(_listeners):
+        try:
+            callback(changed, removed, reset)
+        except Exception as e:
+            logger.warning("Error actualizando un índice derivado del catálogo: %s", e)
+
+
+def add_listener(callback):
+    """
+    Registra un callback(changed, removed, reset) que recibe cada cambio del catálogo.
+    Con reset=True, 'changed' trae el catálogo completo (carga inicial o reconexión).
+    """
+    _listeners.append(callback)
+
+
+def _listener_active():
+    return _watch is not None and _watch.is_active
+
+
+def _ensure_listener():
+    """Arranca (o reinicia si se desconectó) el listener, como mucho cada CATALOG_RESTART_INTERVAL."""
+    global _watch, _last_start, _reset_pending
+    if _listener_active():
+        return
+    with _lock:
+        if _listener_active() or time.time() - _last_start < Config.CATALOG_RESTART_INTERVAL:
+            return
+        _last_start = time.time()
+        if _watch is not None:
+            try:
+                _watch.unsubscribe()
+            except Exception:
+                pass
+            logger.warning("El listener del catálogo se desconectó; reiniciándolo.")
+        _ready.clear()
+        _products.clear()
+        _update_times.clear()
+        _reset_pending = True
+        try:
+            _watch = _catalog_query().on_snapshot(_on_snapshot)
+        except Exception as e:
+            _watch = None
+            logger.warning("No se pudo iniciar el listener del catálogo: %s", e)
+
+
+def is_available():
+    """True si el catálogo en memoria está cargado y el listener sigue conectado."""
+    if not Config.CATALOG_CACHE_ENABLED:
+        return False
+    _ensure_listener()
+    # La primera carga espera (acotado) a la instantánea inicial; luego nunca bloquea.
+    return _ready.wait(Config.CATALOG_WARMUP_TIMEOUT if _last_sync is None else 0) and _listener_active()
+
+
+def get_products():
+    """Devuelve una copia de los productos del catálogo ordenados por ID, o None si no está disponible."""
+    if not is_available():
+        return None
+    with _lock:
+        return [dict(_products[pid]) for pid in sorted(_products)]
+
+
+def _content_etag_locked():
+    global _etag, _etag_version
+    if _etag_version != _version:
+        digest = hashlib.sha1()
+        for pid in sorted(_update_times):
+            digest.update(f"{pid}:{_update_times[pid].isoformat()}\n".encode('utf-8'))
+        _etag, _etag_version = digest.hexdigest(), _version
+    return _etag
+
+
+def content_etag():
+    """
+    Versión del contenido del catálogo derivada de los updateTime de sus documentos:
+    coincide entre workers con el mismo catálogo. None si la caché no está disponible.
+    """
+    if not is_available():
+        return None
+    with _lock:
+        return _content_etag_locked()
+
+
+def get_catalog_json():
+    """
+    Devuelve (bytes, etag) con el JSON del catálogo completo, o None si la caché
+    no está disponible (el llamador debe consultar Firestore directamente).
+    Ambos se calculan una sola vez por versión del catálogo.
+    """
+    global _body, _body_version
+    if not is_available():
+        return None
+    with _lock:
+        if _body_version != _version:
+            items = [_products[pid] for pid in sorted(_products)]
+            _body = current_app.json.dumps(items).encode('utf-8')
+            _body_version = _version
+        return _body, _content_etag_locked()
+
+
+def _sort_value(product, field):
+    """Valor de orden comparable de un producto, o None si no tiene uno válido."""
+    value = product.get(field)
+    if field == 'price':
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_index():
+    """
+    Construye los índices secundarios:
+      - por igualdad: campo -> valor -> set(ids)
+      - por orden: campo -> lista ordenada de claves (valor, id)
+    Igual que Firestore, los productos sin el campo de orden quedan fuera de ese orden.
+    """
+    by_value = {field: {} for field in INDEXED_FIELDS}
+    for pid, product in _products.items():
+        for field in INDEXED_FIELDS:
+            value = product.get(field)
+            if isinstance(value, str):
+                by_value[field].setdefault(value, set()).add(pid)
+
+    sorted_keys = {DOCUMENT_ID: [(pid, pid) for pid in sorted(_products)]}
+    for field in SORT_FIELDS:
+        keys = []
+        for pid, product in _products.items():
+            value = _sort_value(product, field)
+            if value is not None:
+                keys.append((value, pid))
+        keys.sort()
+        sorted_keys[field] = keys
+    return {'by_value': by_value, 'sorted': sorted_keys}
+
+
+def query_products(filters, order_by, limit=None, cursor=None):
+    """
+    Resuelve en memoria un listado filtrado/ordenado del catálogo, con el mismo
+    contrato de cursor que pagination.paginate_query.
+
+    'filters' admite brand/model/storage (igualdad) y minPrice/maxPrice (rango);
+    'order_by' es [] o [(campo, dirección)] con campo en SORT_FIELDS.
+    Devuelve (productos, next_cursor), o None si la caché no está disponible.
+    """
+    global _index, _index_version
+    if not is_available():
+        return None
+
+    sort_field, direction = order_by[0] if order_by else (DOCUMENT_ID, firestore.Query.ASCENDING)
+    descending = direction == firestore.Query.DESCENDING
+    fields = [DOCUMENT_ID] if sort_field == DOCUMENT_ID else [sort_field, DOCUMENT_ID]
+
+    with _lock:
+        if _index_version != _version:
+            _index = _build_index()
+            _index_version = _version
+        index, products = _index, _products
+
+        # Intersección de los filtros de igualdad, empezando por el conjunto más pequeño.
+        candidates = None
+        sets = sorted((index['by_value'][f].get(filters[f], set()) for f in INDEXED_FIELDS if f in filters), key=len)
+        for ids in sets:
+            candidates = set(ids) if candidates is None else candidates & ids
+
+        min_price, max_price = filters.get('minPrice'), filters.get('maxPrice')
+        keys = index['sorted'][sort_field]
+
+        # Posición de inicio según el cursor.
+        if cursor:
+            values = decode_cursor(cursor, fields)
+            key = (values[0], values[0]) if sort_field == DOCUMENT_ID else (values[0], values[1])
+            start = bisect.bisect_left(keys, key) - 1 if descending else bisect.bisect_right(keys, key)
+        else:
+            start = len(keys) - 1 if descending else 0
+
+        # Ordenando por precio, el rango de precios acota directamente la lista ordenada.
+        low, high = 0, len(keys)
+        if sort_field == 'price':
+            if min_price is not None:
+                low = bisect.bisect_left(keys, (min_price,))
+            if max_price is not None:
+                high = bisect.bisect_right(keys, (max_price, chr(0x10FFFF)))
+
+        positions = range(min(start, high - 1), low - 1, -1) if descending else range(max(start, low), high)
+        page = []
+        for position in positions:
+            pid = keys[position][1]
+            if candidates is not None and pid not in candidates:
+                continue
+            price = products[pid].get('price')
+            if (min_price is not None or max_price is not None) and _sort_value(products[pid], 'price') is None:
+                continue
+            if min_price is not None and price < min_price:
+                continue
+            if max_price is not None and price > max_price:
+                continue
+            page.append(keys[position])
+            if limit is not None and len(page) > limit:
+                break
+
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            value, pid = page[-1]
+            next_cursor = encode_cursor(fields, [pid] if sort_field == DOCUMENT_ID else [value, pid])
+        return [dict(products[pid]) for _, pid in page], next_cursor
+
+
+def staleness_seconds():
+    """
+    Segundos desde la última instantánea aplicada. Mientras el listener está
+    conectado el catálogo está al día y vale 0; si se desconectó, crece hasta
+    que se reconecte. None si nunca se cargó.
+    """
+    if _last_sync is None:
+        return None
+    return 0.0 if _listener_active() else time.time() - _last_sync
+
+
+def stats():
+    """Métricas de la caché del catálogo."""
+    with _lock:
+        return {
+            'enabled': Config.CATALOG_CACHE_ENABLED,
+            'listenerActive': _listener_active(),
+            'products': len(_products),
+            'version': _version,
+            'stalenessSeconds': staleness_seconds(),
+        }
+
+
+def stop():
+    """Detiene el listener (ej. al apagar el worker)."""
+    global _watch
+    with _lock:
+        if _watch is not None:
+            _watch.unsubscribe()
+            _watch = None
+        _ready.clear()
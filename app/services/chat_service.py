@@ -1,7 +1,8 @@
 # app/services/chat_service.py
 from app import db
-from app.utils import clean_firestore_doc
+from app.utils import clean_firestore_doc, composite_id, resolve_server_timestamps
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
 from . import product_service # Usaremos esto para obtener los datos del producto
 
 def start_or_get_chat(product_id, buyer_id):
@@ -21,18 +22,15 @@ def start_or_get_chat(product_id, buyer_id):
     if buyer_id == seller_id:
         raise PermissionError("No puedes iniciar un chat contigo mismo.")
 
-    # Validación 3: Buscar si ya existe una conversación entre estos dos usuarios para este producto
-    chat_query = db.collection('chats') \
-                   .where(filter=firestore.FieldFilter('productId', '==', product_id)) \
-                   .where(filter=firestore.FieldFilter('buyerId', '==', buyer_id)) \
-                   .limit(1).stream()
-    
-    existing_chat = list(chat_query)
+    # Validación 3: Buscar si ya existe una conversación entre estos dos usuarios para este producto.
+    # El ID del chat es (productId, buyerId), así que basta una lectura puntual.
+    chat_ref = db.collection('chats').document(composite_id(product_id, buyer_id))
+    existing_chat = chat_ref.get()
 
-    if existing_chat:
+    if existing_chat.exists:
         # Si el chat ya existe, simplemente devolvemos sus datos
-        chat_data = existing_chat[0].to_dict()
-        chat_data['id'] = existing_chat[0].id
+        chat_data = existing_chat.to_dict()
+        chat_data['id'] = existing_chat.id
         return clean_firestore_doc(chat_data)
     else:
         # Si no existe, creamos un nuevo documento de chat
@@ -49,8 +47,13 @@ def start_or_get_chat(product_id, buyer_id):
             'createdAt': firestore.SERVER_TIMESTAMP
         }
         
-        update_time, chat_ref = db.collection('chats').add(chat_data)
-        created_doc = chat_ref.get()
-        new_chat_data = created_doc.to_dict()
-        new_chat_data['id'] = created_doc.id
+        try:
+            update_time = chat_ref.create(chat_data).update_time
+        except AlreadyExists:
+            # Otra petición concurrente creó el chat: devolvemos ese.
+            chat_data = chat_ref.get().to_dict()
+            chat_data['id'] = chat_ref.id
+            return clean_firestore_doc(chat_data)
+        new_chat_data = resolve_server_timestamps(chat_data, update_time)
+        new_chat_data['id'] = chat_ref.id
         return clean_firestore_doc(new_chat_data)
\ No newline at end of file
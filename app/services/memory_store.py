@@ -0,0 +1,935 @@
+# app/services/memory_store.py
+import itertools
+import logging
+import operator
+import queue
+import random
+import string
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from google.api_core.exceptions import AlreadyExists, Aborted, FailedPrecondition, InvalidArgument, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import BaseCompositeFilter, FieldFilter, Or
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+logger = logging.getLogger(__name__)
+
+# Sustituto en memoria del cliente de Firestore (STORAGE_BACKEND=memory).
+# Implementa la parte de la API que usan los servicios, con la misma semántica:
+#   - referencias a colecciones/documentos (también subcolecciones), add, set
+#     (con merge), update (rutas con puntos), create, delete y get/get_all con
+#     field_paths;
+#   - consultas con where (==, !=, <, <=, >, >=, in, not-in, array-contains,
+#     array-contains-any, filtros Or/And), order_by, limit, offset, select y cursores;
+#   - SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion/ArrayRemove y
+#     precondiciones de write_option;
+#   - lotes atómicos y transacciones optimistas compatibles con
+#     @firestore.transactional (un conflicto de lectura lanza Aborted y se reintenta);
+#   - listeners on_snapshot, entregados desde un hilo propio como en Firestore.
+# Opcionalmente simula la latencia de red: cada round trip (lectura, consulta,
+# get_all, inicio de transacción, commit) espera 'latency' + U(0, 'jitter') segundos
+# fuera del lock, así las peticiones concurrentes se solapan como con Firestore.
+# Los datos viven en el proceso: sirve para ejecutar la app sin conexión (pruebas
+# de carga, benchmarks), no como base de datos.
+
+DOCUMENT_ID = '__name__'
+MAX_BATCH_WRITES = 500
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_MISSING = object()
+
+_COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+# --- Valores -------------------------------------------------------------
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _value_key(value):
+    """
+    Clave comparable y hashable de un valor con el orden de tipos de Firestore
+    (null < bool < número < timestamp < string < bytes < referencia < geopoint < array < map).
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, _as_utc(value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, MemoryDocumentReference):
+        return (6, value.path)
+    if hasattr(value, 'latitude') and hasattr(value, 'longitude'):
+        return (7, value.latitude, value.longitude)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(_value_key(v) for v in value))
+    if isinstance(value, dict):
+        return (9, tuple(sorted((k, _value_key(v)) for k, v in value.items())))
+    return (10, repr(value))
+
+
+def _copy(value):
+    """Copia los contenedores (dict/list); el resto de valores son inmutables."""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _get_field(data, field_path):
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data, field_path, value):
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    data[parts[-1]] = value
+
+
+def _delete_field(data, field_path):
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _project(data, field_paths):
+    projected = {}
+    for field_path in field_paths:
+        value = _get_field(data, field_path)
+        if value is not _MISSING:
+            _set_field(projected, field_path, _copy(value))
+    return projected
+
+
+def _resolve(value, current, commit_time):
+    """Valor almacenado para 'value': aplica los transforms sobre el valor actual del campo."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return commit_time
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        keys = {_value_key(v) for v in result}
+        for item in value.values:
+            if _value_key(item) not in keys:
+                result.append(_resolve(item, None, commit_time))
+                keys.add(_value_key(item))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        removed = {_value_key(v) for v in value.values}
+        return [v for v in current if _value_key(v) not in removed] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        current = current if isinstance(current, dict) else {}
+        return {k: _resolve(v, current.get(k), commit_time) for k, v in value.items()
+                if v is not transforms.DELETE_FIELD}
+    if isinstance(value, (list, tuple)):
+        return [_resolve(v, None, commit_time) for v in value]
+    if isinstance(value, datetime):
+        return _as_utc(value)
+    return value
+
+
+def _merge(data, updates, commit_time):
+    """set(merge=True): fusiona los mapas anidados en lugar de reemplazarlos."""
+    for key, value in updates.items():
+        if value is transforms.DELETE_FIELD:
+            data.pop(key, None)
+        elif isinstance(value, dict) and value:
+            if not isinstance(data.get(key), dict):
+                data[key] = {}
+            _merge(data[key], value, commit_time)
+        else:
+            data[key] = _resolve(value, data.get(key), commit_time)
+
+
+# --- Instantáneas y resultados ---------------------------------------------
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class MemoryDocumentSnapshot:
+    """Instantánea inmutable de un documento (comparte los datos del registro, copia al leer)."""
+
+    def __init__(self, reference, data, create_time, update_time, read_time):
+        self._reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self._reference.id
+
+    @property
+    def reference(self):
+        return self._reference
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(f"'{field_path}' is not contained in the data")
+        return _copy(value)
+
+
+class _Record:
+    __slots__ = ('data', 'create_time', 'update_time')
+
+    def __init__(self, data, create_time, update_time):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class _WriteOption:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+    def check(self, path, record):
+        if self.exists is not None and (record is not None) != self.exists:
+            raise FailedPrecondition(f"Precondición 'exists' no cumplida: {path}")
+        if self.last_update_time is not None and (record is None or record.update_time != self.last_update_time):
+            raise FailedPrecondition(f"El documento cambió desde la lectura: {path}")
+
+
+# --- Referencias y consultas -----------------------------------------------
+
+class MemoryQuery:
+    """Consulta inmutable sobre una colección: cada método devuelve una consulta nueva."""
+
+    def __init__(self, parent, filters=(), orders=(), limit=None, offset=None,
+                 projection=None, start=None, end=None):
+        self._parent = parent
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._projection = projection
+        self._start = start  # (valores, incluido)
+        self._end = end
+
+    def _copy_with(self, **changes):
+        state = {'filters': self._filters, 'orders': self._orders, 'limit': self._limit,
+                 'offset': self._offset, 'projection': self._projection,
+                 'start': self._start, 'end': self._end}
+        state.update(changes)
+        return MemoryQuery(self._parent, **state)
+
+    @property
+    def _client(self):
+        return self._parent._client
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is None:
+            filter = FieldFilter(field_path, op_string, value)
+        return self._copy_with(filters=self._filters + (filter,))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        if direction not in ('ASCENDING', 'DESCENDING'):
+            raise ValueError(f"Dirección de orden no válida: {direction}")
+        return self._copy_with(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy_with(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy_with(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy_with(projection=list(field_paths))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy_with(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy_with(start=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy_with(end=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy_with(end=(document_fields_or_snapshot, False))
+
+    def stream(self, transaction=None):
+        yield from self._client._run_query(self, transaction)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self, callback)
+
+    # Evaluación (la usa el cliente, con su lock tomado).
+
+    def _all_orders(self):
+        """Órdenes efectivos: los pedidos más el ID del documento como desempate."""
+        orders = list(self._orders)
+        if not orders or orders[-1][0] != DOCUMENT_ID:
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else 'ASCENDING'))
+        return orders
+
+    def _order_key(self, doc_id, data, orders):
+        return [_value_key(doc_id) if field == DOCUMENT_ID else _value_key(_get_field(data, field))
+                for field, _ in orders]
+
+    def _cursor_keys(self, cursor, orders):
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            return self._order_key(cursor.id, cursor._data or {}, orders)
+        if isinstance(cursor, dict):
+            values = [cursor.get(field, _MISSING) for field, _ in orders]
+            values = list(itertools.takewhile(lambda v: v is not _MISSING, values))
+        else:
+            values = list(cursor)
+        keys = []
+        for (field, _), value in zip(orders, values):
+            if field == DOCUMENT_ID and isinstance(value, MemoryDocumentReference):
+                value = value.id
+            keys.append(_value_key(value))
+        return keys
+
+    @staticmethod
+    def _compare(keys, cursor_keys, orders):
+        for key, cursor_key, (_, direction) in zip(keys, cursor_keys, orders):
+            if key != cursor_key:
+                result = 1 if key > cursor_key else -1
+                return result if direction == 'ASCENDING' else -result
+        return 0
+
+
+def _compile_filter(query_filter):
+    """Convierte un filtro en un predicado predicate(doc_id, data)."""
+    if isinstance(query_filter, BaseCompositeFilter):
+        predicates = [_compile_filter(f) for f in query_filter.filters]
+        combine = any if isinstance(query_filter, Or) else all
+        return lambda doc_id, data: combine(p(doc_id, data) for p in predicates)
+
+    field, op, value = query_filter.field_path, query_filter.op_string, query_filter.value
+
+    def field_value(doc_id, data):
+        return doc_id if field == DOCUMENT_ID else _get_field(data, field)
+
+    def normalized(v):
+        return v.id if field == DOCUMENT_ID and isinstance(v, MemoryDocumentReference) else v
+
+    if op == '==':
+        expected = _value_key(normalized(value))
+        return lambda doc_id, data: _matches_key(field_value(doc_id, data), lambda k: k == expected)
+    if op == '!=':
+        expected = _value_key(normalized(value))
+        return lambda doc_id, data: _matches_key(field_value(doc_id, data), lambda k: k != expected and k != (0,))
+    if op in _COMPARISONS:
+        expected, compare = _value_key(normalized(value)), _COMPARISONS[op]
+        return lambda doc_id, data: _matches_key(field_value(doc_id, data),
+                                                 lambda k: k[0] == expected[0] and compare(k, expected))
+    if op == 'in':
+        expected = {_value_key(normalized(v)) for v in value}
+        return lambda doc_id, data: _matches_key(field_value(doc_id, data), lambda k: k in expected)
+    if op == 'not-in':
+        expected = {_value_key(normalized(v)) for v in value}
+        return lambda doc_id, data: _matches_key(field_value(doc_id, data),
+                                                 lambda k: k not in expected and k != (0,))
+    if op == 'array-contains':
+        expected = _value_key(value)
+        return lambda doc_id, data: _array_contains(field_value(doc_id, data), {expected})
+    if op == 'array-contains-any':
+        expected = {_value_key(v) for v in value}
+        return lambda doc_id, data: _array_contains(field_value(doc_id, data), expected)
+    raise NotImplementedError(f"Operador no soportado por el backend en memoria: {op}")
+
+
+def _matches_key(value, predicate):
+    return value is not _MISSING and predicate(_value_key(value))
+
+
+def _array_contains(value, expected):
+    return isinstance(value, list) and any(_value_key(v) in expected for v in value)
+
+
+def _equality_candidates(query_filter):
+    """(campo, claves) si el filtro permite usar el índice por igualdad; si no, None."""
+    if isinstance(query_filter, FieldFilter) and query_filter.field_path != DOCUMENT_ID:
+        if query_filter.op_string == '==':
+            return query_filter.field_path, [_value_key(query_filter.value)]
+        if query_filter.op_string == 'in':
+            return query_filter.field_path, [_value_key(v) for v in query_filter.value]
+    return None
+
+
+class MemoryCollectionReference(MemoryQuery):
+
+    def __init__(self, client, path):
+        super().__init__(self)
+        self._client_ref = client
+        self._path = path
+
+    @property
+    def _client(self):
+        return self._client_ref
+
+    def _copy_with(self, **changes):
+        return MemoryQuery(self, **changes)
+
+    @property
+    def id(self):
+        return self._path.rsplit('/', 1)[-1]
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def parent(self):
+        if '/' not in self._path:
+            return None
+        return MemoryDocumentReference(self._client, self._path.rsplit('/', 1)[0])
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = ''.join(random.choices(_AUTO_ID_CHARS, k=20))
+        return MemoryDocumentReference(self._client, f"{self._path}/{document_id}")
+
+    def add(self, document_data, document_id=None):
+        doc_ref = self.document(document_id)
+        write_result = doc_ref.create(document_data)
+        return write_result.update_time, doc_ref
+
+    def list_documents(self, page_size=None):
+        return [self.document(doc_id) for doc_id in self._client._list_ids(self._path)]
+
+
+class MemoryDocumentReference:
+
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def __repr__(self):
+        return f"<MemoryDocumentReference {self._path}>"
+
+    @property
+    def id(self):
+        return self._path.rsplit('/', 1)[-1]
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._client, self._path.rsplit('/', 1)[0])
+
+    def collection(self, collection_id):
+        return MemoryCollectionReference(self._client, f"{self._path}/{collection_id}")
+
+    def collections(self, page_size=None):
+        return [self.collection(name) for name in self._client._subcollections(self._path)]
+
+    def get(self, field_paths=None, transaction=None):
+        return self._client._get(self, field_paths, transaction)
+
+    def create(self, document_data):
+        return self._client._commit([('create', self, document_data, None)])[0]
+
+    def set(self, document_data, merge=False):
+        return self._client._commit([('merge' if merge else 'set', self, document_data, None)])[0]
+
+    def update(self, field_updates, option=None):
+        return self._client._commit([('update', self, field_updates, option)])[0]
+
+    def delete(self, option=None):
+        return self._client._commit([('delete', self, None, option)])[0].update_time
+
+
+# --- Escrituras agrupadas ----------------------------------------------------
+
+class MemoryWriteBatch:
+    """WriteBatch: las escrituras se aplican todas o ninguna en commit()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def _add(self, kind, reference, data=None, option=None):
+        self._writes.append((kind, reference, data, option))
+
+    def create(self, reference, document_data):
+        self._add('create', reference, document_data)
+
+    def set(self, reference, document_data, merge=False):
+        self._add('merge' if merge else 'set', reference, document_data)
+
+    def update(self, reference, field_updates, option=None):
+        self._add('update', reference, field_updates, option)
+
+    def delete(self, reference, option=None):
+        self._add('delete', reference, None, option)
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+    def __len__(self):
+        return len(self._writes)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Transacción optimista: registra la versión (updateTime) de cada documento leído
+    y en el commit comprueba que ninguno cambió; si cambió, lanza Aborted y
+    @firestore.transactional la reintenta, igual que con Firestore.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}
+        self.commit_time = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _begin(self, retry_id=None):
+        if self._id is not None:
+            raise ValueError("La transacción ya está en curso.")
+        started = time.perf_counter()
+        self._client._round_trip()
+        self._client._observe('transaction', 0, started)
+        self._id = str(next(self._ids)).encode('ascii')
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _record_read(self, path, record):
+        self._reads.setdefault(path, record.update_time if record is not None else None)
+
+    def _add(self, kind, reference, data=None, option=None):
+        if self._read_only:
+            raise ValueError("No se puede escribir en una transacción de solo lectura.")
+        super()._add(kind, reference, data, option)
+
+    def _commit(self):
+        if self._id is None:
+            raise ValueError("La transacción no está en curso.")
+        results = self._client._commit(self._writes, reads=self._reads)
+        self.commit_time = results[0].update_time if results else self._client._tick()
+        self._clean_up()
+        return results
+
+    def get(self, ref_or_query, field_paths=None):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            return iter([ref_or_query.get(field_paths=field_paths, transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references, field_paths=None):
+        return self._client.get_all(references, field_paths=field_paths, transaction=self)
+
+
+class MemoryWatch:
+    """Listener de on_snapshot: activo hasta unsubscribe()."""
+
+    def __init__(self, client, query, callback):
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._matched = set()
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._client._unwatch(self)
+
+    close = unsubscribe
+
+
+# --- Cliente ---------------------------------------------------------------
+
+class MemoryClient:
+    """Cliente con la interfaz de google.cloud.firestore.Client que guarda los documentos en memoria."""
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.observer = None    # observer(op, documentos, segundos) de cada round trip (ver app/db_stats.py)
+        self._lock = threading.RLock()
+        self._collections = {}  # ruta de la colección -> {doc_id: _Record}
+        self._indexes = {}      # ruta de la colección -> {campo: {clave: set(doc_ids)}}
+        self._watches = []
+        self._events = None
+        self._last_time = None
+
+    # API pública del cliente.
+
+    def collection(self, *collection_path):
+        return MemoryCollectionReference(self, '/'.join(collection_path))
+
+    def document(self, *document_path):
+        return MemoryDocumentReference(self, '/'.join(document_path))
+
+    def collections(self):
+        with self._lock:
+            return [self.collection(path) for path in sorted(self._collections)
+                    if '/' not in path and self._collections[path]]
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def write_option(self, **kwargs):
+        return _WriteOption(**kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        started = time.perf_counter()
+        self._round_trip()
+        with self._lock:
+            read_time = datetime.now(timezone.utc)
+            snapshots = []
+            for reference in references:
+                record = self._record(reference.path)
+                if transaction is not None:
+                    transaction._record_read(reference.path, record)
+                snapshots.append(self._snapshot(reference, record, read_time, field_paths))
+        self._observe('lookup', len(snapshots), started)
+        return iter(snapshots)
+
+    def close(self):
+        with self._lock:
+            for watch in list(self._watches):
+                watch.is_active = False
+            self._watches = []
+
+    def reset(self):
+        """Borra todos los documentos (ej. entre ejecuciones de un benchmark)."""
+        with self._lock:
+            self._collections.clear()
+            self._indexes.clear()
+
+    # Internos.
+
+    def _round_trip(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _observe(self, op, documents, started):
+        if self.observer is not None:
+            self.observer(op, documents, time.perf_counter() - started)
+
+    def _tick(self):
+        """Hora de commit estrictamente creciente: dos escrituras nunca comparten updateTime."""
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            if self._last_time is not None and now <= self._last_time:
+                now = self._last_time + timedelta(microseconds=1)
+            self._last_time = now
+            return now
+
+    @staticmethod
+    def _split(path):
+        collection_path, _, doc_id = path.rpartition('/')
+        return collection_path, doc_id
+
+    def _record(self, path):
+        collection_path, doc_id = self._split(path)
+        return self._collections.get(collection_path, {}).get(doc_id)
+
+    def _snapshot(self, reference, record, read_time, field_paths=None):
+        if record is None:
+            return MemoryDocumentSnapshot(reference, None, None, None, read_time)
+        data = record.data if field_paths is None else _project(record.data, field_paths)
+        return MemoryDocumentSnapshot(reference, data, record.create_time, record.update_time, read_time)
+
+    def _get(self, reference, field_paths, transaction):
+        started = time.perf_counter()
+        self._round_trip()
+        with self._lock:
+            record = self._record(reference.path)
+            if transaction is not None:
+                transaction._record_read(reference.path, record)
+            snapshot = self._snapshot(reference, record, datetime.now(timezone.utc), field_paths)
+        self._observe('lookup', 1, started)
+        return snapshot
+
+    def _list_ids(self, collection_path):
+        with self._lock:
+            return sorted(self._collections.get(collection_path, {}))
+
+    def _subcollections(self, doc_path):
+        prefix = doc_path + '/'
+        with self._lock:
+            return sorted(path[len(prefix):] for path, docs in self._collections.items()
+                          if docs and path.startswith(prefix) and '/' not in path[len(prefix):])
+
+    def _index(self, collection_path, field):
+        """Índice por igualdad de un campo, creado en la primera consulta que lo usa."""
+        indexes = self._indexes.setdefault(collection_path, {})
+        index = indexes.get(field)
+        if index is None:
+            index = indexes[field] = {}
+            for doc_id, record in self._collections.get(collection_path, {}).items():
+                value = _get_field(record.data, field)
+                if value is not _MISSING:
+                    index.setdefault(_value_key(value), set()).add(doc_id)
+        return index
+
+    def _reindex(self, collection_path, doc_id, old, new):
+        for field, index in self._indexes.get(collection_path, {}).items():
+            for record, add in ((old, False), (new, True)):
+                if record is None:
+                    continue
+                value = _get_field(record.data, field)
+                if value is _MISSING:
+                    continue
+                key = _value_key(value)
+                if add:
+                    index.setdefault(key, set()).add(doc_id)
+                else:
+                    ids = index.get(key)
+                    if ids is not None:
+                        ids.discard(doc_id)
+                        if not ids:
+                            del index[key]
+
+    def _candidates(self, query, docs):
+        """IDs candidatos: el índice de igualdad más selectivo, o la colección completa."""
+        best = None
+        for query_filter in query._filters:
+            candidate = _equality_candidates(query_filter)
+            if candidate is None:
+                continue
+            field, keys = candidate
+            index = self._index(query._parent.path, field)
+            ids = set().union(*(index.get(key, ()) for key in keys))
+            if best is None or len(ids) < len(best):
+                best = ids
+        return docs.keys() if best is None else best
+
+    def _evaluate(self, query):
+        """Devuelve [(doc_id, record)] de la consulta, ya filtrados, ordenados y recortados."""
+        docs = self._collections.get(query._parent.path, {})
+        predicates = [_compile_filter(f) for f in query._filters]
+        orders = query._all_orders()
+        order_fields = [field for field, _ in orders if field != DOCUMENT_ID]
+
+        rows = []
+        for doc_id in self._candidates(query, docs):
+            record = docs[doc_id]
+            if not all(p(doc_id, record.data) for p in predicates):
+                continue
+            # Igual que Firestore, un documento sin un campo de orden queda fuera del resultado.
+            if any(_get_field(record.data, field) is _MISSING for field in order_fields):
+                continue
+            rows.append((query._order_key(doc_id, record.data, orders), doc_id, record))
+
+        for position in range(len(orders) - 1, -1, -1):
+            rows.sort(key=lambda row: row[0][position], reverse=orders[position][1] == 'DESCENDING')
+
+        for bound, is_start in ((query._start, True), (query._end, False)):
+            if bound is None:
+                continue
+            cursor, inclusive = bound
+            cursor_keys = query._cursor_keys(cursor, orders)
+            if is_start:
+                rows = [row for row in rows
+                        if query._compare(row[0], cursor_keys, orders) > (-1 if inclusive else 0)]
+            else:
+                rows = [row for row in rows
+                        if query._compare(row[0], cursor_keys, orders) < (1 if inclusive else 0)]
+
+        if query._offset:
+            rows = rows[query._offset:]
+        if query._limit is not None:
+            rows = rows[:query._limit]
+        return [(doc_id, record) for _, doc_id, record in rows]
+
+    def _run_query(self, query, transaction=None):
+        started = time.perf_counter()
+        self._round_trip()
+        with self._lock:
+            rows = self._evaluate(query)
+            read_time = datetime.now(timezone.utc)
+            snapshots = []
+            for doc_id, record in rows:
+                reference = query._parent.document(doc_id)
+                if transaction is not None:
+                    transaction._record_read(reference.path, record)
+                snapshots.append(self._snapshot(reference, record, read_time, query._projection))
+        self._observe('query', len(snapshots), started)
+        return snapshots
+
+    def _apply(self, kind, reference, data, option, record, commit_time):
+        """Calcula el nuevo registro de un documento (None si se borra)."""
+        path = reference.path
+        if option is not None:
+            option.check(path, record)
+        if kind == 'create':
+            if record is not None:
+                raise AlreadyExists(f"El documento ya existe: {path}")
+            return _Record(_resolve(data, None, commit_time), commit_time, commit_time)
+        if kind == 'delete':
+            return None
+
+        create_time = record.create_time if record is not None else commit_time
+        if kind == 'set':
+            new_data = _resolve(data, None, commit_time)
+        elif kind == 'merge':
+            new_data = _copy(record.data) if record is not None else {}
+            _merge(new_data, data, commit_time)
+        else:  # update
+            if record is None:
+                raise NotFound(f"No existe el documento a actualizar: {path}")
+            new_data = _copy(record.data)
+            for field_path, value in data.items():
+                if value is transforms.DELETE_FIELD:
+                    _delete_field(new_data, field_path)
+                else:
+                    current = _get_field(new_data, field_path)
+                    _set_field(new_data, field_path,
+                               _resolve(value, None if current is _MISSING else current, commit_time))
+        return _Record(new_data, create_time, commit_time)
+
+    def _commit(self, writes, reads=None):
+        """Aplica las escrituras de forma atómica. Devuelve un WriteResult por escritura."""
+        if len(writes) > MAX_BATCH_WRITES:
+            raise InvalidArgument(f"Un lote admite como mucho {MAX_BATCH_WRITES} escrituras.")
+        started = time.perf_counter()
+        self._round_trip()
+        with self._lock:
+            for path, version in (reads or {}).items():
+                record = self._record(path)
+                if (record.update_time if record is not None else None) != version:
+                    raise Aborted(f"Conflicto de transacción: el documento {path} cambió.")
+
+            commit_time = self._tick()
+            staged = {}
+            for kind, reference, data, option in writes:
+                path = reference.path
+                current = staged[path] if path in staged else self._record(path)
+                staged[path] = self._apply(kind, reference, data, option, current, commit_time)
+
+            changed = []
+            for path, new in staged.items():
+                collection_path, doc_id = self._split(path)
+                docs = self._collections.setdefault(collection_path, {})
+                old = docs.get(doc_id)
+                if new is None:
+                    docs.pop(doc_id, None)
+                else:
+                    docs[doc_id] = new
+                self._reindex(collection_path, doc_id, old, new)
+                changed.append((collection_path, doc_id))
+            self._notify(changed, commit_time)
+        self._observe('commit', len(writes), started)
+        return [WriteResult(commit_time) for _ in writes]
+
+    # Listeners.
+
+    def _watch(self, query, callback):
+        watch = MemoryWatch(self, query, callback)
+        with self._lock:
+            if self._events is None:
+                self._events = queue.Queue()
+                threading.Thread(target=self._dispatch, name='memory-store-watch', daemon=True).start()
+            rows = self._evaluate(query)
+            watch._matched = {doc_id for doc_id, _ in rows}
+            read_time = datetime.now(timezone.utc)
+            docs = [self._snapshot(query._parent.document(doc_id), record, read_time) for doc_id, record in rows]
+            changes = [DocumentChange(ChangeType.ADDED, doc, -1, i) for i, doc in enumerate(docs)]
+            self._watches.append(watch)
+            self._events.put((watch, docs, changes, read_time))
+        return watch
+
+    def _unwatch(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, changed, read_time):
+        """Encola los cambios que afectan a cada listener (con el lock tomado)."""
+        for watch in self._watches:
+            query = watch._query
+            collection_path = query._parent.path
+            predicates = None
+            changes = []
+            for path, doc_id in changed:
+                if path != collection_path:
+                    continue
+                if predicates is None:
+                    predicates = [_compile_filter(f) for f in query._filters]
+                record = self._collections.get(path, {}).get(doc_id)
+                matches = record is not None and all(p(doc_id, record.data) for p in predicates)
+                reference = query._parent.document(doc_id)
+                if matches:
+                    kind = ChangeType.MODIFIED if doc_id in watch._matched else ChangeType.ADDED
+                    watch._matched.add(doc_id)
+                    changes.append(DocumentChange(kind, self._snapshot(reference, record, read_time), -1, -1))
+                elif doc_id in watch._matched:
+                    watch._matched.discard(doc_id)
+                    changes.append(DocumentChange(ChangeType.REMOVED, self._snapshot(reference, None, read_time), -1, -1))
+            if changes:
+                docs = self._collections.get(collection_path, {})
+                snapshots = [self._snapshot(query._parent.document(doc_id), docs[doc_id], read_time)
+                             for doc_id in sorted(watch._matched)]
+                self._events.put((watch, snapshots, changes, read_time))
+
+    def _dispatch(self):
+        while True:
+            watch, docs, changes, read_time = self._events.get()
+            if not watch.is_active:
+                continue
+            try:
+                watch._callback(docs, changes, read_time)
+            except Exception as e:
+                logger.warning("Error en un listener on_snapshot del backend en memoria: %s", e)
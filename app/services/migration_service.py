@@ -0,0 +1,134 @@
+# app/services/migration_service.py
+import logging
+from app import db
+from app.utils import composite_id
+from google.api_core.exceptions import AlreadyExists
+
+logger = logging.getLogger(__name__)
+
+# Colecciones cuyos documentos se identifican por una combinación de claves:
+# colección -> campos que forman el ID (ver utils.composite_id).
+COMPOSITE_KEYS = {
+    'ratings': ('productId', 'buyerId'),
+    'reports': ('productId', 'reporterId'),
+    'saved': ('productId', 'userId'),
+    'chats': ('productId', 'buyerId'),
+}
+
+MAX_BATCH_WRITES = 500
+
+
+def _delete_all(refs):
+    for start in range(0, len(refs), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for ref in refs[start:start + MAX_BATCH_WRITES]:
+            batch.delete(ref)
+        batch.commit()
+
+
+def _copy_subcollections(old_ref, new_ref):
+    """
+    Copia las subcolecciones (ej. los mensajes de un chat) al nuevo documento en
+    lotes de hasta MAX_BATCH_WRITES escrituras, sin borrar nada. Devuelve las
+    referencias de los documentos copiados. La copia usa set(), así que repetirla
+    tras una interrupción es seguro.
+    """
+    copied = []
+    for subcollection in old_ref.collections():
+        batch, pending = db.batch(), 0
+        for doc in subcollection.stream():
+            batch.set(new_ref.collection(subcollection.id).document(doc.id), doc.to_dict())
+            copied.append(doc.reference)
+            pending += 1
+            if pending == MAX_BATCH_WRITES:
+                batch.commit()
+                batch, pending = db.batch(), 0
+        if pending:
+            batch.commit()
+    return copied
+
+
+def rekey_collection(collection, dry_run=False):
+    """
+    Mueve los documentos de 'collection' que aún tienen un ID aleatorio a su ID
+    compuesto. Primero se crea el documento nuevo, después se copian sus
+    subcolecciones y solo entonces se borran el original y sus subdocumentos: si
+    algo falla a mitad, el original sigue intacto y volver a ejecutar la migración
+    la completa (un destino con los mismos datos se toma como una migración a medias).
+
+    Si el ID compuesto ya existe (un duplicado creado antes de este cambio), el
+    documento antiguo se deja donde está y se informa como conflicto para
+    revisarlo a mano. Devuelve un dict con los contadores de la migración.
+    """
+    key_fields = COMPOSITE_KEYS[collection]
+    stats = {'collection': collection, 'scanned': 0, 'migrated': 0, 'subdocuments': 0,
+             'conflicts': [], 'invalid': []}
+
+    for doc in db.collection(collection).stream():
+        stats['scanned'] += 1
+        doc_data = doc.to_dict()
+        try:
+            new_id = composite_id(*(doc_data.get(field) for field in key_fields))
+        except ValueError:
+            stats['invalid'].append(doc.id)
+            continue
+        if doc.id == new_id:
+            continue
+
+        new_ref = db.collection(collection).document(new_id)
+        existing = new_ref.get()
+        resuming = existing.exists and existing.to_dict() == doc_data
+        if existing.exists and not resuming:
+            stats['conflicts'].append(doc.id)
+            continue
+        if dry_run:
+            stats['migrated'] += 1
+            continue
+
+        if not resuming:
+            try:
+                new_ref.create(doc_data)
+            except AlreadyExists:
+                # Se creó mientras migrábamos: el original (y sus subcolecciones) se conserva como conflicto.
+                stats['conflicts'].append(doc.id)
+                continue
+
+        # El destino ya existe: copiamos las subcolecciones y solo después borramos lo original.
+        copied = _copy_subcollections(doc.reference, new_ref)
+        _delete_all(copied + [doc.reference])
+        stats['subdocuments'] += len(copied)
+        stats['migrated'] += 1
+
+    if stats['conflicts']:
+        logger.warning("%s: %d documentos duplicados sin migrar.", collection, len(stats['conflicts']))
+    return stats
+
+
+def backfill_transaction_timestamps(dry_run=False):
+    """
+    Añade 'timestamp' a las transacciones que no lo tienen (las ventas directas
+    anteriores a que purchase_product lo escribiera): los listados ordenan por
+    'timestamp' y Firestore excluye de una consulta ordenada los documentos sin
+    ese campo. Usa 'createdAt', si no 'completedAt' y, en último caso, la hora de
+    creación del documento. Repetirla es seguro. Devuelve los contadores.
+    """
+    stats = {'scanned': 0, 'updated': 0}
+    query = db.collection('transactions').select(['timestamp', 'createdAt', 'completedAt'])
+    batch, pending = db.batch(), 0
+    for doc in query.stream():
+        stats['scanned'] += 1
+        doc_data = doc.to_dict()
+        if doc_data.get('timestamp') is not None:
+            continue
+        stats['updated'] += 1
+        if dry_run:
+            continue
+        timestamp = doc_data.get('createdAt') or doc_data.get('completedAt') or doc.create_time
+        batch.update(doc.reference, {'timestamp': timestamp})
+        pending += 1
+        if pending == MAX_BATCH_WRITES:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    return stats
@@ -1,7 +1,20 @@
 # app/services/product_service.py
 from app import db
-from app.utils import clean_firestore_doc
+from app.utils import clean_firestore_doc, get_docs_by_ids, resolve_server_timestamps
+from app.pagination import paginate_query
+from app.projection import project, select_fields
+from app.http_cache import record_version
 from firebase_admin import firestore
+from . import catalog_cache, search_index
+
+
+class PurchaseConflict(ValueError):
+    """La venta no se puede cerrar en el estado actual del producto (409)."""
+
+
+class InvalidBuyer(ValueError):
+    """El comprador indicado para una venta directa no es válido (400)."""
+
 
 def create_product(data, seller_id):
     """(CREATE) Crea un nuevo documento de producto en la colección 'products'."""
@@ -31,64 +44,136 @@ def create_product(data, seller_id):
     }
     
     update_time, product_ref = db.collection('products').add(product_data)
-    created_doc = product_ref.get()
     
-    new_product_data = created_doc.to_dict()
-    new_product_data['id'] = created_doc.id
-    return clean_firestore_doc(new_product_data)
+    # Respondemos con lo escrito + la hora del commit, sin releer el documento.
+    new_product_data = resolve_server_timestamps(product_data, update_time)
+    new_product_data['id'] = product_ref.id
+    new_product = clean_firestore_doc(new_product_data)
+    search_index.upsert(new_product)
+    return new_product
 
-def list_all_products():
-    """(READ-LIST) Obtiene una lista de todos los productos activos y aprobados."""
-    query = db.collection('products') \
-              .where(filter=firestore.FieldFilter('active', '==', True)) \
-              .where(filter=firestore.FieldFilter('status', '==', 'approved'))
-              
-    products = []
-    for doc in query.stream():
-        product_data = doc.to_dict()
-        product_data['id'] = doc.id
-        products.append(clean_firestore_doc(product_data))
-    return products
+# Piezas compartidas entre las lecturas síncronas y las del modo async (async_reads):
+# construyen la consulta con el cliente recibido y dan forma a los documentos leídos.
+
+def catalog_order(sort):
+    """Convierte '?sort=' ('price', '-createdAt', ...) en la lista order_by de la consulta."""
+    if not sort:
+        return []
+    direction = firestore.Query.DESCENDING if sort.startswith('-') else firestore.Query.ASCENDING
+    return [(sort.lstrip('-'), direction)]
+
+def cached_products(filters, order_by, limit=None, cursor=None, fields=None):
+    """Resuelve el listado con el catálogo en memoria; None si la caché no está disponible."""
+    cached = catalog_cache.query_products(filters, order_by, limit=limit, cursor=cursor)
+    if cached is None:
+        return None
+    products, next_cursor = cached
+    record_version('catalog', catalog_cache.content_etag())
+    return [project(p, fields) for p in products], next_cursor
+
+def catalog_query(client, filters):
+    """Consulta de productos activos y aprobados con los filtros del catálogo."""
+    query = client.collection('products') \
+                  .where(filter=firestore.FieldFilter('active', '==', True)) \
+                  .where(filter=firestore.FieldFilter('status', '==', 'approved'))
+
+    for field in catalog_cache.INDEXED_FIELDS:
+        if field in filters:
+            query = query.where(filter=firestore.FieldFilter(field, '==', filters[field]))
+    if filters.get('minPrice') is not None:
+        query = query.where(filter=firestore.FieldFilter('price', '>=', filters['minPrice']))
+    if filters.get('maxPrice') is not None:
+        query = query.where(filter=firestore.FieldFilter('price', '<=', filters['maxPrice']))
+    return query
 
-def list_user_products(user_id: str):
+def product_from_doc(doc, fields=None):
+    """Producto listo para la respuesta; None si no existe o está inactivo."""
+    if not doc.exists or doc.to_dict().get('active') is False:
+        return None
+    record_version(doc.id, doc.update_time)
+    product_data = doc.to_dict()
+    product_data['id'] = doc.id
+    return clean_firestore_doc(project(product_data, fields))
+
+def list_all_products(filters=None, sort=None, limit=None, cursor=None, fields=None):
+    """
+    (READ-LIST) Obtiene una lista de todos los productos activos y aprobados.
+    - filters: brand/model/storage (igualdad) y minPrice/maxPrice (rango de precio).
+    - sort: 'price', 'createdAt' o con '-' delante para orden descendente.
+    - fields: proyección opcional de campos (ver app/projection.py).
+    Se resuelve con los índices en memoria del catálogo cacheado y, si no está
+    disponible, con una consulta a Firestore (índices en firestore.indexes.json).
+    Admite paginación por cursor; devuelve (productos, next_cursor).
+    """
+    filters = filters or {}
+    order_by = catalog_order(sort)
+
+    cached = cached_products(filters, order_by, limit=limit, cursor=cursor, fields=fields)
+    if cached is not None:
+        return cached
+
+    query = catalog_query(db, filters)
+    docs, next_cursor = paginate_query(query, order_by=order_by, limit=limit, cursor=cursor, select=fields)
+    return [product_from_doc(doc, fields) for doc in docs], next_cursor
+
+def list_user_products(user_id: str, limit=None, cursor=None, fields=None):
     """
     (READ-LIST) Devuelve productos donde el usuario es comprador
     y el estado está en 'reserved' o 'sold'.
+    Admite paginación por cursor; devuelve (productos, next_cursor).
     """
     query = db.collection('products') \
               .where(filter=firestore.FieldFilter('buyerId', '==', user_id)) \
               .where(filter=firestore.FieldFilter('status', 'in', ['reserved', 'sold']))
 
+    docs, next_cursor = paginate_query(query, limit=limit, cursor=cursor, select=fields)
     products = []
-    for doc in query.stream():
+    for doc in docs:
         data = doc.to_dict()
         data['id'] = doc.id
-        products.append(clean_firestore_doc(data))
-    return products
+        products.append(clean_firestore_doc(project(data, fields)))
+    return products, next_cursor
 
-def list_products_by_seller(seller_id):
-    """(READ-LIST) Obtiene los productos activos de un vendedor específico."""
+def list_products_by_seller(seller_id, limit=None, cursor=None, fields=None):
+    """
+    (READ-LIST) Obtiene los productos activos de un vendedor específico.
+    Admite paginación por cursor; devuelve (productos, next_cursor).
+    """
     query = db.collection('products') \
               .where(filter=firestore.FieldFilter('sellerId', '==', seller_id)) \
               .where(filter=firestore.FieldFilter('active', '==', True))
               
+    docs, next_cursor = paginate_query(query, limit=limit, cursor=cursor, select=fields)
     products = []
-    for doc in query.stream():
+    for doc in docs:
         data = doc.to_dict()
         data['id'] = doc.id
-        products.append(clean_firestore_doc(data))
-    return products 
+        products.append(clean_firestore_doc(project(data, fields)))
+    return products, next_cursor
 
-def get_product_by_id(product_id):
-    """(READ-ID) Obtiene un producto por su ID."""
-    doc = db.collection('products').document(product_id).get()
-    
-    if not doc.exists or doc.to_dict().get('active') is False:
-        return None
-        
-    product_data = doc.to_dict()
-    product_data['id'] = doc.id
-    return clean_firestore_doc(product_data)
+def get_product_by_id(product_id, fields=None):
+    """(READ-ID) Obtiene un producto por su ID. 'fields' limita los campos leídos."""
+    field_paths = select_fields(fields, 'active') if fields is not None else None
+    doc = db.collection('products').document(product_id).get(field_paths=field_paths)
+    return product_from_doc(doc, fields)
+
+def get_products_by_ids(product_ids):
+    """
+    (READ-BATCH) Obtiene varios productos en un solo round trip.
+    Aplica el mismo filtro que get_product_by_id: los productos inactivos no se devuelven.
+    Devuelve (productos en el orden pedido, ids no encontrados).
+    """
+    docs = get_docs_by_ids(db, 'products', product_ids)
+    products, missing = [], []
+    for product_id in product_ids:
+        doc = docs.get(product_id)
+        if doc is None or doc.to_dict().get('active') is False:
+            missing.append(product_id)
+            continue
+        product_data = doc.to_dict()
+        product_data['id'] = doc.id
+        products.append(clean_firestore_doc(product_data))
+    return products, missing
 
 def update_product(product_id, data, user_id, user_role):
     """(UPDATE) Actualiza los datos de un producto con validación de permisos."""
@@ -116,9 +201,16 @@ def update_product(product_id, data, user_id, user_role):
         raise ValueError("No se proporcionaron campos válidos para actualizar.")
 
     update_data['updatedAt'] = firestore.SERVER_TIMESTAMP
-    product_ref.update(update_data)
+    write_result = product_ref.update(update_data)
     
-    return get_product_by_id(product_id)
+    # El documento resultante es el leído para validar permisos más los cambios aplicados.
+    product_data.update(resolve_server_timestamps(update_data, write_result.update_time))
+    if product_data.get('active') is False:
+        return None
+    product_data['id'] = product_id
+    updated_product = clean_firestore_doc(product_data)
+    search_index.upsert(updated_product)
+    return updated_product
 
 def delete_product(product_id, user_id, user_role):
     """(DELETE) Desactiva un producto (soft delete) con validación de permisos."""
@@ -135,21 +227,19 @@ def delete_product(product_id, user_id, user_role):
         raise PermissionError("No tienes permiso para eliminar este producto.")
         
     product_ref.update({'active': False, 'updatedAt': firestore.SERVER_TIMESTAMP})
+    search_index.remove(product_id)
     
     return {"id": product_id, "message": "Producto eliminado exitosamente."}
 
-def purchase_product(product_id: str, seller_id: str, buyer_id: str, is_admin: bool = False):
+@firestore.transactional
+def _purchase_product_atomic(transaction, product_ref, seller_id, buyer_id, is_admin):
     """
-    Marca la compra del producto tanto en la colección de transacciones
-    como en el documento del producto.
-    Solo puede hacerlo:
-      - el vendedor (sellerId)
-      - o un admin (is_admin=True)
-    Cambia status→'sold' en ambos lugares.
+    Función transaccional que cierra la venta: marca el producto como vendido y
+    completa la transacción de reserva enlazada (product.reservationId).
+    Devuelve (datos del producto, cambios aplicados al producto).
     """
-    # 1) Obtener el producto
-    prod_ref = db.collection('products').document(product_id)
-    prod_snap = prod_ref.get()
+    # 1) Lecturas: el producto y su reserva (toda lectura va antes de las escrituras).
+    prod_snap = product_ref.get(transaction=transaction)
     if not prod_snap.exists:
         raise ValueError("Producto no encontrado")
 
@@ -159,32 +249,76 @@ def purchase_product(product_id: str, seller_id: str, buyer_id: str, is_admin: b
     if not is_admin and prod.get('sellerId') != seller_id:
         raise PermissionError("Solo el vendedor o un admin pueden completar la venta")
 
-    # 3) Actualizar el producto: status, soldAt y buyerId
-    prod_ref.update({
-        'status': 'sold',
-        'soldAt': firestore.SERVER_TIMESTAMP,  # ← coma obligatoria
-        'buyerId': buyer_id,
-    })
+    if prod.get('status') == 'sold':
+        raise ValueError("Este producto ya fue vendido")
+
+    transactions = db.collection('transactions')
+    reservation = None
+    if prod.get('reservationId'):
+        reservation = transactions.document(prod['reservationId']).get(transaction=transaction)
+    else:
+        # Reservas anteriores al enlace reservationId: se buscan por producto.
+        reserved = transactions \
+            .where(filter=firestore.FieldFilter('productId', '==', product_ref.id)) \
+            .where(filter=firestore.FieldFilter('status', '==', 'reserved')) \
+            .limit(1).get(transaction=transaction)
+        reservation = reserved[0] if reserved else None
 
-    # 4) Actualizar o crear la transacción
-    tx_ref = db.collection('transactions').document(product_id)
-    tx_snap = tx_ref.get()
-    if tx_snap.exists:
-        tx_ref.update({
+    # 3) Completar la transacción: la reserva si existe; si no, se registra una venta
+    #    directa al comprador indicado, que nunca es quien cierra la venta por defecto
+    #    (ej. la reserva caducó y el barrido la liberó).
+    if reservation is not None and reservation.exists and reservation.get('status') == 'reserved':
+        buyer_id = reservation.get('buyerId')
+        transaction.update(reservation.reference, {
             'status': 'completed',
             'completedAt': firestore.SERVER_TIMESTAMP
         })
     else:
-        tx_ref.set({
-            'productId':    product_id,
-            'buyerId':      buyer_id,                # usamos buyer_id directamente
+        if not buyer_id:
+            raise PurchaseConflict("El producto no tiene una reserva activa: indica el comprador ('buyerId').")
+        if buyer_id == prod.get('sellerId'):
+            raise InvalidBuyer("El comprador no puede ser el vendedor del producto.")
+        buyer = db.collection('users').document(buyer_id).get(transaction=transaction)
+        if not buyer.exists or (buyer.to_dict() or {}).get('active') is False:
+            raise InvalidBuyer("El comprador indicado no existe o no está activo.")
+        transaction.set(transactions.document(), {
+            'productId':    product_ref.id,
+            'buyerId':      buyer_id,
             'sellerId':     prod.get('sellerId'),
             'status':       'completed',
+            'active':       True,
+            'timestamp':    firestore.SERVER_TIMESTAMP,
             'createdAt':    firestore.SERVER_TIMESTAMP,
             'completedAt':  firestore.SERVER_TIMESTAMP
         })
 
-    # 5) Devolver el producto ya actualizado
-    updated = prod_ref.get().to_dict()
-    updated['id'] = prod_ref.id
-    return clean_firestore_doc(updated)
\ No newline at end of file
+    # 4) Actualizar el producto: status, soldAt y buyerId
+    product_update = {
+        'status': 'sold',
+        'soldAt': firestore.SERVER_TIMESTAMP,
+        'buyerId': buyer_id,
+    }
+    transaction.update(product_ref, product_update)
+    return prod, product_update
+
+def purchase_product(product_id: str, seller_id: str, buyer_id: str = None, is_admin: bool = False):
+    """
+    Marca la compra del producto tanto en la colección de transacciones
+    como en el documento del producto, en una única transacción de Firestore.
+    Solo puede hacerlo:
+      - el vendedor (sellerId)
+      - o un admin (is_admin=True)
+    Cambia status→'sold' en el producto y →'completed' en la reserva. El comprador
+    es el de la reserva; si el producto no estaba reservado hace falta 'buyer_id',
+    un usuario activo distinto del vendedor (si no, PurchaseConflict o InvalidBuyer).
+    """
+    prod_ref = db.collection('products').document(product_id)
+    transaction = db.transaction()
+    prod, product_update = _purchase_product_atomic(transaction, prod_ref, seller_id, buyer_id, is_admin)
+
+    # 5) Devolver el producto actualizado sin releerlo: los SERVER_TIMESTAMP valen la hora del commit.
+    prod.update(resolve_server_timestamps(product_update, transaction.commit_time))
+    prod['id'] = prod_ref.id
+    updated = clean_firestore_doc(prod)
+    search_index.upsert(updated)
+    return updated
\ No newline at end of file
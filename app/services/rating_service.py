@@ -1,7 +1,65 @@
 # app/services/rating_service.py
 from app import db
-from app.utils import clean_firestore_doc
+from app.utils import clean_firestore_doc, composite_id, get_docs_by_ids, resolve_server_timestamps
+from app.pagination import paginate_query
+from app.projection import project, select_fields
+from app.http_cache import record_version
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+SUMMARY_COLLECTION = 'rating_summaries'
+SCORES = (1, 2, 3, 4, 5)
+
+def parse_score(value):
+    """
+    Devuelve la puntuación como entero de SCORES. Lanza ValueError con cualquier
+    otra (0, 7, -3, 4.5, 'x'): los resúmenes son estado persistido y una puntuación
+    fuera de rango descuadraría para siempre la media y la distribución.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("El 'score' debe ser un número entero entre 1 y 5.")
+    try:
+        score = int(value) if not isinstance(value, float) or value.is_integer() else None
+    except ValueError:
+        score = None
+    if score not in SCORES:
+        raise ValueError("El 'score' debe ser un número entero entre 1 y 5.")
+    return score
+
+def _summary_ref(kind, target_id, client=None):
+    """Documento de resumen de un producto ('product') o de un vendedor ('seller')."""
+    return (client or db).collection(SUMMARY_COLLECTION).document(f"{kind}_{target_id}")
+
+def _apply_summary_delta(writer, product_id, seller_id, added=None, removed=None):
+    """
+    Aplica a los resúmenes del producto y del vendedor una puntuación que entra
+    ('added') y/o una que sale ('removed'). 'writer' es un WriteBatch o una Transaction.
+    """
+    distribution = {}
+    for score, sign in ((added, 1), (removed, -1)):
+        if score is not None:
+            distribution[str(score)] = distribution.get(str(score), 0) + sign
+    delta = {
+        'count': firestore.Increment(sum(distribution.values())),
+        'sum': firestore.Increment((added or 0) - (removed or 0)),
+        'distribution': {k: firestore.Increment(v) for k, v in distribution.items()},
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    }
+    for kind, target_id in (('product', product_id), ('seller', seller_id)):
+        if target_id:
+            writer.set(_summary_ref(kind, target_id), dict(delta, type=kind, targetId=target_id), merge=True)
+
+def _summary_from_doc(kind, target_id, summary_data):
+    count = summary_data.get('count', 0)
+    total = summary_data.get('sum', 0)
+    distribution = summary_data.get('distribution', {})
+    return {
+        f"{kind}Id": target_id,
+        'count': count,
+        'sum': total,
+        'average': round(total / count, 2) if count > 0 else None,
+        'distribution': {str(s): distribution.get(str(s), 0) for s in SCORES},
+    }
 
 def create_rating(data, buyer_id):
     """(CREATE) Crea una nueva calificación para un producto."""
@@ -13,63 +71,103 @@ def create_rating(data, buyer_id):
     if not product_doc.exists:
         raise ValueError("El producto que intentas calificar no existe.")
     
-    # Validación 2: Un usuario solo puede calificar un producto una vez.
-    ratings_query = db.collection('ratings') \
-                      .where(filter=firestore.FieldFilter('productId', '==', product_id)) \
-                      .where(filter=firestore.FieldFilter('buyerId', '==', buyer_id)) \
-                      .limit(1).stream()
-    
-    if len(list(ratings_query)) > 0:
-        raise ValueError("Ya has enviado una calificación para este producto.")
-
     # Construimos el diccionario de la calificación
     seller_id = product_doc.to_dict().get('sellerId')
     rating_data = {
         'productId': product_id,
         'buyerId': buyer_id,
         'sellerId': seller_id,
-        'score': int(data['score']),
+        'score': parse_score(data['score']),
         'comment': data.get('comment', ''),
         'active': True,
         'createdAt': firestore.SERVER_TIMESTAMP
     }
     
-    update_time, rating_ref = db.collection('ratings').add(rating_data)
-    created_doc = rating_ref.get()
+    # La calificación y los resúmenes del producto y del vendedor se escriben en un
+    # mismo lote atómico; los contadores usan Increment, sin leer el resumen.
+    # Validación 2: Un usuario solo puede calificar un producto una vez. El ID es
+    # (productId, buyerId) y create() falla si ya existe, descartando todo el lote.
+    rating_ref = db.collection('ratings').document(composite_id(product_id, buyer_id))
+    batch = db.batch()
+    batch.create(rating_ref, rating_data)
+    _apply_summary_delta(batch, product_id, seller_id, added=rating_data['score'])
+    try:
+        update_time = batch.commit()[0].update_time
+    except AlreadyExists:
+        raise ValueError("Ya has enviado una calificación para este producto.")
     
-    new_rating_data = created_doc.to_dict()
-    new_rating_data['id'] = created_doc.id
+    new_rating_data = resolve_server_timestamps(rating_data, update_time)
+    new_rating_data['id'] = rating_ref.id
     return clean_firestore_doc(new_rating_data)
 
-def list_ratings(product_id=None):
-    """(READ-LIST) Lista calificaciones. Opcionalmente filtra por producto."""
-    query = db.collection('ratings').where(filter=firestore.FieldFilter('active', '==', True))
-    
+# Piezas compartidas con las lecturas del modo async (async_reads).
+
+def ratings_query(client, product_id=None):
+    """Consulta de calificaciones activas, opcionalmente de un producto."""
+    query = client.collection('ratings').where(filter=firestore.FieldFilter('active', '==', True))
     if product_id:
         query = query.where(filter=firestore.FieldFilter('productId', '==', product_id))
-        
-    ratings = []
-    for doc in query.stream():
-        rating_data = doc.to_dict()
-        rating_data['id'] = doc.id
-        ratings.append(clean_firestore_doc(rating_data))
-    return ratings
+    return query
 
-def get_rating_by_id(rating_id):
-    """(READ-ID) Obtiene una calificación por su ID."""
-    doc = db.collection('ratings').document(rating_id).get()
-    
+def rating_from_doc(doc, fields=None):
+    """Calificación lista para la respuesta; None si no existe o está inactiva."""
     if not doc.exists or doc.to_dict().get('active') is False:
         return None
-        
+    record_version(doc.id, doc.update_time)
     rating_data = doc.to_dict()
     rating_data['id'] = doc.id
-    return clean_firestore_doc(rating_data)
+    return clean_firestore_doc(project(rating_data, fields))
 
-def update_rating(rating_id, data, user_id, user_role):
-    """(UPDATE) Actualiza una calificación. Solo el autor o un admin."""
-    rating_ref = db.collection('ratings').document(rating_id)
-    doc = rating_ref.get()
+def summary_target(product_id=None, seller_id=None):
+    """(tipo, id) del resumen pedido: el del producto o, si no, el del vendedor."""
+    return ('product', product_id) if product_id else ('seller', seller_id)
+
+def summary_from_doc(kind, target_id, doc):
+    """Resumen listo para la respuesta; ceros si aún no hay calificaciones."""
+    if not doc.exists:
+        return _summary_from_doc(kind, target_id, {})
+    record_version(doc.id, doc.update_time)
+    return _summary_from_doc(kind, target_id, doc.to_dict())
+
+def list_ratings(product_id=None, limit=None, cursor=None, fields=None):
+    """
+    (READ-LIST) Lista calificaciones. Opcionalmente filtra por producto.
+    Admite paginación por cursor y proyección de campos; devuelve (calificaciones, next_cursor).
+    """
+    query = ratings_query(db, product_id)
+    docs, next_cursor = paginate_query(query, limit=limit, cursor=cursor, select=fields)
+    return [rating_from_doc(doc, fields) for doc in docs], next_cursor
+
+def get_rating_by_id(rating_id, fields=None):
+    """(READ-ID) Obtiene una calificación por su ID. 'fields' limita los campos leídos."""
+    field_paths = select_fields(fields, 'active') if fields is not None else None
+    doc = db.collection('ratings').document(rating_id).get(field_paths=field_paths)
+    return rating_from_doc(doc, fields)
+
+def get_ratings_by_ids(rating_ids):
+    """
+    (READ-BATCH) Obtiene varias calificaciones activas en un solo round trip.
+    Devuelve (calificaciones en el orden pedido, ids no encontrados).
+    """
+    docs = get_docs_by_ids(db, 'ratings', rating_ids)
+    ratings, missing = [], []
+    for rating_id in rating_ids:
+        doc = docs.get(rating_id)
+        if doc is None or doc.to_dict().get('active') is False:
+            missing.append(rating_id)
+            continue
+        rating_data = doc.to_dict()
+        rating_data['id'] = doc.id
+        ratings.append(clean_firestore_doc(rating_data))
+    return ratings, missing
+
+@firestore.transactional
+def _update_rating_atomic(transaction, rating_ref, data, user_id, user_role):
+    """
+    Función transaccional que actualiza la calificación y, si cambia la puntuación,
+    mueve la diferencia en los resúmenes del producto y del vendedor.
+    """
+    doc = rating_ref.get(transaction=transaction)
     
     if not doc.exists:
         raise ValueError("Calificación no encontrada.")
@@ -84,18 +182,37 @@ def update_rating(rating_id, data, user_id, user_role):
     update_data = {k: v for k, v in data.items() if k in allowed_fields}
 
     if 'score' in update_data:
-        update_data['score'] = int(update_data['score'])
+        update_data['score'] = parse_score(update_data['score'])
 
     if not update_data:
         raise ValueError("No se proporcionaron campos válidos para actualizar.")
 
-    rating_ref.update(update_data)
-    return get_rating_by_id(rating_id)
+    transaction.update(rating_ref, update_data)
 
-def delete_rating(rating_id, user_id, user_role):
-    """(DELETE) Desactiva una calificación. Solo el autor o un admin."""
+    # Las calificaciones desactivadas ya no cuentan en los resúmenes.
+    old_score, new_score = rating_data.get('score'), update_data.get('score', rating_data.get('score'))
+    if rating_data.get('active') is not False and old_score != new_score:
+        _apply_summary_delta(transaction, rating_data.get('productId'), rating_data.get('sellerId'),
+                             added=new_score, removed=old_score)
+
+    rating_data.update(update_data)
+    return rating_data
+
+def update_rating(rating_id, data, user_id, user_role):
+    """(UPDATE) Actualiza una calificación. Solo el autor o un admin."""
     rating_ref = db.collection('ratings').document(rating_id)
-    doc = rating_ref.get()
+    rating_data = _update_rating_atomic(db.transaction(), rating_ref, data, user_id, user_role)
+
+    # Respondemos con el documento leído más los cambios, sin releerlo.
+    if rating_data.get('active') is False:
+        return None
+    rating_data['id'] = rating_id
+    return clean_firestore_doc(rating_data)
+
+@firestore.transactional
+def _delete_rating_atomic(transaction, rating_ref, user_id, user_role):
+    """Función transaccional que desactiva la calificación y la descuenta de los resúmenes."""
+    doc = rating_ref.get(transaction=transaction)
     
     if not doc.exists:
         raise ValueError("Calificación no encontrada.")
@@ -106,6 +223,71 @@ def delete_rating(rating_id, user_id, user_role):
     if rating_data['buyerId'] != user_id and user_role != 'admin':
         raise PermissionError("No tienes permiso para eliminar esta calificación.")
         
-    rating_ref.update({'active': False})
+    transaction.update(rating_ref, {'active': False})
+
+    # Solo se descuenta una vez: una calificación ya desactivada no suma en los resúmenes.
+    if rating_data.get('active') is not False:
+        _apply_summary_delta(transaction, rating_data.get('productId'), rating_data.get('sellerId'),
+                             removed=rating_data.get('score'))
+
+def delete_rating(rating_id, user_id, user_role):
+    """(DELETE) Desactiva una calificación. Solo el autor o un admin."""
+    rating_ref = db.collection('ratings').document(rating_id)
+    _delete_rating_atomic(db.transaction(), rating_ref, user_id, user_role)
     
-    return {"id": rating_id, "message": "Calificación eliminada exitosamente."}
\ No newline at end of file
+    return {"id": rating_id, "message": "Calificación eliminada exitosamente."}
+
+def get_rating_summary(product_id=None, seller_id=None):
+    """
+    (READ) Resumen de calificaciones de un producto o de un vendedor: cantidad,
+    suma, promedio y distribución por puntuación. Es una sola lectura.
+    """
+    kind, target_id = summary_target(product_id, seller_id)
+    return summary_from_doc(kind, target_id, _summary_ref(kind, target_id).get())
+
+def rebuild_rating_summaries(batch_size=500):
+    """
+    Recalcula todos los resúmenes a partir de las calificaciones activas y los
+    sobrescribe. Pensado para ejecutarse una vez (o tras una corrección manual);
+    las calificaciones que se escriban mientras corre pueden quedar sin contar.
+    Devuelve (calificaciones leídas, resúmenes escritos).
+    """
+    summaries = {}
+    read = 0
+    query = db.collection('ratings').where(filter=firestore.FieldFilter('active', '==', True)) \
+              .select(['productId', 'sellerId', 'score'])
+    for doc in query.stream():
+        read += 1
+        rating_data = doc.to_dict()
+        score = rating_data.get('score')
+        if score not in SCORES:
+            continue
+        for kind, target_id in (('product', rating_data.get('productId')), ('seller', rating_data.get('sellerId'))):
+            if not target_id:
+                continue
+            summary = summaries.setdefault((kind, target_id), {
+                'type': kind, 'targetId': target_id, 'count': 0, 'sum': 0,
+                'distribution': {str(s): 0 for s in SCORES},
+            })
+            summary['count'] += 1
+            summary['sum'] += score
+            summary['distribution'][str(score)] += 1
+
+    # Los resúmenes que ya no tienen calificaciones activas quedan a cero.
+    for doc in db.collection(SUMMARY_COLLECTION).select(['type', 'targetId']).stream():
+        doc_data = doc.to_dict()
+        key = (doc_data.get('type'), doc_data.get('targetId'))
+        if key not in summaries and all(key):
+            summaries[key] = {'type': key[0], 'targetId': key[1], 'count': 0, 'sum': 0,
+                              'distribution': {str(s): 0 for s in SCORES}}
+
+    batch, pending = db.batch(), 0
+    for (kind, target_id), summary in summaries.items():
+        batch.set(_summary_ref(kind, target_id), dict(summary, updatedAt=firestore.SERVER_TIMESTAMP))
+        pending += 1
+        if pending == batch_size:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    return read, len(summaries)
@@ -1,7 +1,10 @@
 # app/services/report_service.py
 from app import db
-from app.utils import clean_firestore_doc
+from app.utils import clean_firestore_doc, composite_id, resolve_server_timestamps
+from app.pagination import paginate_query
+from app.http_cache import record_version
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
 
 def create_report(data, reporter_id):
     """(CREATE) Crea un nuevo reporte para un producto, con validaciones."""
@@ -18,15 +21,6 @@ def create_report(data, reporter_id):
     if product_data.get('sellerId') == reporter_id:
         raise PermissionError("No puedes reportar tus propios productos.")
 
-    # Validación 3: Un usuario solo puede reportar un producto una vez.
-    report_query = db.collection('reports') \
-                     .where(filter=firestore.FieldFilter('productId', '==', product_id)) \
-                     .where(filter=firestore.FieldFilter('reporterId', '==', reporter_id)) \
-                     .limit(1).stream()
-    
-    if len(list(report_query)) > 0:
-        raise ValueError("Ya has enviado un reporte para este producto.")
-
     # Construimos el diccionario del reporte
     report_data = {
         'productId': product_id,
@@ -36,39 +30,52 @@ def create_report(data, reporter_id):
         'createdAt': firestore.SERVER_TIMESTAMP
     }
     
-    update_time, report_ref = db.collection('reports').add(report_data)
-    created_doc = report_ref.get()
+    # Validación 3: Un usuario solo puede reportar un producto una vez.
+    # El ID es (productId, reporterId); create() falla si el reporte ya existe.
+    report_ref = db.collection('reports').document(composite_id(product_id, reporter_id))
+    try:
+        update_time = report_ref.create(report_data).update_time
+    except AlreadyExists:
+        raise ValueError("Ya has enviado un reporte para este producto.")
     
-    new_report_data = created_doc.to_dict()
-    new_report_data['id'] = created_doc.id
+    new_report_data = resolve_server_timestamps(report_data, update_time)
+    new_report_data['id'] = report_ref.id
     return clean_firestore_doc(new_report_data)
 
-def list_reports(product_id=None):
-    """(READ-LIST) Lista todos los reportes activos. Opcionalmente filtra por producto."""
-    query = db.collection('reports').where(filter=firestore.FieldFilter('active', '==', True))
+# Piezas compartidas con las lecturas del modo async (async_reads).
+
+def reports_query(client, product_id=None):
+    """Consulta de reportes activos, opcionalmente de un producto."""
+    query = client.collection('reports').where(filter=firestore.FieldFilter('active', '==', True))
 
     # Si se provee un product_id, se añade el filtro a la consulta.
     if product_id:
         query = query.where(filter=firestore.FieldFilter('productId', '==', product_id))
-        
-    reports = []
-    for doc in query.stream():
-        report_data = doc.to_dict()
-        report_data['id'] = doc.id
-        reports.append(clean_firestore_doc(report_data))
-    return reports
+    return query
 
-def get_report_by_id(report_id):
-    """(READ-ID) Obtiene un reporte por su ID."""
-    doc = db.collection('reports').document(report_id).get()
-    
+def report_from_doc(doc):
+    """Reporte listo para la respuesta; None si no existe o está inactivo."""
     if not doc.exists or doc.to_dict().get('active') is False:
         return None
-        
+    record_version(doc.id, doc.update_time)
     report_data = doc.to_dict()
     report_data['id'] = doc.id
     return clean_firestore_doc(report_data)
 
+def list_reports(product_id=None, limit=None, cursor=None):
+    """
+    (READ-LIST) Lista todos los reportes activos. Opcionalmente filtra por producto.
+    Admite paginación por cursor; devuelve (reportes, next_cursor).
+    """
+    query = reports_query(db, product_id)
+    docs, next_cursor = paginate_query(query, limit=limit, cursor=cursor)
+    return [report_from_doc(doc) for doc in docs], next_cursor
+
+def get_report_by_id(report_id):
+    """(READ-ID) Obtiene un reporte por su ID."""
+    doc = db.collection('reports').document(report_id).get()
+    return report_from_doc(doc)
+
 def update_report(report_id, data, user_id, user_role):
     """(UPDATE) Actualiza el motivo de un reporte. Solo el autor o un admin."""
     report_ref = db.collection('reports').document(report_id)
@@ -86,7 +93,13 @@ def update_report(report_id, data, user_id, user_role):
         raise ValueError("Falta el campo 'reason' para actualizar.")
 
     report_ref.update({'reason': data['reason']})
-    return get_report_by_id(report_id)
+
+    # Respondemos con el documento leído más el cambio, sin releerlo.
+    report_data['reason'] = data['reason']
+    if report_data.get('active') is False:
+        return None
+    report_data['id'] = report_id
+    return clean_firestore_doc(report_data)
 
 def delete_report(report_id, user_id, user_role):
     """(DELETE) Desactiva un reporte. Solo el autor o un admin."""
@@ -0,0 +1,220 @@
+# app/services/reservation_expiry.py
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from app import db
+from app.config import Config
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+logger = logging.getLogger(__name__)
+
+# Caducidad de reservas abandonadas. Un hilo en segundo plano busca las
+# transacciones 'reserved' más antiguas que RESERVATION_TTL (consulta indexada por
+# status + timestamp), las marca como 'expired' y devuelve sus productos al
+# catálogo. Varios workers pueden tenerlo activo: solo barre el que tiene el lease.
+
+LEASE_COLLECTION = 'scheduler_leases'
+LEASE_ID = 'reservation_expiry'
+MAX_BATCH_WRITES = 500
+WRITES_PER_RESERVATION = 2  # la transacción y su producto
+
+_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_stop = threading.Event()
+_thread = None
+_lock = threading.Lock()
+_last_sweep = None
+_totals = {'sweeps': 0, 'expired': 0, 'released': 0, 'skipped': 0, 'errors': 0}
+
+
+@firestore.transactional
+def _acquire_lease_atomic(transaction, lease_ref, owner, duration):
+    """Toma (o renueva) el lease si está libre, caducado o ya es nuestro."""
+    now = datetime.now(timezone.utc)
+    snapshot = lease_ref.get(transaction=transaction)
+    if snapshot.exists:
+        lease = snapshot.to_dict()
+        if lease.get('owner') != owner and lease.get('expiresAt') and lease['expiresAt'] > now:
+            return False
+    transaction.set(lease_ref, {'owner': owner, 'expiresAt': now + timedelta(seconds=duration)})
+    return True
+
+
+def acquire_lease(owner=None, duration=None):
+    lease_ref = db.collection(LEASE_COLLECTION).document(LEASE_ID)
+    return _acquire_lease_atomic(db.transaction(), lease_ref, owner or _owner,
+                                 duration or Config.RESERVATION_SWEEP_LEASE)
+
+
+def _expired_reservations_query(cutoff):
+    return db.collection('transactions') \
+             .where(filter=firestore.FieldFilter('status', '==', 'reserved')) \
+             .where(filter=firestore.FieldFilter('timestamp', '<', cutoff)) \
+             .order_by('timestamp')
+
+
+def _plan_chunk(reservations):
+    """
+    Lee los productos de las reservas (un solo get_all) y decide qué escribir.
+    Un producto solo se libera si sigue 'reserved' por esta misma reserva (o por
+    una anterior a reservationId); si ya se vendió o cambió, solo caduca la reserva.
+    Devuelve [(reserva, snapshot del producto o None)].
+    """
+    refs = {}
+    for reservation in reservations:
+        product_id = reservation.get('productId')
+        if product_id:
+            refs[product_id] = db.collection('products').document(product_id)
+    products = {doc.id: doc for doc in db.get_all(list(refs.values())) if doc.exists} if refs else {}
+
+    plan = []
+    for reservation in reservations:
+        product = products.get(reservation.get('productId'))
+        if product is not None:
+            product_data = product.to_dict()
+            if product_data.get('status') != 'reserved' or \
+                    product_data.get('reservationId') not in (None, reservation.id):
+                product = None
+        plan.append((reservation, product))
+    return plan
+
+
+def _write_expiry(writer, reservation, product):
+    """Marca la reserva como caducada y libera el producto, con precondición de updateTime."""
+    writer.update(reservation.reference, {'status': 'expired', 'expiredAt': firestore.SERVER_TIMESTAMP},
+                  option=db.write_option(last_update_time=reservation.update_time))
+    if product is not None:
+        writer.update(product.reference, {'status': 'approved', 'reservationId': firestore.DELETE_FIELD,
+                                          'updatedAt': firestore.SERVER_TIMESTAMP},
+                      option=db.write_option(last_update_time=product.update_time))
+
+
+def _expire_one(reservation):
+    """Camino lento: caduca una reserva en su propia transacción tras un conflicto del lote."""
+    @firestore.transactional
+    def expire(transaction):
+        current = reservation.reference.get(transaction=transaction)
+        if not current.exists or current.get('status') != 'reserved':
+            return None
+        product = None
+        product_id = current.get('productId')
+        if product_id:
+            snapshot = db.collection('products').document(product_id).get(transaction=transaction)
+            product_data = snapshot.to_dict() if snapshot.exists else {}
+            if product_data.get('status') == 'reserved' and \
+                    product_data.get('reservationId') in (None, current.id):
+                product = snapshot
+        transaction.update(current.reference, {'status': 'expired', 'expiredAt': firestore.SERVER_TIMESTAMP})
+        if product is not None:
+            transaction.update(product.reference, {'status': 'approved', 'reservationId': firestore.DELETE_FIELD,
+                                                   'updatedAt': firestore.SERVER_TIMESTAMP})
+        return product is not None
+
+    return expire(db.transaction())
+
+
+def sweep(ttl=None, now=None):
+    """
+    Caduca las reservas más antiguas que 'ttl' segundos, en lotes de hasta
+    MAX_BATCH_WRITES escrituras. Si un lote falla porque algún documento cambió
+    entre la lectura y la escritura, ese lote se procesa reserva a reserva con
+    transacciones. Devuelve las estadísticas del barrido.
+    """
+    started = time.monotonic()
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=Config.RESERVATION_TTL if ttl is None else ttl)
+    stats = {'startedAt': now.isoformat(), 'swept': 0, 'expired': 0, 'released': 0, 'skipped': 0, 'batches': 0}
+    chunk_size = MAX_BATCH_WRITES // WRITES_PER_RESERVATION
+
+    while True:
+        # Cada página vuelve a consultar desde el principio: las ya caducadas dejan de ser 'reserved'.
+        reservations = list(_expired_reservations_query(cutoff).limit(chunk_size).stream())
+        if not reservations:
+            break
+        stats['swept'] += len(reservations)
+        plan = _plan_chunk(reservations)
+
+        batch = db.batch()
+        for reservation, product in plan:
+            _write_expiry(batch, reservation, product)
+        try:
+            batch.commit()
+            stats['expired'] += len(plan)
+            stats['released'] += sum(1 for _, product in plan if product is not None)
+        except (FailedPrecondition, NotFound):
+            for reservation, _ in plan:
+                released = _expire_one(reservation)
+                if released is None:
+                    stats['skipped'] += 1
+                else:
+                    stats['expired'] += 1
+                    stats['released'] += int(released)
+        stats['batches'] += 1
+
+        if len(reservations) < chunk_size:
+            break
+
+    stats['durationMs'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
+
+
+def _record(stats):
+    global _last_sweep
+    with _lock:
+        _last_sweep = stats
+        _totals['sweeps'] += 1
+        for name in ('expired', 'released', 'skipped'):
+            _totals[name] += stats[name]
+
+
+def run_once():
+    """Barre solo si este proceso tiene el lease. Devuelve las estadísticas o None."""
+    if not acquire_lease():
+        return None
+    stats = sweep()
+    _record(stats)
+    if stats['swept']:
+        logger.info("Reservas caducadas: %d de %d (%d productos liberados) en %.1f ms.",
+                    stats['expired'], stats['swept'], stats['released'], stats['durationMs'])
+    return stats
+
+
+def _loop():
+    while not _stop.wait(Config.RESERVATION_SWEEP_INTERVAL):
+        try:
+            run_once()
+        except Exception as e:
+            with _lock:
+                _totals['errors'] += 1
+            logger.warning("Error caducando reservas: %s", e)
+
+
+def start():
+    """Arranca el hilo del planificador (idempotente)."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_loop, name='reservation-expiry', daemon=True)
+        _thread.start()
+
+
+def stop():
+    _stop.set()
+
+
+def stats():
+    """Métricas del planificador en este proceso: último barrido y acumulados."""
+    with _lock:
+        return {
+            'enabled': Config.RESERVATION_SWEEP_ENABLED,
+            'running': _thread is not None and _thread.is_alive(),
+            'owner': _owner,
+            'lastSweep': dict(_last_sweep) if _last_sweep else None,
+            'totals': dict(_totals),
+        }
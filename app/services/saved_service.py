@@ -1,7 +1,9 @@
 # app/services/saved_service.py
 from app import db
-from app.utils import clean_firestore_doc
+from app.utils import clean_firestore_doc, composite_id, resolve_server_timestamps
+from app.pagination import paginate_query, stream_query
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
 
 def create_saved_item(data, user_id):
     """(CREATE) Guarda un producto para un usuario."""
@@ -13,25 +15,24 @@ def create_saved_item(data, user_id):
         raise ValueError("El producto que intentas guardar no existe.")
         
     # Validación 2: Prevenir duplicados.
-    # Buscamos si ya existe una entrada, sin importar si está activa o no.
-    saved_query = db.collection('saved') \
-                    .where(filter=firestore.FieldFilter('userId', '==', user_id)) \
-                    .where(filter=firestore.FieldFilter('productId', '==', product_id)) \
-                    .limit(1).stream()
+    # El ID es (productId, userId): una lectura puntual dice si ya existe una
+    # entrada, sin importar si está activa o no.
+    saved_ref = db.collection('saved').document(composite_id(product_id, user_id))
+    existing_saved = saved_ref.get()
     
-    existing_saved = list(saved_query)
-    
-    if existing_saved:
-        existing_doc_ref = existing_saved[0].reference
-        existing_data = existing_saved[0].to_dict()
+    if existing_saved.exists:
+        existing_doc_ref = saved_ref
+        existing_data = existing_saved.to_dict()
         # Si ya está guardado y activo, no hacemos nada.
         if existing_data.get('active'):
             raise ValueError("Este producto ya está en tu lista de guardados.")
         # Si existía pero fue eliminado (active: false), lo reactivamos.
         else:
-            existing_doc_ref.update({'active': True, 'createdAt': firestore.SERVER_TIMESTAMP})
-            updated_doc = existing_doc_ref.get()
-            return clean_firestore_doc(updated_doc.to_dict())
+            reactivation = {'active': True, 'createdAt': firestore.SERVER_TIMESTAMP}
+            write_result = existing_doc_ref.update(reactivation)
+            existing_data.update(resolve_server_timestamps(reactivation, write_result.update_time))
+            existing_data['id'] = existing_doc_ref.id
+            return clean_firestore_doc(existing_data)
 
     # Si no existe, creamos una nueva entrada.
     saved_data = {
@@ -41,35 +42,55 @@ def create_saved_item(data, user_id):
         'createdAt': firestore.SERVER_TIMESTAMP
     }
     
-    update_time, saved_ref = db.collection('saved').add(saved_data)
-    created_doc = saved_ref.get()
+    try:
+        update_time = saved_ref.create(saved_data).update_time
+    except AlreadyExists:
+        # Otra petición concurrente lo guardó entre la lectura y la escritura.
+        raise ValueError("Este producto ya está en tu lista de guardados.")
     
-    new_saved_data = created_doc.to_dict()
-    new_saved_data['id'] = created_doc.id
+    new_saved_data = resolve_server_timestamps(saved_data, update_time)
+    new_saved_data['id'] = saved_ref.id
     return clean_firestore_doc(new_saved_data)
 
-def list_all_saved_items():
-    """(READ-LIST) ADMIN ONLY: Lista todos los elementos guardados."""
-    query = db.collection('saved').order_by('createdAt', direction=firestore.Query.DESCENDING)
+def list_all_saved_items(limit=None, cursor=None):
+    """
+    (READ-LIST) ADMIN ONLY: Lista todos los elementos guardados.
+    Admite paginación por cursor; devuelve (elementos, next_cursor).
+    """
+    query = db.collection('saved')
+    docs, next_cursor = paginate_query(query, order_by=[('createdAt', firestore.Query.DESCENDING)],
+                                       limit=limit, cursor=cursor)
     saved_items = []
-    for doc in query.stream():
+    for doc in docs:
         item_data = doc.to_dict()
         item_data['id'] = doc.id
         saved_items.append(clean_firestore_doc(item_data))
-    return saved_items
+    return saved_items, next_cursor
+
+def iter_all_saved_items():
+    """(READ-STREAM) ADMIN ONLY: Itera todos los elementos guardados sin cargarlos todos en memoria."""
+    query = db.collection('saved')
+    for doc in stream_query(query, order_by=[('createdAt', firestore.Query.DESCENDING)]):
+        item_data = doc.to_dict()
+        item_data['id'] = doc.id
+        yield clean_firestore_doc(item_data)
 
-def list_user_saved_items(user_id):
-    """(READ-LIST) Lista los elementos guardados activos para un usuario específico."""
+def list_user_saved_items(user_id, limit=None, cursor=None):
+    """
+    (READ-LIST) Lista los elementos guardados activos para un usuario específico.
+    Admite paginación por cursor; devuelve (elementos, next_cursor).
+    """
     query = db.collection('saved') \
               .where(filter=firestore.FieldFilter('userId', '==', user_id)) \
               .where(filter=firestore.FieldFilter('active', '==', True))
               
+    docs, next_cursor = paginate_query(query, limit=limit, cursor=cursor)
     saved_items = []
-    for doc in query.stream():
+    for doc in docs:
         item_data = doc.to_dict()
         item_data['id'] = doc.id
         saved_items.append(clean_firestore_doc(item_data))
-    return saved_items
+    return saved_items, next_cursor
 
 def get_saved_item_by_id(saved_id, user_id, user_role):
     """(READ-ID) Obtiene un elemento guardado si el usuario es el dueño o es admin."""
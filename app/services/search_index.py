@@ -0,0 +1,237 @@
+# app/services/search_index.py
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from . import catalog_cache
+
+# Índice invertido en memoria para la búsqueda de productos (GET /products/search).
+# Solo contiene productos activos y aprobados, igual que el catálogo público.
+# Se mantiene de forma incremental desde product_service (create/update/delete)
+# y desde el listener del catálogo, que trae los cambios hechos en otros workers.
+
+FIELD_WEIGHTS = {'brand': 3.0, 'model': 3.0, 'storage': 2.0, 'description': 1.0}
+
+# Palabras vacías frecuentes en las descripciones en español.
+STOPWORDS = {'de', 'del', 'la', 'las', 'el', 'los', 'un', 'una', 'y', 'o', 'en', 'con', 'sin',
+             'para', 'por', 'al', 'a', 'se', 'es', 'que', 'su', 'muy', 'mas'}
+
+# Máximo de términos del vocabulario en los que se expande un prefijo,
+# y factor de peso de una coincidencia por prefijo frente a una exacta.
+MAX_PREFIX_EXPANSIONS = 64
+PREFIX_FACTOR = 0.5
+
+_TOKEN_RE = re.compile(r'\w+')
+
+_lock = threading.RLock()
+_postings = {}     # término -> {product_id: peso}
+_impacts = {}      # término -> [(-peso, product_id)] ordenada: postings por impacto descendente
+_doc_terms = {}    # product_id -> {término: peso}, para poder retirar un producto
+_docs = {}         # product_id -> producto
+_vocab = []        # términos ordenados, para búsquedas por prefijo con bisect
+_built = False
+
+
+def normalize(text):
+    """Minúsculas y sin acentos/diacríticos ('Teléfono' -> 'telefono')."""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(normalize(text)) if t not in STOPWORDS]
+
+
+def _is_listed(product):
+    return product.get('active') is not False and product.get('status') == 'approved'
+
+
+def _remove_locked(product_id):
+    for term, weight in _doc_terms.pop(product_id, {}).items():
+        postings = _postings[term]
+        del postings[product_id]
+        impacts = _impacts[term]
+        del impacts[bisect.bisect_left(impacts, (-weight, product_id))]
+        if not postings:
+            del _postings[term], _impacts[term]
+            del _vocab[bisect.bisect_left(_vocab, term)]
+    _docs.pop(product_id, None)
+
+
+def _add_locked(product, bulk=False):
+    """Indexa un producto. Con bulk no se mantiene el orden (lo hace rebuild al final)."""
+    product_id = product['id']
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(product.get(field) or ''):
+            weights[term] = weights.get(term, 0.0) + weight
+
+    for term, weight in weights.items():
+        if term not in _postings:
+            _postings[term] = {}
+            _impacts[term] = []
+            if not bulk:
+                bisect.insort(_vocab, term)
+        _postings[term][product_id] = weight
+        if bulk:
+            _impacts[term].append((-weight, product_id))
+        else:
+            bisect.insort(_impacts[term], (-weight, product_id))
+    _doc_terms[product_id] = weights
+    _docs[product_id] = product
+
+
+def upsert(product):
+    """Indexa (o reindexa) un producto; si ya no está publicado, lo retira del índice."""
+    with _lock:
+        _remove_locked(product['id'])
+        if _is_listed(product):
+            _add_locked(product)
+
+
+def remove(product_id):
+    with _lock:
+        _remove_locked(product_id)
+
+
+def rebuild(products):
+    """Reconstruye el índice completo a partir de una lista de productos."""
+    global _built
+    with _lock:
+        _postings.clear()
+        _impacts.clear()
+        _doc_terms.clear()
+        _docs.clear()
+        _vocab.clear()
+        for product in products:
+            if _is_listed(product):
+                _add_locked(product, bulk=True)
+        for impacts in _impacts.values():
+            impacts.sort()
+        _vocab.extend(sorted(_postings))
+        _built = True
+
+
+def _on_catalog_change(changed, removed, reset):
+    if reset:
+        rebuild(changed)
+        return
+    with _lock:
+        for product in changed:
+            _remove_locked(product['id'])
+            _add_locked(product)
+        for product_id in removed:
+            _remove_locked(product_id)
+
+
+catalog_cache.add_listener(_on_catalog_change)
+
+
+def _ensure_built():
+    """Carga inicial del índice desde el catálogo (cacheado o, si no, desde Firestore)."""
+    if _built:
+        return
+    products = catalog_cache.get_products()
+    if products is None:
+        from . import product_service
+        products, _ = product_service.list_all_products()
+    with _lock:
+        if not _built:
+            rebuild(products)
+
+
+def _term_stream(term, prefix):
+    """
+    Prepara un término de la consulta para el algoritmo de umbral. Devuelve
+    (iterador de (peso, id) en orden descendente, función peso(id), frecuencia)
+    o None si ningún producto lo contiene. Con prefix, el término se expande a los
+    términos del vocabulario que empiezan por él; una coincidencia exacta pesa más.
+    """
+    if not prefix:
+        expansions = [(term, 1.0)] if term in _postings else []
+    else:
+        start = bisect.bisect_left(_vocab, term)
+        expansions = []
+        for candidate in _vocab[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            expansions.append((candidate, 1.0 if candidate == term else PREFIX_FACTOR))
+    if not expansions:
+        return None
+
+    streams = [((negative * factor, pid) for negative, pid in _impacts[candidate])
+               for candidate, factor in expansions]
+    ordered = streams[0] if len(streams) == 1 else heapq.merge(*streams)
+
+    def weight_of(product_id):
+        return max((_postings[c].get(product_id, 0.0) * f for c, f in expansions), default=0.0)
+
+    frequency = min(sum(len(_postings[c]) for c, _ in expansions), len(_docs))
+    return ((-negative, pid) for negative, pid in ordered), weight_of, frequency
+
+
+def search(query, limit=20, typeahead=True):
+    """
+    Busca productos que contengan todos los términos de la consulta.
+    Con typeahead, el último término se trata como prefijo ('sams' -> 'samsung').
+    La relevancia es la suma de peso del campo x idf de cada término; el top-k se
+    obtiene con el algoritmo de umbral de Fagin sobre las listas ordenadas por
+    impacto, sin puntuar todo el catálogo.
+    """
+    _ensure_built()
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    with _lock:
+        total = len(_docs) or 1
+        lists = []
+        for position, term in enumerate(terms):
+            stream = _term_stream(term, typeahead and position == len(terms) - 1)
+            if stream is None:
+                return []
+            ordered, weight_of, frequency = stream
+            lists.append((ordered, weight_of, math.log(1 + total / frequency)))
+
+        best = []                              # min-heap (puntuación, id) de tamaño 'limit'
+        seen = set()
+        frontier = [float('inf')] * len(lists)  # último peso leído de cada lista
+        exhausted = False
+        while not exhausted:
+            for i, (ordered, _, idf) in enumerate(lists):
+                entry = next(ordered, None)
+                if entry is None:
+                    # Todo producto que contenga todos los términos ya apareció en esta lista.
+                    exhausted = True
+                    break
+                weight, product_id = entry
+                frontier[i] = weight
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+
+                score = 0.0
+                for _, weight_of, term_idf in lists:
+                    term_weight = weight_of(product_id)
+                    if not term_weight:
+                        break
+                    score += term_weight * term_idf
+                else:
+                    if len(best) < limit:
+                        heapq.heappush(best, (score, product_id))
+                    elif score > best[0][0]:
+                        heapq.heapreplace(best, (score, product_id))
+
+            threshold = sum(w * idf for w, (_, _, idf) in zip(frontier, lists))
+            if len(best) >= limit and best[0][0] >= threshold:
+                break
+
+        best.sort(reverse=True)
+        return [dict(_docs[pid], score=round(score, 4)) for score, pid in best]
+
+
+def stats():
+    with _lock:
+        return {'products': len(_docs), 'terms': len(_vocab), 'built': _built}
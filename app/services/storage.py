@@ -0,0 +1,52 @@
+# app/services/storage.py
+import threading
+from app.config import Config
+
+# Backend de almacenamiento de los servicios. Todos usan el mismo objeto 'db'
+# (from app import db) con la interfaz del cliente de Firestore; este módulo
+# decide qué cliente hay detrás según STORAGE_BACKEND:
+#   - 'firestore': el cliente real de firebase_admin (producción).
+#   - 'memory':    memory_store.MemoryClient, sin red ni credenciales, para
+#                  ejecutar la app sin conexión (pruebas de carga, benchmarks).
+
+BACKENDS = ('firestore', 'memory')
+
+_lock = threading.Lock()
+_memory_client = None
+
+
+def backend_name():
+    backend = Config.STORAGE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND no válido: {backend!r} (opciones: {', '.join(BACKENDS)})")
+    return backend
+
+
+def is_firestore():
+    return backend_name() == 'firestore'
+
+
+def _firestore_client():
+    from app import init_firebase, lifecycle
+    init_firebase()
+    with lifecycle.phase('import.firestore'):
+        from firebase_admin import firestore
+    with lifecycle.phase('firestore.client'):
+        return firestore.client()
+
+
+def memory_client():
+    """Cliente en memoria del proceso (uno solo, compartido por todos los hilos)."""
+    global _memory_client
+    with _lock:
+        if _memory_client is None:
+            from .memory_store import MemoryClient
+            _memory_client = MemoryClient(latency=Config.MEMORY_STORE_LATENCY / 1000,
+                                          jitter=Config.MEMORY_STORE_JITTER / 1000)
+        return _memory_client
+
+
+def create_client():
+    """Crea el cliente del backend configurado, con la contabilidad de operaciones (app/db_stats.py)."""
+    from app import db_stats
+    return db_stats.instrument(_firestore_client() if is_firestore() else memory_client())
@@ -0,0 +1,211 @@
+# app/services/task_queue.py
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from app import db
+from app.config import Config
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+# Cola de tareas en segundo plano para efectos secundarios lentos (ej. llamadas a
+# Firebase Auth) que no deben bloquear la respuesta. Las tareas se ejecutan en un
+# pool de hilos del proceso y cada una tiene un documento en 'tasks' con su estado,
+# intentos y último error. Si el proceso muere, otro worker recupera las tareas
+# cuyo lease ('leaseUntil') venció.
+#
+# Los handlers se registran con @task('nombre') y deben ser idempotentes: una
+# tarea puede ejecutarse más de una vez (reintentos o recuperación).
+
+TASKS_COLLECTION = 'tasks'
+PENDING_STATUSES = ['pending', 'retrying']
+
+_handlers = {}
+_lock = threading.Lock()
+_executor = None
+_recovery_thread = None
+_stop = threading.Event()
+_stats = {'enqueued': 0, 'succeeded': 0, 'retried': 0, 'failed': 0, 'recovered': 0}
+
+
+def task(name):
+    """Decorador que registra un handler(payload) para las tareas 'name'."""
+    def decorator(f):
+        _handlers[name] = f
+        return f
+    return decorator
+
+
+def _count(name, value=1):
+    with _lock:
+        _stats[name] += value
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.TASK_WORKERS, thread_name_prefix='task')
+        return _executor
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def enqueue(name, payload, max_attempts=None):
+    """
+    Encola la tarea 'name' con su payload (dict serializable en Firestore) y
+    devuelve su ID. El documento se escribe antes de responder para no perderla;
+    si esa escritura falla, la tarea igualmente se ejecuta en este proceso.
+    """
+    if name not in _handlers:
+        raise ValueError(f"Tarea desconocida: {name}")
+
+    task_ref = db.collection(TASKS_COLLECTION).document()
+    task_data = {
+        'name': name,
+        'payload': payload,
+        'status': 'pending',
+        'attempts': 0,
+        'maxAttempts': max_attempts or Config.TASK_MAX_ATTEMPTS,
+        'lastError': None,
+        'leaseUntil': _now() + timedelta(seconds=Config.TASK_LEASE),
+        'createdAt': firestore.SERVER_TIMESTAMP,
+    }
+    try:
+        task_ref.set(task_data)
+    except Exception as e:
+        logger.warning("No se pudo registrar la tarea %s en Firestore; se ejecuta sin seguimiento: %s", name, e)
+        task_ref = None
+
+    _count('enqueued')
+    _get_executor().submit(_run, task_ref, name, payload, 0, task_data['maxAttempts'])
+    return task_ref.id if task_ref is not None else None
+
+
+def _backoff(attempts):
+    delay = min(Config.TASK_BACKOFF_MAX, Config.TASK_BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def _update(task_ref, data):
+    if task_ref is None:
+        return
+    try:
+        task_ref.update(data)
+    except Exception as e:
+        # La tarea ya corrió; si el documento queda desfasado la recuperación la reintenta (es idempotente).
+        logger.warning("No se pudo actualizar la tarea %s: %s", task_ref.id, e)
+
+
+def _run(task_ref, name, payload, attempts, max_attempts):
+    """Ejecuta un intento de la tarea y registra el resultado (y el siguiente reintento)."""
+    attempts += 1
+    try:
+        _handlers[name](payload)
+    except Exception as e:
+        if attempts < max_attempts:
+            delay = _backoff(attempts)
+            _count('retried')
+            logger.warning("Tarea %s falló (intento %d/%d), reintento en %.1fs: %s",
+                           name, attempts, max_attempts, delay, e)
+            _update(task_ref, {
+                'status': 'retrying',
+                'attempts': attempts,
+                'lastError': str(e),
+                'leaseUntil': _now() + timedelta(seconds=delay + Config.TASK_LEASE),
+            })
+            timer = threading.Timer(delay, _resubmit, args=(task_ref, name, payload, attempts, max_attempts))
+            timer.daemon = True
+            timer.start()
+        else:
+            _count('failed')
+            logger.error("Tarea %s falló definitivamente tras %d intentos: %s", name, attempts, e)
+            _update(task_ref, {'status': 'failed', 'attempts': attempts, 'lastError': str(e),
+                               'finishedAt': firestore.SERVER_TIMESTAMP})
+        return
+
+    _count('succeeded')
+    _update(task_ref, {'status': 'done', 'attempts': attempts, 'finishedAt': firestore.SERVER_TIMESTAMP})
+
+
+def _resubmit(*args):
+    if not _stop.is_set():
+        _get_executor().submit(_run, *args)
+
+
+@firestore.transactional
+def _claim_atomic(transaction, task_ref):
+    """Toma una tarea huérfana renovando su lease, si nadie la tomó antes."""
+    snapshot = task_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    task_data = snapshot.to_dict()
+    if task_data.get('status') not in PENDING_STATUSES or task_data.get('leaseUntil') > _now():
+        return None
+    transaction.update(task_ref, {'leaseUntil': _now() + timedelta(seconds=Config.TASK_LEASE)})
+    return task_data
+
+
+def recover_orphaned(limit=100):
+    """
+    Reanuda las tareas pendientes cuyo lease venció (el proceso que las tenía
+    murió o no pudo registrar el resultado). Devuelve cuántas se reanudaron.
+    """
+    query = db.collection(TASKS_COLLECTION) \
+              .where(filter=firestore.FieldFilter('status', 'in', PENDING_STATUSES)) \
+              .where(filter=firestore.FieldFilter('leaseUntil', '<', _now())) \
+              .limit(limit)
+    recovered = 0
+    for doc in query.stream():
+        if doc.get('name') not in _handlers:
+            continue
+        task_data = _claim_atomic(db.transaction(), doc.reference)
+        if task_data is None:
+            continue
+        recovered += 1
+        _get_executor().submit(_run, doc.reference, task_data['name'], task_data['payload'],
+                               task_data.get('attempts', 0), task_data.get('maxAttempts', Config.TASK_MAX_ATTEMPTS))
+    if recovered:
+        _count('recovered', recovered)
+        logger.info("Recuperadas %d tareas huérfanas.", recovered)
+    return recovered
+
+
+def _recovery_loop():
+    while not _stop.wait(Config.TASK_RECOVERY_INTERVAL):
+        try:
+            recover_orphaned()
+        except Exception as e:
+            logger.warning("Error recuperando tareas huérfanas: %s", e)
+
+
+def start():
+    """Arranca el pool y el hilo de recuperación (idempotente)."""
+    global _recovery_thread
+    _get_executor()
+    with _lock:
+        if _recovery_thread is not None and _recovery_thread.is_alive():
+            return
+        _stop.clear()
+        _recovery_thread = threading.Thread(target=_recovery_loop, name='task-recovery', daemon=True)
+        _recovery_thread.start()
+
+
+def shutdown(wait=True):
+    """Detiene la recuperación y espera a que terminen las tareas en curso."""
+    global _executor
+    _stop.set()
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def stats():
+    """Contadores de la cola en este proceso."""
+    with _lock:
+        return dict(_stats, handlers=sorted(_handlers))
@@ -1,12 +1,36 @@
 # app/services/transaction_service.py
+import heapq
+import logging
+import random
+import threading
+import time
+from cachetools import LRUCache
 from app import db
-from app.utils import clean_firestore_doc
+from app.config import Config
+from app.concurrency import run_parallel
+from app.utils import clean_firestore_doc, resolve_server_timestamps
+from app.pagination import DOCUMENT_ID, encode_cursor, paginate_query, stream_query
+from app.projection import project, select_fields
 from firebase_admin import firestore
+from google.api_core.exceptions import Aborted
+
+logger = logging.getLogger(__name__)
+
+# Reservas concurrentes sobre un mismo producto. Cuando muchos compradores
+# reservan a la vez, solo uno puede ganar: la puerta de admisión por producto
+# deja pasar una reserva por proceso y la comprobación previa de 'status'
+# rechaza el resto sin abrir una transacción de Firestore.
+_gate = threading.Condition()
+_in_flight = set()                       # productos con una reserva en curso en este proceso
+_metrics = LRUCache(maxsize=1000)        # product_id -> contadores de reservas
+_metrics_lock = threading.Lock()
+_METRIC_NAMES = ('attempts', 'aborts', 'retries', 'exhausted', 'gateRejected', 'precheckRejected', 'reserved')
 
 @firestore.transactional
 def create_transaction_atomic(transaction, data, buyer_id):
     """
     Función transaccional que crea la transacción y actualiza el producto de forma atómica.
+    Devuelve (ID de la nueva transacción, datos escritos).
     """
     product_id = data['productId']
     product_ref = db.collection('products').document(product_id)
@@ -34,57 +58,185 @@ def create_transaction_atomic(transaction, data, buyer_id):
         'timestamp': firestore.SERVER_TIMESTAMP
     }
 
-    # Actualizar el estado del producto
-    transaction.update(product_ref, {'status': 'reserved'})
-    
     # Crear la nueva transacción
     new_transaction_ref = db.collection('transactions').document()
     transaction.set(new_transaction_ref, transaction_data)
+
+    # Actualizar el estado del producto y enlazar la reserva, que purchase_product completará.
+    transaction.update(product_ref, {'status': 'reserved', 'reservationId': new_transaction_ref.id})
     
-    return new_transaction_ref.id
+    return new_transaction_ref.id, transaction_data
+
+
+def _count(product_id, name):
+    with _metrics_lock:
+        counters = _metrics.get(product_id)
+        if counters is None:
+            counters = _metrics[product_id] = dict.fromkeys(_METRIC_NAMES, 0)
+        counters[name] += 1
+
+
+def _enter_gate(product_id):
+    """Admite la reserva si no hay otra en curso para el producto (espera como mucho RESERVATION_GATE_WAIT)."""
+    with _gate:
+        if not _gate.wait_for(lambda: product_id not in _in_flight, timeout=Config.RESERVATION_GATE_WAIT):
+            return False
+        _in_flight.add(product_id)
+        return True
+
+
+def _leave_gate(product_id):
+    with _gate:
+        _in_flight.discard(product_id)
+        _gate.notify_all()
+
+
+def _precheck_available(product_id):
+    """Lectura barata (solo 'status') fuera de la transacción para descartar productos ya reservados."""
+    snapshot = db.collection('products').document(product_id).get(field_paths=['status'])
+    if not snapshot.exists:
+        raise ValueError("El producto no existe.")
+    if snapshot.get('status') != 'approved':
+        _count(product_id, 'precheckRejected')
+        raise ValueError("Este producto no está disponible para la venta.")
+
+
+def _reserve_with_retries(data, buyer_id):
+    """
+    Ejecuta create_transaction_atomic con un solo intento por transacción y
+    reintenta los abortos por contención con backoff exponencial y jitter.
+    Devuelve (ID de la transacción, datos escritos, hora del commit).
+    """
+    product_id = data['productId']
+    for attempt in range(Config.RESERVATION_MAX_ATTEMPTS):
+        _count(product_id, 'attempts')
+        transaction = db.transaction(max_attempts=1)
+        try:
+            new_transaction_id, transaction_data = create_transaction_atomic(transaction, data, buyer_id)
+            return new_transaction_id, transaction_data, transaction.commit_time
+        except Aborted:
+            # Aborto durante las lecturas transaccionales: el SDK lo propaga tal cual.
+            pass
+        except ValueError as e:
+            # El SDK envuelve en ValueError el Aborted del último intento del commit.
+            if not isinstance(e.__cause__, Aborted):
+                raise
+        _count(product_id, 'aborts')
+        if attempt + 1 == Config.RESERVATION_MAX_ATTEMPTS:
+            break
+        # Si mientras tanto otro comprador ganó la reserva, no tiene sentido reintentar.
+        _precheck_available(product_id)
+        _count(product_id, 'retries')
+        delay = min(Config.RESERVATION_BACKOFF_MAX, Config.RESERVATION_BACKOFF_BASE * 2 ** attempt)
+        time.sleep(random.uniform(0, delay))
+
+    _count(product_id, 'exhausted')
+    logger.warning("Reserva de %s abortada %d veces por contención.", product_id, Config.RESERVATION_MAX_ATTEMPTS)
+    raise ValueError("Este producto está siendo reservado por otros compradores. Intenta de nuevo.")
 
 
 def create_transaction(data, buyer_id):
-    """(CREATE) Orquesta la creación de una transacción."""
-    transaction = db.transaction()
-    new_transaction_id = create_transaction_atomic(transaction, data, buyer_id)
-    
-    # Devolvemos el documento completo para la respuesta
-    new_doc = db.collection('transactions').document(new_transaction_id).get()
-    return clean_firestore_doc(new_doc.to_dict())
+    """
+    (CREATE) Orquesta la creación de una transacción (reserva).
+    Antes de abrir la transacción pasa por la puerta de admisión del producto y
+    comprueba su 'status', de modo que los perdedores reciben el error en seguida.
+    """
+    product_id = data['productId']
+    if not isinstance(product_id, str) or not product_id or '/' in product_id:
+        raise ValueError("El producto no existe.")
+
+    if not _enter_gate(product_id):
+        _count(product_id, 'gateRejected')
+        raise ValueError("Este producto está siendo reservado por otro comprador.")
+    try:
+        _precheck_available(product_id)
+        new_transaction_id, transaction_data, commit_time = _reserve_with_retries(data, buyer_id)
+        _count(product_id, 'reserved')
+    finally:
+        _leave_gate(product_id)
+
+    # Respondemos con lo escrito + la hora del commit, sin releer el documento.
+    new_transaction = resolve_server_timestamps(transaction_data, commit_time)
+    new_transaction['id'] = new_transaction_id
+    return clean_firestore_doc(new_transaction)
 
 
-def list_all_transactions():
-    """(READ-LIST) ADMIN ONLY: Lista todas las transacciones."""
-    query = db.collection('transactions').order_by('timestamp', direction=firestore.Query.DESCENDING)
+def list_all_transactions(limit=None, cursor=None, fields=None):
+    """
+    (READ-LIST) ADMIN ONLY: Lista todas las transacciones, de la más reciente a la más antigua.
+    Admite paginación por cursor y proyección de campos; devuelve (transacciones, next_cursor).
+    """
+    query = db.collection('transactions')
+    docs, next_cursor = paginate_query(query, order_by=[('timestamp', firestore.Query.DESCENDING)],
+                                       limit=limit, cursor=cursor, select=fields)
     transactions = []
-    for doc in query.stream():
+    for doc in docs:
         transaction_data = doc.to_dict()
         transaction_data['id'] = doc.id
-        transactions.append(clean_firestore_doc(transaction_data))
-    return transactions
+        transactions.append(clean_firestore_doc(project(transaction_data, fields)))
+    return transactions, next_cursor
 
 
-def list_user_transactions(user_id):
-    """(READ-LIST) Lista las transacciones donde un usuario es comprador o vendedor."""
-    buyer_query = db.collection('transactions').where(filter=firestore.FieldFilter('buyerId', '==', user_id)).stream()
-    seller_query = db.collection('transactions').where(filter=firestore.FieldFilter('sellerId', '==', user_id)).stream()
-    
-    transactions = {}
-    for doc in buyer_query:
-        transactions[doc.id] = clean_firestore_doc(doc.to_dict())
+def iter_all_transactions():
+    """(READ-STREAM) ADMIN ONLY: Itera todas las transacciones sin cargarlas todas en memoria."""
+    query = db.collection('transactions')
+    for doc in stream_query(query, order_by=[('timestamp', firestore.Query.DESCENDING)]):
+        transaction_data = doc.to_dict()
+        transaction_data['id'] = doc.id
+        yield clean_firestore_doc(transaction_data)
+
 
-    for doc in seller_query:
-        # Añadir solo si no existe para evitar duplicados
-        if doc.id not in transactions:
-            transactions[doc.id] = clean_firestore_doc(doc.to_dict())
-            
-    return list(transactions.values())
+def _newest_first(doc):
+    return doc.get('timestamp'), doc.id
 
 
-def get_transaction_by_id(transaction_id, user_id, user_role):
-    """(READ-ID) Obtiene una transacción si el usuario es parte de ella o es admin."""
-    doc = db.collection('transactions').document(transaction_id).get()
+def list_user_transactions(user_id, limit=None, cursor=None, fields=None):
+    """
+    (READ-LIST) Lista las transacciones donde un usuario es comprador o vendedor,
+    de la más reciente a la más antigua.
+    Las consultas por comprador y por vendedor se lanzan en paralelo y se mezclan
+    por (timestamp, id); el mismo cursor sirve para ambas porque comparten orden.
+    Devuelve (transacciones, next_cursor).
+    """
+    order_by = [('timestamp', firestore.Query.DESCENDING)]
+    queries = [db.collection('transactions').where(filter=firestore.FieldFilter(field, '==', user_id))
+               for field in ('buyerId', 'sellerId')]
+    results = run_parallel(*(
+        lambda query=query: paginate_query(query, order_by=order_by, limit=limit, cursor=cursor, select=fields)
+        for query in queries
+    ))
+
+    merged = heapq.merge(*(docs for docs, _ in results), key=_newest_first, reverse=True)
+    page, seen = [], set()
+    for doc in merged:
+        # Evita duplicados si un usuario figura como comprador y vendedor a la vez.
+        if doc.id not in seen:
+            seen.add(doc.id)
+            page.append(doc)
+
+    has_more = any(next_cursor for _, next_cursor in results)
+    if limit is not None and len(page) > limit:
+        page, has_more = page[:limit], True
+    next_cursor = None
+    if has_more:
+        timestamp, doc_id = _newest_first(page[-1])
+        next_cursor = encode_cursor(['timestamp', DOCUMENT_ID], [timestamp, doc_id])
+
+    transactions = []
+    for doc in page:
+        transaction_data = doc.to_dict()
+        transaction_data['id'] = doc.id
+        transactions.append(clean_firestore_doc(project(transaction_data, fields)))
+    return transactions, next_cursor
+
+
+def get_transaction_by_id(transaction_id, user_id, user_role, fields=None):
+    """
+    (READ-ID) Obtiene una transacción si el usuario es parte de ella o es admin.
+    'fields' limita los campos leídos (comprador y vendedor se leen siempre para validar permisos).
+    """
+    field_paths = select_fields(fields, 'buyerId', 'sellerId') if fields is not None else None
+    doc = db.collection('transactions').document(transaction_id).get(field_paths=field_paths)
     
     if not doc.exists:
         return None
@@ -97,4 +249,18 @@ def get_transaction_by_id(transaction_id, user_id, user_role):
         raise PermissionError("No tienes permiso para ver esta transacción.")
         
     transaction_data['id'] = doc.id
-    return clean_firestore_doc(transaction_data)
\ No newline at end of file
+    return clean_firestore_doc(project(transaction_data, fields))
+
+
+def reservation_stats(top=20):
+    """Contadores de reservas por producto (los 'top' con más abortos) y totales del proceso."""
+    with _metrics_lock:
+        per_product = {pid: dict(counters) for pid, counters in _metrics.items()}
+    totals = dict.fromkeys(_METRIC_NAMES, 0)
+    for counters in per_product.values():
+        for name, value in counters.items():
+            totals[name] += value
+    hottest = sorted(per_product.items(), key=lambda item: (item[1]['aborts'], item[1]['attempts']), reverse=True)
+    with _gate:
+        in_flight = len(_in_flight)
+    return {'totals': totals, 'inFlight': in_flight, 'products': dict(hottest[:top])}
\ No newline at end of file
@@ -1,7 +1,19 @@
 # app/services/user_service.py
 from app import db
-from app.utils import clean_firestore_doc
+from app.utils import clean_firestore_doc, get_docs_by_ids, resolve_server_timestamps
+from app.pagination import paginate_query, stream_query
+from app.projection import can_view_restricted, project, redact, select_fields
+from app.auth import profile_cache
 from firebase_admin import firestore, auth
+from . import task_queue
+
+@task_queue.task('auth.disable_user')
+def _disable_auth_user(payload):
+    """Tarea: desactiva la cuenta en Firebase Auth tras el soft delete del perfil."""
+    try:
+        auth.update_user(payload['uid'], disabled=True)
+    except auth.UserNotFoundError:
+        pass  # Ya no existe en Auth: no hay nada que desactivar.
 
 def create_user(data, uid):
     """
@@ -27,40 +39,74 @@ def create_user(data, uid):
         'updatedAt': firestore.SERVER_TIMESTAMP
     }
     
-    user_doc_ref.set(user_data)
+    write_result = user_doc_ref.set(user_data)
     
-    created_doc = user_doc_ref.get()
-    new_user_data = created_doc.to_dict()
-    new_user_data['id'] = created_doc.id
+    # Respondemos con lo escrito + la hora del commit, sin releer el documento.
+    new_user_data = resolve_server_timestamps(user_data, write_result.update_time)
+    new_user_data['id'] = uid
     
     return clean_firestore_doc(new_user_data)
 
-def get_user_by_id(user_id):
-    """(READ-ID) Obtiene un usuario activo por su ID."""
-    doc_ref = db.collection('users').document(user_id)
-    doc = doc_ref.get()
-    
+# Piezas compartidas con las lecturas del modo async (async_reads).
+
+def users_query(client):
+    """Consulta de usuarios activos."""
+    return client.collection('users').where(filter=firestore.FieldFilter('active', '==', True))
+
+def user_from_doc(doc, fields=None, viewer=None):
+    """
+    Usuario listo para la respuesta; None si no existe o está inactivo.
+    Los datos del DNI (RESTRICTED_FIELDS) solo se incluyen si 'viewer' es el
+    propio usuario o un admin (ver projection.can_view_restricted).
+    """
     if not doc.exists or doc.to_dict().get('active') is False:
         return None
-    
-    user_data = doc.to_dict()
+    user_data = redact('users', doc.to_dict(), can_view_restricted(viewer, doc.id))
     user_data['id'] = doc.id
-    return clean_firestore_doc(user_data)
+    return clean_firestore_doc(project(user_data, fields))
+
+def get_user_by_id(user_id, fields=None, viewer=None):
+    """(READ-ID) Obtiene un usuario activo por su ID. 'fields' limita los campos leídos."""
+    doc_ref = db.collection('users').document(user_id)
+    field_paths = select_fields(fields, 'active') if fields is not None else None
+    return user_from_doc(doc_ref.get(field_paths=field_paths), fields, viewer)
 
-def get_all_users():
-    """(READ-LIST) Obtiene una lista de todos los usuarios activos."""
-    users_ref = db.collection('users').where(filter=firestore.FieldFilter('active', '==', True))
-    users = []
-    for doc in users_ref.stream():
+def get_users_by_ids(user_ids, viewer=None):
+    """
+    (READ-BATCH) Obtiene varios usuarios activos en un solo round trip.
+    Devuelve (usuarios en el orden pedido, ids no encontrados). Los datos del DNI
+    solo se incluyen en el perfil de 'viewer' o si 'viewer' es admin.
+    """
+    docs = get_docs_by_ids(db, 'users', user_ids)
+    users, missing = [], []
+    for user_id in user_ids:
+        doc = docs.get(user_id)
+        if doc is None or doc.to_dict().get('active') is False:
+            missing.append(user_id)
+            continue
+        users.append(user_from_doc(doc, viewer=viewer))
+    return users, missing
+
+def get_all_users(limit=None, cursor=None, fields=None):
+    """
+    (READ-LIST) Obtiene una lista de todos los usuarios activos.
+    Admite paginación por cursor y proyección de campos; devuelve (usuarios, next_cursor).
+    """
+    docs, next_cursor = paginate_query(users_query(db), limit=limit, cursor=cursor, select=fields)
+    return [user_from_doc(doc, fields) for doc in docs], next_cursor
+
+def iter_all_users():
+    """(READ-STREAM) Itera los usuarios activos sin cargarlos todos en memoria."""
+    for doc in stream_query(users_query(db)):
         user_data = doc.to_dict()
         user_data['id'] = doc.id
-        users.append(clean_firestore_doc(user_data))
-    return users
+        yield clean_firestore_doc(user_data)
 
 def update_user(user_id, data, current_user_id, current_user_role):
     """(UPDATE) Actualiza los datos de un usuario con validación de permisos."""
     user_ref = db.collection('users').document(user_id)
-    if not user_ref.get().exists:
+    doc = user_ref.get()
+    if not doc.exists:
         raise ValueError("Usuario no encontrado.")
 
     # Lógica de Permisos Clave
@@ -80,8 +126,17 @@ def update_user(user_id, data, current_user_id, current_user_role):
 
     update_data['updatedAt'] = firestore.SERVER_TIMESTAMP
     
-    user_ref.update(update_data)
-    return get_user_by_id(user_id)
+    write_result = user_ref.update(update_data)
+    # Rol, aprobación o estado pueden haber cambiado: el próximo request relee el perfil.
+    profile_cache.invalidate_profile(user_id)
+
+    # Respondemos con el documento leído más los cambios, sin releerlo.
+    user_data = doc.to_dict()
+    user_data.update(resolve_server_timestamps(update_data, write_result.update_time))
+    if user_data.get('active') is False:
+        return None
+    user_data['id'] = user_id
+    return clean_firestore_doc(user_data)
 
 def soft_delete_user(user_id, current_user_id, current_user_role):
     """(DELETE) Desactiva un usuario con validación de permisos."""
@@ -94,10 +149,9 @@ def soft_delete_user(user_id, current_user_id, current_user_role):
         raise ValueError("Usuario no encontrado.")
 
     user_ref.update({'active': False, 'updatedAt': firestore.SERVER_TIMESTAMP})
+    profile_cache.invalidate_profile(user_id)
 
-    try:
-        auth.update_user(user_id, disabled=True)
-    except Exception as e:
-        print(f"Advertencia: No se pudo desactivar el usuario {user_id} en Firebase Auth: {e}")
+    # La desactivación en Firebase Auth se hace en segundo plano, con reintentos.
+    task_queue.enqueue('auth.disable_user', {'uid': user_id})
 
     return {"id": user_id, "message": "Usuario desactivado exitosamente."}
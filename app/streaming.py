@@ -0,0 +1,24 @@
+# app/streaming.py
+from flask import Response, current_app, request, stream_with_context
+
+# Respuestas en streaming (NDJSON) para colecciones grandes: cada documento se
+# serializa y se envía en cuanto Firestore lo entrega, con memoria constante.
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream():
+    """True si el cliente pidió streaming con 'Accept: application/x-ndjson' o '?stream=1'."""
+    if request.args.get('stream') == '1':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(items):
+    """Convierte un iterador de diccionarios en una respuesta HTTP chunked, una línea JSON por elemento."""
+    def generate():
+        dumps = current_app.json.dumps
+        for item in items:
+            yield dumps(item) + '\n'
+
+    return Response(stream_with_context(generate()), status=200, mimetype=NDJSON_MIMETYPE)
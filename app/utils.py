@@ -1,7 +1,9 @@
 # app/utils.py
 from datetime import datetime
-# --- LÍNEA CORREGIDA ---
-from google.cloud.firestore_v1 import GeoPoint 
+from app.lazy import lazy_module
+
+# google.cloud.firestore es pesado de importar: se carga al usar estas utilidades.
+firestore_v1 = lazy_module('google.cloud.firestore_v1')
 
 def clean_firestore_doc(doc_data):
     """
@@ -14,7 +16,46 @@ def clean_firestore_doc(doc_data):
     for key, value in doc_data.items():
         if isinstance(value, datetime):
             doc_data[key] = value.isoformat()
-        elif isinstance(value, GeoPoint):
+        elif isinstance(value, firestore_v1.GeoPoint):
             doc_data[key] = { "latitude": value.latitude, "longitude": value.longitude }
     
-    return doc_data
\ No newline at end of file
+    return doc_data
+
+def parse_batch_ids(data, max_ids):
+    """
+    Valida el cuerpo de un endpoint batchGet ({"ids": [...]}) y devuelve los IDs
+    sin duplicados, conservando el orden de la petición.
+    """
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, str) and i and '/' not in i for i in ids):
+        raise ValueError("El campo 'ids' debe ser una lista de IDs.")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > max_ids:
+        raise ValueError(f"Se permiten como máximo {max_ids} IDs por petición.")
+    return ids
+
+def composite_id(*parts):
+    """
+    ID determinista de un documento que es único por combinación de claves
+    (ej. productId + buyerId). Permite comprobar duplicados con una lectura
+    puntual o con create(), sin consultas ni índices compuestos.
+    """
+    if not all(isinstance(p, str) and p and '/' not in p for p in parts):
+        raise ValueError("Las claves de un ID compuesto deben ser IDs válidos.")
+    return '_'.join(parts)
+
+def get_docs_by_ids(client, collection, ids):
+    """Lee varios documentos en un único round trip (get_all). Devuelve {id: snapshot} de los existentes."""
+    if not ids:
+        return {}
+    refs = [client.collection(collection).document(doc_id) for doc_id in ids]
+    return {doc.id: doc for doc in client.get_all(refs) if doc.exists}
+
+def resolve_server_timestamps(doc_data, write_time):
+    """
+    Devuelve una copia de los datos escritos reemplazando cada SERVER_TIMESTAMP por la
+    hora del commit (WriteResult.update_time), que es el valor que Firestore guardó.
+    Así una escritura puede responder sin volver a leer el documento.
+    """
+    server_timestamp = firestore_v1.SERVER_TIMESTAMP
+    return {key: (write_time if value is server_timestamp else value) for key, value in doc_data.items()}
\ No newline at end of file
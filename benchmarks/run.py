@@ -0,0 +1,264 @@
+# benchmarks/run.py
+"""
+Benchmark de carga de la API sobre el backend en memoria.
+
+Arranca la app real (create_app) con STORAGE_BACKEND=memory y latencia simulada
+por round trip, siembra datos, y lanza cada escenario (una ruta) con N hilos
+durante un tiempo fijo a través del cliente de pruebas de Flask. Mide latencia
+(p50/p95/p99) y throughput por ruta y los escribe en un JSON para comparar
+ejecuciones.
+
+    python -m benchmarks.run --concurrency 16 --duration 10 --latency-ms 5 \\
+        --products 5000 --output bench-results.json
+    python -m benchmarks.run --scenarios products.list,ratings.list --compare bench-results.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+
+def _percentile(ordered, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed, expected):
+    """Estadísticas de una ruta a partir de sus muestras [(status, segundos)]."""
+    latencies = sorted(seconds * 1000 for _, seconds in samples)
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if int(status) not in expected)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'statuses': statuses,
+        'throughputRps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'latencyMs': {
+            'p50': _round(_percentile(latencies, 50)),
+            'p95': _round(_percentile(latencies, 95)),
+            'p99': _round(_percentile(latencies, 99)),
+            'mean': _round(sum(latencies) / len(latencies)) if latencies else None,
+            'max': _round(latencies[-1]) if latencies else None,
+        },
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _configure_environment(args):
+    # Config lee el entorno al importarse: se fija antes de importar la app.
+    os.environ.update({
+        'STORAGE_BACKEND': 'memory',
+        'AUTH_LOCAL_VERIFY': '0',
+        'RESERVATION_SWEEP_ENABLED': '0',
+        'FIREBASE_PROJECT_ID': 'remarket-bench',
+    })
+
+
+def _fake_create_user(auth_latency):
+    def create_user(**kwargs):
+        if auth_latency:
+            time.sleep(auth_latency)
+        return SimpleNamespace(uid=f"auth-{random.getrandbits(64):016x}", email=kwargs.get('email'))
+    return create_user
+
+
+def _wait_ready(lifecycle, timeout=30):
+    lifecycle.start_warmup()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        ready, detail = lifecycle.readiness()
+        if ready:
+            return detail
+        time.sleep(0.05)
+    raise SystemExit(f"La app no quedó lista en {timeout}s: {lifecycle.readiness()[1]}")
+
+
+def run_scenario(app, data, scenario, concurrency, duration, seed):
+    """Lanza el escenario con 'concurrency' hilos durante 'duration' segundos."""
+    samples = [[] for _ in range(concurrency)]
+    start = threading.Barrier(concurrency + 1)
+    deadline = [None]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        out = samples[index]
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            method, path, body, uid = scenario.build(data, rng)
+            headers = {'Authorization': f'Bearer {data.token_for(uid)}'} if uid else {}
+            began = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            response.get_data()
+            out.append((response.status_code, time.perf_counter() - began))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    began = time.perf_counter()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    return summarize([s for worker_samples in samples for s in worker_samples], elapsed, scenario.expected)
+
+
+def firestore_per_request(stats):
+    """Medias por petición de las operaciones de Firestore (db_stats.route_stats()) de un escenario."""
+    routes = stats['routes']
+    requests = sum(row['requests'] for row in routes)
+    if not requests:
+        return None
+    return {name: round(sum(row['totals'][name] for row in routes) / requests, 2)
+            for name in ('reads', 'writes', 'queries', 'transactions', 'firestoreMs')}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """Imprime la variación de throughput y p95 frente a una ejecución anterior."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparación con {baseline_path} ({baseline['meta'].get('gitRevision')}):")
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        rps_before, rps_after = before['throughputRps'], result['throughputRps']
+        p95_before, p95_after = before['latencyMs']['p95'], result['latencyMs']['p95']
+        rps_delta = (rps_after / rps_before - 1) * 100 if rps_before else float('nan')
+        p95_delta = (p95_after / p95_before - 1) * 100 if p95_before else float('nan')
+        print(f"  {name:<22} rps {rps_before:>9} -> {rps_after:<9} ({rps_delta:+.1f}%)  "
+              f"p95 {p95_before:>8} -> {p95_after:<8} ({p95_delta:+.1f}%)")
+
+
+def main(argv=None):
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description="Benchmark de carga de las rutas de la API (backend en memoria).")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Escenarios separados por comas (por defecto todos: {', '.join(SCENARIOS)})")
+    parser.add_argument('--concurrency', type=int, default=8, help="Hilos cliente concurrentes")
+    parser.add_argument('--duration', type=float, default=10, help="Segundos por escenario")
+    parser.add_argument('--warmup', type=float, default=1, help="Segundos de calentamiento por escenario (no se miden)")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--ratings', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=500)
+    parser.add_argument('--saved', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=5, help="Latencia simulada por round trip de Firestore")
+    parser.add_argument('--jitter-ms', type=float, default=2, help="Latencia aleatoria adicional (0..jitter)")
+    parser.add_argument('--auth-latency-ms', type=float, default=50, help="Latencia simulada de Firebase Auth (registro)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench-results.json', help="Archivo JSON de resultados")
+    parser.add_argument('--compare', help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    _configure_environment(args)
+    logging.basicConfig(level=logging.WARNING)
+
+    from app import create_app, db, db_stats, lifecycle
+    from app.auth import token_verifier
+    from app.services import rating_service
+    from app.services.memory_store import MemoryClient
+    from benchmarks import scenarios
+
+    rng = random.Random(args.seed)
+    private_key, public_keys = scenarios.generate_keys()
+    verifier = token_verifier.TokenVerifier(scenarios.PROJECT_ID, keys=public_keys)
+    token_verifier.set_verifier(verifier)
+
+    # Sembramos sin latencia y la activamos después, para medir solo las peticiones.
+    client = MemoryClient()
+    db.use(client)
+    started = time.perf_counter()
+    data = scenarios.seed(client, rng, users=args.users, products=args.products, ratings=args.ratings,
+                          transactions=args.transactions, saved=args.saved, private_key=private_key)
+    rating_service.rebuild_rating_summaries()
+    seed_seconds = time.perf_counter() - started
+    client.latency, client.jitter = args.latency_ms / 1000, args.jitter_ms / 1000
+
+    app = create_app()
+    patches = [
+        # Tokens: verificación local con las claves del benchmark (sin Google ni el Admin SDK).
+        mock.patch.object(token_verifier, 'verify_id_token', verifier.verify_id_token),
+        # Registro: Firebase Auth simulado con su latencia.
+        mock.patch('firebase_admin.auth.create_user', _fake_create_user(args.auth_latency_ms / 1000)),
+    ]
+    for patch in patches:
+        patch.start()
+
+    try:
+        readiness = _wait_ready(lifecycle)
+        results = {}
+        for name in names:
+            scenario = scenarios.SCENARIOS[name]
+            if args.warmup:
+                run_scenario(app, data, scenario, args.concurrency, args.warmup, args.seed)
+            db_stats.reset()
+            result = run_scenario(app, data, scenario, args.concurrency, args.duration, args.seed)
+            firestore = firestore_per_request(db_stats.route_stats())
+            results[name] = dict(result, route=scenario.route, firestorePerRequest=firestore)
+            latency = result['latencyMs']
+            reads = firestore['reads'] if firestore else '-'
+            print(f"{name:<22} {scenario.route:<22} {result['requests']:>7} req  "
+                  f"{result['throughputRps']:>8} req/s  p50 {latency['p50']:>7} ms  "
+                  f"p95 {latency['p95']:>7} ms  p99 {latency['p99']:>7} ms  lecturas/req {reads:>6}  "
+                  f"errores {result['errors']}", flush=True)
+    finally:
+        for patch in patches:
+            patch.stop()
+
+    report = {
+        'meta': {
+            'startedAt': datetime.now(timezone.utc).isoformat(),
+            'gitRevision': _git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpuCount': os.cpu_count(),
+            'args': vars(args),
+            'seedSeconds': round(seed_seconds, 2),
+            'startupMs': readiness.get('startupMs'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados en {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# benchmarks/scenarios.py
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# Datos sembrados y escenarios (una ruta real de la API cada uno) del benchmark.
+# Los tokens se firman con una clave RSA generada al arrancar y se verifican con
+# un TokenVerifier de claves locales: mismo código de verificación, sin red.
+
+PROJECT_ID = 'remarket-bench'
+KEY_ID = 'bench'
+
+BRANDS = {
+    'Apple': ['iPhone 12', 'iPhone 13', 'iPhone 14', 'iPhone 15'],
+    'Samsung': ['Galaxy S21', 'Galaxy S22', 'Galaxy A54'],
+    'Xiaomi': ['Redmi Note 12', 'Mi 11', 'Poco X5'],
+    'Motorola': ['Moto G84', 'Edge 40'],
+}
+STORAGES = ['64GB', '128GB', '256GB', '512GB']
+WORDS = ['excelente', 'estado', 'batería', 'nueva', 'caja', 'original', 'cargador', 'rayones',
+         'pantalla', 'impecable', 'liberado', 'garantía', 'funda', 'poco', 'uso']
+
+MAX_BATCH = 500
+_ids = itertools.count(1)
+
+
+def _unique(prefix):
+    return f"{prefix}-{next(_ids):07d}"
+
+
+class Dataset:
+    """Lo que los escenarios necesitan saber de los datos sembrados."""
+
+    def __init__(self, users, sellers, products, seller_of, tokens, private_key):
+        self.users = users          # uids de compradores (aprobados)
+        self.sellers = sellers      # uids de vendedores
+        self.products = products    # IDs de productos aprobados
+        self.seller_of = seller_of  # product_id -> uid del vendedor
+        self.tokens = tokens        # uid -> ID Token firmado
+        self._private_key = private_key
+
+    def token_for(self, uid):
+        """Devuelve (y firma la primera vez) el ID Token de un usuario."""
+        token = self.tokens.get(uid)
+        if token is None:
+            token = self.tokens[uid] = sign_token(self._private_key, uid)
+        return token
+
+
+def generate_keys():
+    """Par de claves RSA del benchmark: (clave privada, {kid: clave pública PEM})."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode('ascii')
+    return private_key, {KEY_ID: public_pem}
+
+
+def sign_token(private_key, uid, ttl=3600):
+    now = int(time.time())
+    claims = {'iss': f'https://securetoken.google.com/{PROJECT_ID}', 'aud': PROJECT_ID, 'sub': uid,
+              'iat': now, 'auth_time': now, 'exp': now + ttl}
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': KEY_ID})
+
+
+def _write_all(client, collection, docs):
+    batch, pending = client.batch(), 0
+    for doc_id, doc_data in docs:
+        batch.set(client.collection(collection).document(doc_id), doc_data)
+        pending += 1
+        if pending == MAX_BATCH:
+            batch.commit()
+            batch, pending = client.batch(), 0
+    if pending:
+        batch.commit()
+
+
+def seed(client, rng, users=200, products=1000, ratings=2000, transactions=500, saved=500, private_key=None):
+    """
+    Siembra usuarios, productos aprobados, calificaciones, transacciones completadas
+    y guardados con el esquema de los servicios. Devuelve el Dataset.
+    """
+    base_time = datetime.now(timezone.utc) - timedelta(days=30)
+    seller_count = max(1, users // 5)
+    sellers = [f"seller-{i:05d}" for i in range(seller_count)]
+    buyers = [f"user-{i:05d}" for i in range(users)]
+
+    def user_doc(i, role):
+        return {'firstName': f'Nombre{i}', 'lastName': f'Apellido{i}', 'dniNumber': f'{30000000 + i}',
+                'email': f'{role}{i}@bench.remarket', 'dniFrontUrl': '', 'dniBackUrl': '',
+                'approved': True, 'role': 'user', 'active': True,
+                'createdAt': base_time, 'updatedAt': base_time}
+
+    _write_all(client, 'users', [(uid, user_doc(i, 'seller')) for i, uid in enumerate(sellers)] +
+               [(uid, user_doc(i, 'user')) for i, uid in enumerate(buyers)])
+
+    product_ids, seller_of, product_docs = [], {}, []
+    for i in range(products):
+        brand = rng.choice(list(BRANDS))
+        product_id = f"prod-{i:06d}"
+        seller_id = rng.choice(sellers)
+        created_at = base_time + timedelta(seconds=i)
+        product_docs.append((product_id, {
+            'sellerId': seller_id, 'brand': brand, 'model': rng.choice(BRANDS[brand]),
+            'storage': rng.choice(STORAGES), 'price': float(rng.randrange(50, 1500)),
+            'imei': f'{350000000000000 + i}', 'description': ' '.join(rng.sample(WORDS, 6)),
+            'imageUrls': [], 'boxImageUrl': '', 'invoiceUrl': '',
+            'status': 'approved', 'active': True, 'createdAt': created_at, 'updatedAt': created_at,
+        }))
+        product_ids.append(product_id)
+        seller_of[product_id] = seller_id
+    _write_all(client, 'products', product_docs)
+
+    rating_docs, seen = [], set()
+    for _ in range(min(ratings, products * users)):
+        product_id, buyer_id = rng.choice(product_ids), rng.choice(buyers)
+        if (product_id, buyer_id) in seen:
+            continue
+        seen.add((product_id, buyer_id))
+        rating_docs.append((f"{product_id}_{buyer_id}", {
+            'productId': product_id, 'buyerId': buyer_id, 'sellerId': seller_of[product_id],
+            'score': rng.randint(1, 5), 'comment': ' '.join(rng.sample(WORDS, 4)), 'active': True,
+            'createdAt': base_time + timedelta(seconds=rng.randrange(30 * 86400)),
+        }))
+    _write_all(client, 'ratings', rating_docs)
+
+    transaction_docs = []
+    for i in range(transactions):
+        product_id = rng.choice(product_ids)
+        timestamp = base_time + timedelta(seconds=rng.randrange(30 * 86400))
+        transaction_docs.append((f"tx-{i:06d}", {
+            'productId': product_id, 'buyerId': rng.choice(buyers), 'sellerId': seller_of[product_id],
+            'status': 'completed', 'active': True, 'timestamp': timestamp, 'completedAt': timestamp,
+        }))
+    _write_all(client, 'transactions', transaction_docs)
+
+    saved_docs = {}
+    for _ in range(saved):
+        product_id, user_id = rng.choice(product_ids), rng.choice(buyers)
+        saved_docs[f"{product_id}_{user_id}"] = {
+            'userId': user_id, 'productId': product_id, 'active': True,
+            'createdAt': base_time + timedelta(seconds=rng.randrange(30 * 86400)),
+        }
+    _write_all(client, 'saved', list(saved_docs.items()))
+
+    return Dataset(buyers, sellers, product_ids, seller_of, {}, private_key)
+
+
+# --- Escenarios --------------------------------------------------------------
+# Cada escenario construye una petición: (método, ruta, cuerpo JSON o None, uid o None).
+# 'expected' son los códigos que cuentan como respuesta correcta; por ejemplo una
+# reserva de un producto ya reservado responde 409 y no es un error del servidor.
+
+class Scenario:
+
+    def __init__(self, name, route, build, expected=(200,)):
+        self.name = name
+        self.route = route
+        self.build = build
+        self.expected = set(expected)
+
+
+def _list_products(data, rng):
+    sort = rng.choice([None, 'price', '-price', '-createdAt'])
+    return 'GET', '/products?limit=50' + (f'&sort={sort}' if sort else ''), None, None
+
+
+def _get_product(data, rng):
+    return 'GET', f'/products/{rng.choice(data.products)}', None, None
+
+
+def _create_transaction(data, rng):
+    return 'POST', '/transactions', {'productId': rng.choice(data.products)}, rng.choice(data.users)
+
+
+def _list_transactions(data, rng):
+    return 'GET', '/transactions?limit=20', None, rng.choice(data.users)
+
+
+def _list_ratings(data, rng):
+    return 'GET', f'/ratings?productId={rng.choice(data.products)}&limit=20', None, None
+
+
+def _create_rating(data, rng):
+    return 'POST', '/ratings', {'productId': rng.choice(data.products), 'score': rng.randint(1, 5),
+                                'comment': 'benchmark'}, rng.choice(data.users)
+
+
+def _create_saved(data, rng):
+    return 'POST', '/saved', {'productId': rng.choice(data.products)}, rng.choice(data.users)
+
+
+def _list_saved(data, rng):
+    return 'GET', '/saved?limit=20', None, rng.choice(data.users)
+
+
+def _start_chat(data, rng):
+    return 'POST', '/chats', {'productId': rng.choice(data.products)}, rng.choice(data.users)
+
+
+def _register(data, rng):
+    suffix = _unique('reg')
+    return 'POST', '/auth/register', {'firstName': 'Bench', 'lastName': suffix, 'dniNumber': suffix,
+                                      'email': f'{suffix}@bench.remarket', 'password': 'benchmark-123'}, None
+
+
+SCENARIOS = {s.name: s for s in [
+    Scenario('products.list', 'GET /products', _list_products),
+    Scenario('products.get', 'GET /products/<id>', _get_product),
+    Scenario('transactions.create', 'POST /transactions', _create_transaction, expected=(201, 409)),
+    Scenario('transactions.list', 'GET /transactions', _list_transactions),
+    Scenario('ratings.list', 'GET /ratings', _list_ratings),
+    Scenario('ratings.create', 'POST /ratings', _create_rating, expected=(201, 409)),
+    Scenario('saved.create', 'POST /saved', _create_saved, expected=(201, 409)),
+    Scenario('saved.list', 'GET /saved', _list_saved),
+    Scenario('chats.start', 'POST /chats', _start_chat, expected=(201, 403)),
+    Scenario('auth.register', 'POST /auth/register', _register, expected=(201,)),
+]}
@@ -0,0 +1,83 @@
+# gunicorn.conf.py
+# Configuración del servidor de producción: gunicorn -c gunicorn.conf.py wsgi:app
+import glob
+import multiprocessing
+import os
+import signal
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# Procesos y hilos: la API es casi toda E/S (Firestore), así que cada proceso
+# atiende varias peticiones a la vez con hilos (worker 'gthread').
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Con preload el maestro importa la app una sola vez y los workers la heredan al
+# hacer fork. Es seguro porque create_app() no abre canales gRPC ni arranca hilos:
+# el cliente de Firestore y los componentes en segundo plano nacen en cada worker
+# (post_worker_init). gRPC no sobrevive a un fork con canales abiertos.
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+# Al recibir SIGTERM, cada worker deja de aceptar conexiones y tiene este plazo
+# para terminar las peticiones en curso antes de ser forzado.
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Reciclado opcional de workers para acotar el crecimiento de memoria.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+# Métricas de Prometheus multiproceso: cada worker escribe sus valores en este
+# directorio y GET /metrics, lo atienda el worker que lo atienda, agrega todos.
+# Se fija aquí (en el maestro) para que los workers lo hereden antes de importar la app.
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                       os.path.join(tempfile.gettempdir(), f'remarket-prometheus-{os.getpid()}'))
+
+
+def on_starting(server):
+    """
+    Arranque del maestro: borra los valores de métricas de una ejecución anterior.
+    Solo los archivos *.db de prometheus_client: el directorio puede ser uno
+    compartido indicado por el operador.
+    """
+    os.makedirs(prometheus_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(prometheus_dir, '*.db')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def post_worker_init(worker):
+    """Tras cargar la app en el worker: calentamiento y drenado al recibir SIGTERM."""
+    from app import lifecycle
+    lifecycle.start_warmup()
+
+    # gunicorn ya instaló su manejador de SIGTERM; lo encadenamos para que
+    # /readyz responda 503 en cuanto empieza el drenado.
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def drain_then_stop(signum, frame):
+        lifecycle.begin_drain()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain_then_stop)
+
+
+def child_exit(server, worker):
+    """En el maestro, al morir un worker: sus gauges 'livesum' (peticiones en curso) dejan de contar."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Después de drenar las peticiones: detiene listeners, colas e hilos del worker."""
+    from app import lifecycle
+    lifecycle.shutdown()
@@ -1,4 +1,5 @@
 # run.py
+# Servidor de desarrollo. En producción: gunicorn -c gunicorn.conf.py wsgi:app
 import os
 from app import create_app
 
@@ -6,4 +7,4 @@ app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
@@ -0,0 +1,94 @@
+# tests/test_db_stats.py
+import asyncio
+
+from google.api_core.grpc_helpers_async import _WrappedUnaryStreamCall
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.firestore import AsyncClient, Client
+from google.cloud.firestore_v1.types import document, firestore as firestore_types
+from google.protobuf import timestamp_pb2
+
+from app import db_stats
+
+TIMESTAMP = timestamp_pb2.Timestamp(seconds=1)
+
+
+def _query_responses(parent, count):
+    # Firestore abre el stream con una respuesta sin documento (solo readTime).
+    responses = [firestore_types.RunQueryResponse(read_time=TIMESTAMP)]
+    for i in range(count):
+        doc = document.Document(name=f"{parent}/items/doc{i}", create_time=TIMESTAMP, update_time=TIMESTAMP)
+        responses.append(firestore_types.RunQueryResponse(document=doc, read_time=TIMESTAMP))
+    return responses
+
+
+def _lookup_responses(names):
+    return [firestore_types.BatchGetDocumentsResponse(missing=name, read_time=TIMESTAMP) for name in names]
+
+
+class _FakeAioCall:
+    """Llamada grpc.aio mínima: como la real, solo se puede iterar con 'async for'."""
+
+    def __init__(self, responses):
+        self._responses = responses
+
+    async def wait_for_connection(self):
+        pass
+
+    def __aiter__(self):
+        return self._generate()
+
+    async def _generate(self):
+        for response in self._responses:
+            yield response
+
+
+class _FakeAsyncApi:
+    """API GAPIC async que devuelve el mismo stream envuelto que api_core."""
+
+    async def run_query(self, request, metadata=None, **kwargs):
+        return _WrappedUnaryStreamCall().with_call(_FakeAioCall(_query_responses(request['parent'], 3)))
+
+    async def batch_get_documents(self, request, metadata=None, **kwargs):
+        return _WrappedUnaryStreamCall().with_call(_FakeAioCall(_lookup_responses(request['documents'])))
+
+
+class _FakeApi:
+
+    def run_query(self, request, metadata=None, **kwargs):
+        return iter(_query_responses(request['parent'], 0))
+
+
+def _instrumented(client_class, api):
+    client = client_class(project='remarket-test', credentials=AnonymousCredentials())
+    client._firestore_api_internal = api
+    return db_stats.instrument(client)
+
+
+def test_async_query_and_lookup_are_counted():
+    client = _instrumented(AsyncClient, _FakeAsyncApi())
+
+    async def read():
+        stats = db_stats.OpStats()
+        db_stats._current.set(stats)
+        docs = [doc async for doc in client.collection('items').stream()]
+        snapshot = await client.collection('items').document('missing').get()
+        return docs, snapshot, stats
+
+    docs, snapshot, stats = asyncio.run(read())
+
+    assert len(docs) == 3
+    assert not snapshot.exists
+    counts = stats.as_dict()
+    assert (counts['reads'], counts['queries']) == (4, 1)
+
+
+def test_empty_query_costs_one_read():
+    client = _instrumented(Client, _FakeApi())
+    stats = db_stats.OpStats()
+    token = db_stats._current.set(stats)
+    try:
+        assert list(client.collection('items').stream()) == []
+    finally:
+        db_stats._current.reset(token)
+
+    assert (stats.reads, stats.queries) == (1, 1)